@@ -0,0 +1,472 @@
+# app/database/ann_index.py
+"""
+Index approximate nearest-neighbour (inner product atas vector L2-normalized)
+untuk katalog besar, dengan key = digest 20 byte (lihat vector_cache.content_key).
+
+Backend (create_index / load_index), API sama:
+
+    ivf   IVF-flat numpy (default). Vector diurutkan per list centroid, jadi
+          satu list = satu blok berurutan di vectors-<gen>.f32 yang dibuka
+          dengan np.memmap. Knob: effort = nprobe (jumlah list yang di-scan).
+    hnsw  graph HNSW lewat hnswlib (opsional, `pip install hnswlib`). Knob:
+          effort = ef_search. Graph dimuat ke RAM (hnswlib tidak mendukung mmap).
+
+add/remove langsung terlihat di search: baris baru masuk "delta" di RAM
+(IVF: sudah di-assign ke list terdekat), baris yang dihapus jadi tombstone.
+save() menulis generasi baru yang sudah dipadatkan lalu header.json (atomic
+rename) sebagai commit point (ProductIndex baru menyimpan setelah perubahan
+> SAVE_CHANGE_RATIO, lihat needs_save), dan file generasi lama dihapus; proses yang
+masih memetakan file lama tetap aman (inode tetap hidup sampai di-unmap).
+
+Isi folder index:
+
+    header.json          backend, dim, count, generation, info training
+    vectors-<gen>.f32    (ivf) float32 (count, dim), urut per list
+    lists-<gen>.npz      (ivf) centroid + offset list
+    graph-<gen>.bin      (hnsw) file save_index hnswlib
+    keys-<gen>.bin       key 20 byte per baris (ivf) / per label (hnsw)
+    labels-<gen>.i64     (hnsw) label hnswlib, sejajar keys-<gen>.bin
+"""
+import os
+import json
+import math
+import time
+import uuid
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .embedding_index import top_k as _top_k_indices, spherical_kmeans, ASSIGN_CHUNK_ROWS
+from .vector_cache import directory_lock, KEY_BYTES
+
+logger = logging.getLogger(__name__)
+
+ANN_BACKENDS = ("ivf", "hnsw")
+HEADER_FILE = "header.json"
+IVF_NPROBE = 16
+IVF_RETRAIN_GROWTH = 4.0      # train ulang kalau isi index sudah 4x jumlah saat training
+SAVE_CHANGE_RATIO = 0.1      # needs_save: perubahan belum tersimpan > 10% isi saat save terakhir
+HNSW_EF_SEARCH = 64
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+
+
+def _split_keys(data: bytes) -> List[bytes]:
+    return [data[offset:offset + KEY_BYTES] for offset in range(0, len(data), KEY_BYTES)]
+
+
+def _write_file(path: Path, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _commit_header(directory: Path, header: Dict[str, Any]):
+    """Tulis header.json (atomic) lalu hapus file generasi lain (dipanggil di bawah directory_lock)"""
+    tmp_path = directory / (HEADER_FILE + ".tmp")
+    tmp_path.write_text(json.dumps(header, indent=2))
+    os.replace(tmp_path, directory / HEADER_FILE)
+    suffix = f"-{header['generation']}"
+    for path in directory.iterdir():
+        stem = path.name.split(".")[0]
+        if "-" in stem and not stem.endswith(suffix):
+            path.unlink(missing_ok=True)
+
+
+def _read_header(directory: Path, backend: str) -> Dict[str, Any]:
+    header = json.loads((Path(directory) / HEADER_FILE).read_text())
+    if header["backend"] != backend:
+        raise ValueError(f"ANN index {directory} is {header['backend']}, not {backend}")
+    return header
+
+
+class IVFFlatIndex:
+    """IVF-flat: scan `effort` (nprobe) list dengan centroid terdekat (thread-safe)"""
+
+    backend = "ivf"
+
+    def __init__(self, dim: int, effort: int = IVF_NPROBE):
+        self.dim = dim
+        self.effort = max(1, effort)
+        self._lock = threading.Lock()
+        self._centroids: Optional[np.ndarray] = None   # None = belum di-train, scan semua baris
+        self._base = np.zeros((0, dim), dtype=np.float32)  # urut per list; memmap setelah save/load
+        self._offsets = np.zeros(2, dtype=np.int64)    # list c = base[offsets[c]:offsets[c + 1]]
+        self._delta = np.zeros((0, dim), dtype=np.float32)
+        self._delta_assign = np.zeros(0, dtype=np.int32)
+        self._keys: List[bytes] = []                   # per baris: base lalu delta
+        self._alive = np.zeros(0, dtype=bool)
+        self._rows: Dict[bytes, int] = {}              # key -> baris hidup
+        self.trained_count = 0
+        self.unsaved_changes = 0
+        self._saved_count = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._rows
+
+    def keys(self) -> List[bytes]:
+        with self._lock:
+            return list(self._rows)
+
+    # ==== [Update] =========================================================
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        if self._centroids is None:
+            return np.zeros(len(vectors), dtype=np.int32)
+        return np.concatenate([
+            np.argmax(vectors[start:start + ASSIGN_CHUNK_ROWS] @ self._centroids.T, axis=1)
+            for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS)
+        ]).astype(np.int32)
+
+    def _remove_locked(self, keys: Iterable[bytes]) -> int:
+        removed = 0
+        for key in keys:
+            row = self._rows.pop(key, None)
+            if row is not None:
+                self._alive[row] = False
+                removed += 1
+        return removed
+
+    def add(self, keys: List[bytes], vectors: np.ndarray):
+        """Tambah (atau ganti) baris; langsung masuk list IVF terdekat"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(keys) != len(vectors):
+            raise ValueError(f"Got {len(keys)} keys for {len(vectors)} vectors")
+        if not len(keys):
+            return
+        with self._lock:
+            self._remove_locked(keys)
+            start = len(self._keys)
+            self._delta = np.concatenate([self._delta, vectors])
+            self._delta_assign = np.concatenate([self._delta_assign, self._assign(vectors)])
+            self._alive = np.concatenate([self._alive, np.ones(len(keys), dtype=bool)])
+            self._keys.extend(keys)
+            self._rows.update((key, start + i) for i, key in enumerate(keys))
+            self.unsaved_changes += len(keys)
+
+    def remove(self, keys: Iterable[bytes]) -> int:
+        with self._lock:
+            removed = self._remove_locked(keys)
+            self.unsaved_changes += removed
+            return removed
+
+    def _live_locked(self) -> Tuple[List[bytes], np.ndarray, np.ndarray]:
+        """(keys, vectors, list) baris hidup, urut baris (salinan di RAM)"""
+        base_count = len(self._base)
+        nlist = len(self._offsets) - 1
+        base_assign = np.repeat(np.arange(nlist, dtype=np.int32), np.diff(self._offsets))
+        base_rows = np.flatnonzero(self._alive[:base_count])
+        delta_rows = np.flatnonzero(self._alive[base_count:])
+        vectors = np.concatenate([np.asarray(self._base[base_rows]), self._delta[delta_rows]])
+        assign = np.concatenate([base_assign[base_rows], self._delta_assign[delta_rows]])
+        keys = [self._keys[row] for row in base_rows] + [self._keys[base_count + row] for row in delta_rows]
+        return keys, vectors, assign
+
+    def _rebuild_locked(self, keys: List[bytes], vectors: np.ndarray, assign: np.ndarray, nlist: int):
+        order = np.argsort(assign, kind="stable")
+        self._base = np.ascontiguousarray(vectors[order])
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+        self._keys = [keys[row] for row in order]
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._alive = np.ones(len(self._keys), dtype=bool)
+        self._delta = np.zeros((0, self.dim), dtype=np.float32)
+        self._delta_assign = np.zeros(0, dtype=np.int32)
+
+    def needs_save(self) -> bool:
+        """Perubahan kecil cukup di RAM (delta + tombstone); save menulis ulang seluruh index"""
+        return self.unsaved_changes > SAVE_CHANGE_RATIO * self._saved_count
+
+    def needs_training(self) -> bool:
+        return self._centroids is None or len(self) > IVF_RETRAIN_GROWTH * max(self.trained_count, 1)
+
+    def train(self, nlist: int = None, iterations: int = 10, sample_size: int = 50000,
+              seed: int = 0) -> Dict[str, Any]:
+        """
+        Spherical k-means atas sampel baris hidup, lalu semua baris di-assign
+        ulang dan diurutkan per list (di RAM sampai save()).
+        """
+        with self._lock:
+            count = len(self._rows)
+            if count == 0:
+                raise ValueError("ANN index is empty")
+            started = time.perf_counter()
+            keys, vectors, _ = self._live_locked()
+            rng = np.random.default_rng(seed)
+            nlist = min(nlist or max(1, int(math.sqrt(count))), count)
+            sample = vectors[np.sort(rng.choice(count, size=min(count, max(sample_size, nlist)), replace=False))]
+            self._centroids = spherical_kmeans(sample, nlist, iterations, rng)
+            self._rebuild_locked(keys, vectors, self._assign(vectors), nlist)
+            self.trained_count = count
+            self.unsaved_changes += count
+            seconds = time.perf_counter() - started
+        logger.info(" IVF index trained: %d lists over %d vectors in %.1fs", nlist, count, seconds)
+        return {"nlist": nlist, "trained_count": count, "train_seconds": round(seconds, 3)}
+
+    # ==== [Search] =========================================================
+    def search(self, query: np.ndarray, k: int = 10, effort: int = None) -> List[Tuple[bytes, float]]:
+        """(key, skor inner product) top-k dari `effort` list terdekat (default self.effort)"""
+        with self._lock:
+            base, offsets, centroids = self._base, self._offsets, self._centroids
+            delta, delta_assign, alive, keys = self._delta, self._delta_assign, self._alive, self._keys
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self.dim:
+            raise ValueError(f"Query dim {query.shape[0]} does not match index dim {self.dim}")
+
+        if centroids is None:
+            probe = None
+            spans = [(0, len(base))]
+        else:
+            probe = _top_k_indices(centroids @ query, min(effort or self.effort, len(centroids)))
+            spans = sorted((offsets[c], offsets[c + 1]) for c in probe)  # akses memmap berurutan
+        row_parts = [np.arange(start, end) for start, end in spans if end > start]
+        score_parts = [base[start:end] @ query for start, end in spans if end > start]
+        if len(delta):
+            hit = np.arange(len(delta)) if probe is None else np.flatnonzero(np.isin(delta_assign, probe))
+            row_parts.append(hit + len(base))
+            score_parts.append(delta[hit] @ query)
+        if not row_parts:
+            return []
+        rows, scores = np.concatenate(row_parts), np.concatenate(score_parts)
+        keep = alive[rows]
+        rows, scores = rows[keep], scores[keep]
+        order = _top_k_indices(scores, k)
+        return [(keys[row], float(score)) for row, score in zip(rows[order], scores[order])]
+
+    # ==== [Persistensi] ====================================================
+    def save(self, directory: Path):
+        """Padatkan (buang tombstone, gabung delta) lalu tulis generasi baru; base dibuka ulang via memmap"""
+        directory = Path(directory)
+        with self._lock, directory_lock(directory):
+            nlist = len(self._offsets) - 1
+            keys, vectors, assign = self._live_locked()
+            self._rebuild_locked(keys, vectors, assign, nlist)
+            generation = uuid.uuid4().hex[:12]
+            _write_file(directory / f"vectors-{generation}.f32", self._base.tobytes())
+            _write_file(directory / f"keys-{generation}.bin", b"".join(self._keys))
+            with open(directory / f"lists-{generation}.npz", "wb") as f:
+                np.savez(f, offsets=self._offsets,
+                         centroids=np.zeros((0, self.dim), np.float32) if self._centroids is None else self._centroids)
+            _commit_header(directory, {
+                "backend": self.backend, "dim": self.dim, "count": len(self._keys), "nlist": nlist,
+                "trained": self._centroids is not None, "trained_count": self.trained_count,
+                "generation": generation, "saved_at": time.time(),
+            })
+            self._base = self._open_vectors(directory, generation, len(self._keys))
+            self.unsaved_changes = 0
+            self._saved_count = len(self)
+
+    def _open_vectors(self, directory: Path, generation: str, count: int) -> np.ndarray:
+        if count == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(directory / f"vectors-{generation}.f32", dtype=np.float32, mode="r",
+                         shape=(count, self.dim))
+
+    @classmethod
+    def load(cls, directory: Path, effort: int = IVF_NPROBE) -> "IVFFlatIndex":
+        directory = Path(directory)
+        with directory_lock(directory):
+            header = _read_header(directory, cls.backend)
+            generation, count = header["generation"], header["count"]
+            index = cls(header["dim"], effort)
+            keys = _split_keys((directory / f"keys-{generation}.bin").read_bytes())
+            with np.load(directory / f"lists-{generation}.npz") as lists:
+                index._offsets = lists["offsets"]
+                index._centroids = lists["centroids"] if header["trained"] else None
+            index._base = index._open_vectors(directory, generation, count)
+        index._keys = keys
+        index._rows = {key: row for row, key in enumerate(keys)}
+        index._alive = np.ones(count, dtype=bool)
+        index.trained_count = header["trained_count"]
+        index._saved_count = count
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sizes = np.diff(self._offsets)
+            return {
+                "backend": self.backend,
+                "vectors": len(self._rows),
+                "delta": len(self._delta),
+                "tombstones": len(self._keys) - len(self._rows),
+                "nlist": 0 if self._centroids is None else len(self._centroids),
+                "list_size_max": int(sizes.max()) if len(sizes) else 0,
+                "effort": self.effort,
+                "memmap": isinstance(self._base, np.memmap),
+                "trained_count": self.trained_count,
+            }
+
+
+def _import_hnswlib():
+    try:
+        import hnswlib
+    except ImportError as e:
+        raise RuntimeError("ANN backend 'hnsw' needs hnswlib (pip install hnswlib)") from e
+    return hnswlib
+
+
+class HNSWIndex:
+    """Graph HNSW (hnswlib); delete = mark_deleted, slotnya dipakai ulang oleh add berikutnya"""
+
+    backend = "hnsw"
+
+    def __init__(self, dim: int, effort: int = HNSW_EF_SEARCH, m: int = HNSW_M,
+                 ef_construction: int = HNSW_EF_CONSTRUCTION, capacity: int = 1024, _graph=None):
+        self.dim = dim
+        self.effort = max(1, effort)
+        self._lock = threading.Lock()
+        if _graph is None:
+            _graph = _import_hnswlib().Index(space="ip", dim=dim)
+            _graph.init_index(max_elements=capacity, ef_construction=ef_construction, M=m,
+                              allow_replace_deleted=True)
+        self._graph = _graph
+        self._graph.set_ef(self.effort)
+        self._ef = self.effort
+        self._labels: Dict[bytes, int] = {}   # key -> label hidup
+        self._keys: Dict[int, bytes] = {}     # label -> key
+        self._next_label = 0
+        self.trained_count = 0
+        self.unsaved_changes = 0
+        self._saved_count = 0
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._labels
+
+    def keys(self) -> List[bytes]:
+        with self._lock:
+            return list(self._labels)
+
+    def _remove_locked(self, keys: Iterable[bytes]) -> int:
+        removed = 0
+        for key in keys:
+            label = self._labels.pop(key, None)
+            if label is not None:
+                self._graph.mark_deleted(label)
+                del self._keys[label]
+                removed += 1
+        return removed
+
+    def add(self, keys: List[bytes], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(keys) != len(vectors):
+            raise ValueError(f"Got {len(keys)} keys for {len(vectors)} vectors")
+        if not len(keys):
+            return
+        with self._lock:
+            self._remove_locked(keys)
+            needed = self._graph.get_current_count() + len(keys)  # termasuk slot yang di-mark_deleted
+            if needed > self._graph.get_max_elements():
+                self._graph.resize_index(max(needed, 2 * self._graph.get_max_elements()))
+            labels = np.arange(self._next_label, self._next_label + len(keys))
+            self._graph.add_items(vectors, labels, replace_deleted=True)
+            self._next_label += len(keys)
+            for key, label in zip(keys, labels.tolist()):
+                self._labels[key] = label
+                self._keys[label] = key
+            self.unsaved_changes += len(keys)
+
+    def remove(self, keys: Iterable[bytes]) -> int:
+        with self._lock:
+            removed = self._remove_locked(keys)
+            self.unsaved_changes += removed
+            return removed
+
+    def needs_save(self) -> bool:
+        return self.unsaved_changes > SAVE_CHANGE_RATIO * self._saved_count
+
+    def needs_training(self) -> bool:
+        return False
+
+    def train(self, **_) -> Dict[str, Any]:
+        """Graph dibangun inkremental saat add; tidak ada tahap training"""
+        return {"trained_count": len(self)}
+
+    def search(self, query: np.ndarray, k: int = 10, effort: int = None) -> List[Tuple[bytes, float]]:
+        """(key, skor inner product) top-k; effort = ef_search (default self.effort)"""
+        query = np.asarray(query, dtype=np.float32).reshape(1, -1)
+        with self._lock:  # ef adalah state index hnswlib, set + query harus bersamaan
+            k = min(k, len(self._labels))
+            if k <= 0:
+                return []
+            ef = max(effort or self.effort, k)
+            if ef != self._ef:
+                self._graph.set_ef(ef)
+                self._ef = ef
+            labels, distances = self._graph.knn_query(query, k=k, num_threads=1)
+            keys = self._keys
+            return [(keys[label], 1.0 - float(distance))
+                    for label, distance in zip(labels[0].tolist(), distances[0].tolist()) if label in keys]
+
+    def save(self, directory: Path):
+        directory = Path(directory)
+        with self._lock, directory_lock(directory):
+            generation = uuid.uuid4().hex[:12]
+            self._graph.save_index(str(directory / f"graph-{generation}.bin"))
+            labels = np.fromiter(self._keys, dtype=np.int64, count=len(self._keys))
+            _write_file(directory / f"keys-{generation}.bin", b"".join(self._keys[label] for label in labels.tolist()))
+            _write_file(directory / f"labels-{generation}.i64", labels.tobytes())
+            _commit_header(directory, {
+                "backend": self.backend, "dim": self.dim, "count": len(self._labels),
+                "next_label": self._next_label, "capacity": self._graph.get_max_elements(),
+                "generation": generation, "saved_at": time.time(),
+            })
+            self.unsaved_changes = 0
+            self._saved_count = len(self)
+
+    @classmethod
+    def load(cls, directory: Path, effort: int = HNSW_EF_SEARCH) -> "HNSWIndex":
+        directory = Path(directory)
+        hnswlib = _import_hnswlib()
+        with directory_lock(directory):
+            header = _read_header(directory, cls.backend)
+            generation = header["generation"]
+            graph = hnswlib.Index(space="ip", dim=header["dim"])
+            graph.load_index(str(directory / f"graph-{generation}.bin"), max_elements=header["capacity"],
+                             allow_replace_deleted=True)
+            keys = _split_keys((directory / f"keys-{generation}.bin").read_bytes())
+            labels = np.fromfile(directory / f"labels-{generation}.i64", dtype=np.int64).tolist()
+        index = cls(header["dim"], effort, _graph=graph)
+        index._keys = dict(zip(labels, keys))
+        index._labels = dict(zip(keys, labels))
+        index._next_label = header["next_label"]
+        index.trained_count = index._saved_count = len(keys)
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "vectors": len(self._labels),
+                "capacity": self._graph.get_max_elements(),
+                "effort": self.effort,
+                "memmap": False,
+            }
+
+
+_BACKEND_CLASSES = {"ivf": IVFFlatIndex, "hnsw": HNSWIndex}
+
+
+def _backend_class(backend: str):
+    cls = _BACKEND_CLASSES.get((backend or "").lower())
+    if cls is None:
+        raise ValueError(f"Unknown ANN backend: {backend} (choose from {', '.join(ANN_BACKENDS)})")
+    return cls
+
+
+def create_index(backend: str, dim: int, effort: int = None):
+    cls = _backend_class(backend)
+    return cls(dim) if effort is None else cls(dim, effort)
+
+
+def load_index(directory: Path, backend: str, effort: int = None):
+    """Muat index tersimpan; FileNotFoundError kalau belum pernah di-save"""
+    cls = _backend_class(backend)
+    return cls.load(directory) if effort is None else cls.load(directory, effort)
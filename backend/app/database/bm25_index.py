@@ -0,0 +1,300 @@
+# app/database/bm25_index.py
+"""
+Inverted index BM25 untuk katalog produk (pencarian leksikal).
+
+- Tokenisasi Indonesia/Inggris: lowercase, aksen dibuang, token alfanumerik
+  ("pori-pori" -> pori, pori), stopword ID/EN, stemming ringan (akhiran
+  -nya dan plural Inggris -s/-ies). Sama persis untuk dokumen dan query.
+- Posting list per term disimpan sebagai array ringkas (array.array: slot
+  dokumen uint32 + term frequency berbobot float32). Query hanya membaca
+  posting list term yang ada di query, tidak men-scan katalog.
+- Statistik BM25 (document frequency per term, panjang dokumen, jumlah
+  panjang) di-update saat add/update/remove; bagian normalisasi panjang
+  k1 * (1 - b + b * dl / avgdl) per dokumen dihitung ulang lazy sekali
+  setelah ada perubahan.
+- Update = hapus (tombstone) + tambah slot baru; posting list dari slot yang
+  sudah dihapus dibersihkan saat proporsinya melewati COMPACT_DEAD_RATIO,
+  tanpa tokenisasi ulang katalog.
+"""
+import re
+import math
+import functools
+import array
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .embedding_index import top_k as _top_k_indices
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+COMPACT_DEAD_RATIO = 0.25
+
+# Bobot term frequency per field produk (nama dan kondisi lebih menentukan)
+FIELD_WEIGHTS = {
+    "name": 2.0,
+    "category": 1.5,
+    "for_conditions": 1.5,
+    "description": 1.0,
+    "ingredients": 1.0,
+    "usage": 0.5,
+}
+
+STOPWORDS = frozenset("""
+yang dan di ke dari untuk dengan atau ini itu pada dalam ada adalah akan bisa juga saya aku kamu
+kami kita anda mau ingin tolong apa apakah bagaimana gimana berapa mana kah lah nya sih dong ya
+tidak tak bukan jadi agar supaya karena oleh sebagai serta sudah belum masih lebih sangat paling
+hanya saja per tiap setiap bila jika kalau yg dgn utk tdk
+the a an and or of to in on for with is are be it its this that these those my your i me we you
+what which who how any some can do does use using from at by as into than very most more
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+@functools.lru_cache(maxsize=65536)
+def _stem(token: str) -> str:
+    """Stemming ringan ID/EN (tidak menyentuh prefiks seperti ber-/me-)"""
+    if len(token) >= 7 and token.endswith("nya"):
+        return token[:-3]
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Teks -> token ter-stem tanpa stopword"""
+    if not text:
+        return []
+    text = text.lower()
+    if not text.isascii():
+        # "crème" -> "creme"; karakter non-latin memang tidak masuk token
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return [_stem(token) for token in _TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+
+def product_fields(product: Dict[str, Any]) -> Dict[str, str]:
+    """Field produk yang di-index (ingredients/usage tidak dihitung dua kali kalau sudah ada di description)"""
+    description = product.get("description", "") or ""
+    fields = {
+        "name": product.get("name", "") or "",
+        "category": product.get("category", "") or "",
+        "for_conditions": " ".join(product.get("for_conditions", []) or []),
+        "description": description,
+    }
+    for name in ("ingredients", "usage"):
+        value = product.get(name, "") or ""
+        fields[name] = "" if value in description else value
+    return fields
+
+
+def _fingerprint(fields: Dict[str, str]) -> str:
+    return hashlib.sha1("\x1f".join(fields[name] for name in FIELD_WEIGHTS).encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class BM25Index:
+    """Inverted index BM25 dengan add/update/remove inkremental (thread-safe)"""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B,
+                 field_weights: Dict[str, float] = FIELD_WEIGHTS):
+        self.k1 = k1
+        self.b = b
+        self.field_weights = dict(field_weights)
+        self._lock = threading.Lock()
+        self._terms: Dict[str, int] = {}
+        self._doc_freq = array.array("I")          # per term: dokumen hidup yang memuat term
+        self._post_docs: List[array.array] = []    # per term: slot dokumen (uint32)
+        self._post_tf: List[array.array] = []      # per term: tf berbobot (float32)
+        self._ids: List[Any] = []                  # per slot
+        self._doc_terms: List[array.array] = []    # per slot: term id (forward index untuk remove)
+        self._doc_len = array.array("f")           # per slot: panjang berbobot
+        self._alive = bytearray()                  # per slot
+        self._slots: Dict[Any, int] = {}           # id -> slot hidup
+        self._fingerprints: Dict[Any, str] = {}
+        self._total_len = 0.0
+        self._dead_postings = 0
+        self._live_postings = 0
+        self._norm: Optional[np.ndarray] = None    # cache k1 * (1 - b + b * dl / avgdl)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._slots
+
+    # ==== [Update] =========================================================
+    def _weighted_tf(self, fields: Dict[str, str]) -> Counter:
+        counts: Counter = Counter()
+        for name, weight in self.field_weights.items():
+            for token in tokenize(fields.get(name, "")):
+                counts[token] += weight
+        return counts
+
+    def _add_locked(self, doc_id, fields: Dict[str, str]):
+        counts = self._weighted_tf(fields)
+        slot = len(self._ids)
+        self._ids.append(doc_id)
+        self._alive.append(1)
+        length = float(sum(counts.values()))
+        self._doc_len.append(length)
+        self._total_len += length
+        doc_terms = array.array("I")
+        for term, tf in counts.items():
+            term_id = self._terms.get(term)
+            if term_id is None:
+                term_id = self._terms[term] = len(self._post_docs)
+                self._doc_freq.append(0)
+                self._post_docs.append(array.array("I"))
+                self._post_tf.append(array.array("f"))
+            self._post_docs[term_id].append(slot)
+            self._post_tf[term_id].append(tf)
+            self._doc_freq[term_id] += 1
+            doc_terms.append(term_id)
+        self._doc_terms.append(doc_terms)
+        self._live_postings += len(counts)
+        self._slots[doc_id] = slot
+        self._fingerprints[doc_id] = _fingerprint(fields)
+        self._norm = None
+
+    def _remove_locked(self, doc_id) -> bool:
+        slot = self._slots.pop(doc_id, None)
+        if slot is None:
+            return False
+        self._fingerprints.pop(doc_id, None)
+        self._alive[slot] = 0
+        self._total_len -= self._doc_len[slot]
+        terms = self._doc_terms[slot]
+        for term_id in terms:
+            self._doc_freq[term_id] -= 1
+        self._live_postings -= len(terms)
+        self._dead_postings += len(terms)
+        self._doc_terms[slot] = array.array("I")
+        self._norm = None
+        return True
+
+    def _maybe_compact_locked(self):
+        total = self._live_postings + self._dead_postings
+        if not total or self._dead_postings / total < COMPACT_DEAD_RATIO:
+            return
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        for term_id, docs in enumerate(self._post_docs):
+            if not docs:
+                continue
+            slots = np.frombuffer(docs, dtype=np.uint32)
+            keep = alive[slots]
+            if keep.all():
+                continue
+            tf = np.frombuffer(self._post_tf[term_id], dtype=np.float32)
+            self._post_docs[term_id] = array.array("I", slots[keep].tobytes())
+            self._post_tf[term_id] = array.array("f", tf[keep].tobytes())
+        self._dead_postings = 0
+
+    def add(self, doc_id, fields: Dict[str, str]):
+        """Tambah dokumen; id yang sudah ada diperlakukan sebagai update"""
+        with self._lock:
+            self._remove_locked(doc_id)
+            self._add_locked(doc_id, fields)
+            self._maybe_compact_locked()
+
+    def update(self, doc_id, fields: Dict[str, str]) -> bool:
+        """Ganti isi dokumen; False kalau isinya sama (index tidak disentuh)"""
+        with self._lock:
+            if self._fingerprints.get(doc_id) == _fingerprint(fields):
+                return False
+            self._remove_locked(doc_id)
+            self._add_locked(doc_id, fields)
+            self._maybe_compact_locked()
+            return True
+
+    def remove(self, doc_id) -> bool:
+        with self._lock:
+            removed = self._remove_locked(doc_id)
+            self._maybe_compact_locked()
+            return removed
+
+    def sync(self, documents: Iterable[Tuple[Any, Dict[str, str]]]) -> Dict[str, int]:
+        """
+        Samakan index dengan daftar (id, fields) lengkap: hanya dokumen yang
+        baru / berubah (fingerprint beda) yang di-tokenisasi, yang hilang dihapus.
+        """
+        with self._lock:
+            seen = set()
+            added = updated = unchanged = 0
+            for doc_id, fields in documents:
+                seen.add(doc_id)
+                fingerprint = _fingerprint(fields)
+                current = self._fingerprints.get(doc_id)
+                if current == fingerprint:
+                    unchanged += 1
+                    continue
+                if current is None:
+                    added += 1
+                else:
+                    updated += 1
+                    self._remove_locked(doc_id)
+                self._add_locked(doc_id, fields)
+            stale = [doc_id for doc_id in self._slots if doc_id not in seen]
+            for doc_id in stale:
+                self._remove_locked(doc_id)
+            self._maybe_compact_locked()
+        return {"added": added, "updated": updated, "removed": len(stale), "unchanged": unchanged}
+
+    # ==== [Search] =========================================================
+    def _length_norm(self) -> np.ndarray:
+        if self._norm is None:
+            doc_len = np.frombuffer(self._doc_len, dtype=np.float32).astype(np.float64)
+            avgdl = self._total_len / len(self._slots) if self._slots else 1.0
+            self._norm = self.k1 * (1 - self.b + self.b * doc_len / max(avgdl, 1e-9))
+        return self._norm
+
+    def search_ids(self, query: str, top_k: int = 10) -> List[Tuple[Any, float]]:
+        """(id dokumen, skor BM25) top-k; hanya dokumen yang memuat minimal satu term query"""
+        terms = set(tokenize(query))
+        with self._lock:
+            live = len(self._slots)
+            term_ids = [self._terms[t] for t in terms if t in self._terms and self._doc_freq[self._terms[t]]]
+            if not live or not term_ids or top_k <= 0:
+                return []
+            norm = self._length_norm()
+            alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+            slot_parts, score_parts = [], []
+            for term_id in term_ids:
+                df = self._doc_freq[term_id]
+                idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+                slots = np.frombuffer(self._post_docs[term_id], dtype=np.uint32).copy()
+                tf = np.frombuffer(self._post_tf[term_id], dtype=np.float32).astype(np.float64)
+                slot_parts.append(slots)
+                score_parts.append(idf * tf * (self.k1 + 1) / (tf + norm[slots]))
+            ids = self._ids
+
+        slots = np.concatenate(slot_parts)
+        contributions = np.concatenate(score_parts)
+        keep = alive[slots]
+        slots, contributions = slots[keep], contributions[keep]
+        unique_slots, inverse = np.unique(slots, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions, minlength=len(unique_slots))
+        order = _top_k_indices(scores, top_k)
+        return [(ids[unique_slots[i]], float(scores[i])) for i in order]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self._slots),
+                "slots": len(self._ids),
+                "terms": len(self._terms),
+                "postings": self._live_postings,
+                "dead_postings": self._dead_postings,
+                "avg_doc_len": round(self._total_len / len(self._slots), 2) if self._slots else 0.0,
+                "postings_bytes": sum(d.itemsize * len(d) + t.itemsize * len(t)
+                                      for d, t in zip(self._post_docs, self._post_tf)),
+            }
+
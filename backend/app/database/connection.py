@@ -3,12 +3,14 @@ import sqlite3
 import os
 from pathlib import Path
 
+# Database path - gunakan folder backend untuk database
+DB_PATH = Path(__file__).parent.parent.parent / "database.db"
+
 def get_db():
     """
     Get database connection
     """
-    # Database path - gunakan folder backend untuk database
-    db_path = Path(__file__).parent.parent.parent / "database.db"
+    db_path = DB_PATH
     
     # Ensure parent directory exists
     db_path.parent.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,369 @@
+# app/database/embedding_index.py
+"""
+Index embedding gambar kasus referensi (append-only, memory-mapped).
+
+Isi folder EMBEDDING_INDEX_DIR:
+
+    vectors.f32       embedding float32 L2-normalized, satu baris per kasus
+    metadata.jsonl    satu baris JSON per kasus (case_id, label, source, added_at)
+    header.json       dim, jumlah baris yang sudah di-commit, embedding space, info IVF
+    ivf_centroids.npy centroid IVF (opsional, lihat train_ivf)
+    ivf_assign.i32    nomor list IVF per baris (append-only, sejajar vectors.f32)
+
+Append menulis vectors/metadata dulu, lalu header.json (atomic rename) sebagai
+commit point - baris sisa append yang terputus diabaikan dan dipotong pada
+append berikutnya. vectors.f32 dibuka dengan np.memmap, jadi index besar
+tidak perlu dibaca ke RAM saat startup dan bisa dipakai bersama beberapa
+worker proses.
+
+Search:
+    exact  cosine = satu matrix-vector product atas semua baris + argpartition
+    ivf    hanya baris di `nprobe` list IVF dengan centroid terdekat (approximate)
+    auto   ivf kalau sudah di-train dan jumlah baris >= EMBEDDING_ANN_MIN_VECTORS
+"""
+import os
+import json
+import math
+import time
+import uuid
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DB_DIR = Path(__file__).parent.parent.parent
+
+# Konfigurasi (bisa di-override lewat environment variable)
+EMBEDDING_INDEX_DIR = Path(os.getenv("EMBEDDING_INDEX_DIR", str(DB_DIR / "embedding_index")))
+EMBEDDING_INDEX_MODE = os.getenv("EMBEDDING_INDEX_MODE", "auto").lower()
+EMBEDDING_ANN_MIN_VECTORS = int(os.getenv("EMBEDDING_ANN_MIN_VECTORS", "200000"))
+EMBEDDING_IVF_NPROBE = int(os.getenv("EMBEDDING_IVF_NPROBE", "16"))
+
+SEARCH_MODES = ("auto", "exact", "ivf")
+VECTORS_FILE = "vectors.f32"
+METADATA_FILE = "metadata.jsonl"
+HEADER_FILE = "header.json"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ASSIGN_FILE = "ivf_assign.i32"
+ASSIGN_CHUNK_ROWS = 65536
+PENDING_REBUILD_ROWS = 10000
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Index k skor tertinggi, urut menurun (argpartition, bukan sort penuh)"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def spherical_kmeans(sample: np.ndarray, nlist: int, iterations: int,
+                     rng: np.random.Generator) -> np.ndarray:
+    """Centroid (nlist, D) L2-normalized dari k-means cosine atas sample yang sudah dinormalisasi"""
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = np.bincount(labels, minlength=nlist) == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class EmbeddingIndex:
+    """Index kNN cosine untuk embedding kasus referensi (thread-safe)"""
+
+    def __init__(self, directory: Path = EMBEDDING_INDEX_DIR, mode: str = EMBEDDING_INDEX_MODE,
+                 ann_min_vectors: int = EMBEDDING_ANN_MIN_VECTORS, nprobe: int = EMBEDDING_IVF_NPROBE):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown embedding index mode: {mode} (choose from {', '.join(SEARCH_MODES)})")
+        self.directory = Path(directory)
+        self.mode = mode
+        self.ann_min_vectors = ann_min_vectors
+        self.nprobe = max(1, nprobe)
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+        self._reset()
+
+    def _reset(self):
+        self._header: Dict[str, Any] = {"dim": None, "count": 0, "embedding_space": None, "ivf": None}
+        self._vectors: Optional[np.ndarray] = None
+        self._records: List[Dict[str, Any]] = []
+        self._metadata_offset = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._assign: Optional[np.ndarray] = None
+        self._list_order: Optional[np.ndarray] = None
+        self._list_offsets: Optional[np.ndarray] = None
+        self._pending: List[int] = []  # baris baru yang belum masuk posting list IVF
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    @property
+    def count(self) -> int:
+        return self._header["count"]
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._header["dim"]
+
+    @property
+    def embedding_space(self) -> Optional[str]:
+        return self._header["embedding_space"]
+
+    def _refresh(self):
+        """(Re)load kalau header.json berubah (append dari proses lain)"""
+        try:
+            mtime = self._path(HEADER_FILE).stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._loaded_mtime:
+            return
+        with self._lock:
+            if mtime != self._loaded_mtime:
+                self._load()
+                self._loaded_mtime = mtime
+
+    def _load(self):
+        header_path = self._path(HEADER_FILE)
+        if not header_path.exists():
+            self._reset()
+            return
+        header = json.loads(header_path.read_text())
+        # Index yang sama, hanya bertambah: cukup baca metadata baru
+        if header.get("embedding_space") != self.embedding_space or header["count"] < len(self._records):
+            self._records, self._metadata_offset = [], 0
+        self._header = header
+        self._map_vectors()
+        self._read_metadata()
+        self._load_ivf()
+        logger.info(f" Embedding index loaded: {self.count} vectors (dim={self.dim}, "
+                    f"space={self.embedding_space}, ivf={'yes' if self._centroids is not None else 'no'})")
+
+    def _map_vectors(self):
+        count, dim = self.count, self.dim
+        if not count:
+            self._vectors = np.zeros((0, dim or 0), dtype=np.float32)
+            return
+        self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(count, dim))
+
+    def _read_metadata(self):
+        """Baca baris metadata yang belum dibaca (maksimal sampai jumlah baris ter-commit)"""
+        if len(self._records) >= self.count:
+            return
+        with open(self._path(METADATA_FILE), "rb") as f:
+            f.seek(self._metadata_offset)
+            while len(self._records) < self.count:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    raise ValueError(f"Embedding index metadata is shorter than header count ({self.count})")
+                self._records.append(json.loads(line))
+                self._metadata_offset += len(line)
+
+    def _load_ivf(self):
+        ivf = self._header.get("ivf")
+        self._centroids = self._assign = self._list_order = self._list_offsets = None
+        self._pending = []
+        if not ivf:
+            return
+        self._centroids = np.load(self._path(IVF_CENTROIDS_FILE))
+        assign = np.fromfile(self._path(IVF_ASSIGN_FILE), dtype=np.int32, count=self.count)
+        self._assign = assign
+        self._build_lists()
+
+    def _build_lists(self):
+        """Posting list IVF: baris diurutkan per list + offset awal setiap list"""
+        self._list_order = np.argsort(self._assign, kind="stable").astype(np.int64)
+        self._list_offsets = np.searchsorted(
+            self._assign[self._list_order], np.arange(len(self._centroids) + 1)
+        )
+        self._pending = []
+
+    def add(self, embeddings: np.ndarray, records: List[Dict[str, Any]], embedding_space: str) -> List[str]:
+        """
+        Tambah kasus referensi. records[i] berisi "label" (wajib), "case_id" dan
+        "source" (opsional). Return case_id per baris.
+        """
+        embeddings = _normalize(np.atleast_2d(embeddings))
+        if len(embeddings) != len(records):
+            raise ValueError(f"Got {len(embeddings)} embeddings for {len(records)} records")
+        self._refresh()
+        with self._lock:
+            if self.count and embeddings.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {embeddings.shape[1]} does not match index dim {self.dim}")
+            if self.count and embedding_space != self.embedding_space:
+                raise ValueError(
+                    f"Embedding index was built with model {self.embedding_space}, not {embedding_space}"
+                )
+
+            now = time.time()
+            rows = []
+            for record in records:
+                if not record.get("label"):
+                    raise ValueError("Every reference case needs a label")
+                rows.append({
+                    "case_id": str(record.get("case_id") or uuid.uuid4().hex),
+                    "label": record["label"],
+                    "source": record.get("source"),
+                    "added_at": now,
+                })
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            start = self.count
+            dim = embeddings.shape[1]
+            self._append_file(VECTORS_FILE, start * dim * 4, embeddings.tobytes())
+            self._append_file(METADATA_FILE, self._metadata_offset,
+                              b"".join(json.dumps(row).encode() + b"\n" for row in rows))
+            assign = None
+            if self._centroids is not None:
+                assign = np.argmax(embeddings @ self._centroids.T, axis=1).astype(np.int32)
+                self._append_file(IVF_ASSIGN_FILE, start * 4, assign.tobytes())
+
+            header = dict(self._header, dim=dim, count=start + len(rows), embedding_space=embedding_space,
+                          updated_at=now)
+            self._write_header(header)
+
+            # State in-memory tanpa reload penuh
+            self._header = header
+            self._map_vectors()
+            self._read_metadata()
+            if assign is not None:
+                self._assign = np.concatenate([self._assign, assign])
+                self._pending.extend(range(start, self.count))
+                if len(self._pending) >= PENDING_REBUILD_ROWS:
+                    self._build_lists()
+            self._loaded_mtime = self._path(HEADER_FILE).stat().st_mtime_ns
+        return [row["case_id"] for row in rows]
+
+    def _append_file(self, name: str, committed_bytes: int, data: bytes):
+        """Potong sisa append yang tidak ter-commit, lalu tulis data di ujung file"""
+        path = self._path(name)
+        with open(path, "ab") as f:
+            f.truncate(committed_bytes)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_header(self, header: Dict[str, Any]):
+        tmp_path = self._path(HEADER_FILE + ".tmp")
+        tmp_path.write_text(json.dumps(header, indent=2))
+        os.replace(tmp_path, self._path(HEADER_FILE))
+
+    def search(self, query: np.ndarray, k: int = 5, mode: str = None, nprobe: int = None,
+               embedding_space: str = None) -> List[Dict[str, Any]]:
+        """k kasus referensi terdekat (cosine similarity) untuk satu embedding"""
+        mode = (mode or self.mode).lower()
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode} (choose from {', '.join(SEARCH_MODES)})")
+        self._refresh()
+        with self._lock:
+            vectors, records = self._vectors, self._records
+            centroids, assign = self._centroids, self._assign
+            list_order, list_offsets, pending = self._list_order, self._list_offsets, list(self._pending)
+            count, space = self.count, self.embedding_space
+        if count == 0:
+            return []
+        if embedding_space and embedding_space != space:
+            raise ValueError(f"Embedding index was built with model {space}, not {embedding_space}")
+
+        query = _normalize(np.asarray(query).reshape(-1))
+        if query.shape[0] != vectors.shape[1]:
+            raise ValueError(f"Query dim {query.shape[0]} does not match index dim {vectors.shape[1]}")
+
+        use_ivf = centroids is not None and (mode == "ivf" or (mode == "auto" and count >= self.ann_min_vectors))
+        if use_ivf:
+            probe = top_k(centroids @ query, min(nprobe or self.nprobe, len(centroids)))
+            rows = [list_order[list_offsets[c]:list_offsets[c + 1]] for c in probe]
+            if pending:
+                pending = np.asarray(pending, dtype=np.int64)
+                rows.append(pending[np.isin(assign[pending], probe)])
+            rows = np.sort(np.concatenate(rows))  # akses memmap berurutan
+            scores = vectors[rows] @ query
+            order = top_k(scores, k)
+            best, best_scores = rows[order], scores[order]
+        else:
+            scores = vectors @ query
+            best = top_k(scores, k)
+            best_scores = scores[best]
+
+        return [
+            {**records[row], "index": int(row), "score": float(score)}
+            for row, score in zip(best, best_scores)
+        ]
+
+    def train_ivf(self, nlist: int = None, iterations: int = 10, sample_size: int = 50000,
+                  seed: int = 0) -> Dict[str, Any]:
+        """
+        Train index IVF (spherical k-means atas sampel vectors), lalu tetapkan
+        list setiap baris. Baris yang ditambahkan setelahnya langsung masuk list
+        centroid terdekat; train ulang kalau distribusi data berubah banyak.
+        """
+        self._refresh()
+        with self._lock:
+            count = self.count
+            if count == 0:
+                raise ValueError("Embedding index is empty")
+            started = time.perf_counter()
+            rng = np.random.default_rng(seed)
+            nlist = min(nlist or max(1, int(math.sqrt(count))), count)
+            sample_rows = np.sort(rng.choice(count, size=min(count, max(sample_size, nlist)), replace=False))
+            sample = np.asarray(self._vectors[sample_rows])
+
+            centroids = spherical_kmeans(sample, nlist, iterations, rng)
+            assign = np.concatenate([
+                np.argmax(np.asarray(self._vectors[start:start + ASSIGN_CHUNK_ROWS]) @ centroids.T, axis=1)
+                for start in range(0, count, ASSIGN_CHUNK_ROWS)
+            ]).astype(np.int32)
+
+            tmp_centroids = self._path(IVF_CENTROIDS_FILE + ".tmp.npy")
+            np.save(tmp_centroids, centroids)
+            os.replace(tmp_centroids, self._path(IVF_CENTROIDS_FILE))
+            tmp_assign = self._path(IVF_ASSIGN_FILE + ".tmp")
+            assign.tofile(tmp_assign)
+            os.replace(tmp_assign, self._path(IVF_ASSIGN_FILE))
+
+            seconds = time.perf_counter() - started
+            ivf = {"nlist": nlist, "trained_count": count, "trained_at": time.time(),
+                   "train_seconds": round(seconds, 3)}
+            self._header = dict(self._header, ivf=ivf)
+            self._write_header(self._header)
+            self._centroids, self._assign = centroids, assign
+            self._build_lists()
+            self._loaded_mtime = self._path(HEADER_FILE).stat().st_mtime_ns
+
+        sizes = np.diff(self._list_offsets)
+        logger.info(f" Embedding IVF trained: {nlist} lists over {count} vectors in {seconds:.1f}s")
+        return {**ivf, "list_size_mean": float(sizes.mean()), "list_size_max": int(sizes.max())}
+
+    def stats(self) -> Dict[str, Any]:
+        self._refresh()
+        labels: Dict[str, int] = {}
+        for record in self._records:
+            labels[record["label"]] = labels.get(record["label"], 0) + 1
+        return {
+            "directory": str(self.directory),
+            "count": self.count,
+            "dim": self.dim,
+            "embedding_space": self.embedding_space,
+            "mode": self.mode,
+            "ann_min_vectors": self.ann_min_vectors,
+            "nprobe": self.nprobe,
+            "ivf": self._header.get("ivf"),
+            "labels": labels,
+        }
+
+
+# Global instance
+embedding_index = EmbeddingIndex()
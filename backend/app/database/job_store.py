@@ -0,0 +1,269 @@
+# app/database/job_store.py
+"""
+Antrian job prediksi yang persisten (SQLite, WAL).
+
+Satu baris per job: gambar disimpan sebagai BLOB sampai job selesai, lalu
+diganti hasil (JSON). Claim batch memakai BEGIN IMMEDIATE sehingga aman
+dipakai beberapa worker/proses sekaligus.
+
+Setiap claim menulis lease: owner (host:pid:token proses ini) dan
+lease_expires_at. Proses pemilik memperpanjang lease job yang sedang ia
+jalankan (renew_leases); hanya job yang lease-nya benar-benar habis (proses
+pemiliknya mati atau macet) yang dikembalikan ke antrian, jadi proses yang
+restart tidak mengambil job yang masih dijalankan proses lain. Job yang
+sudah mencapai max_attempts saat lease-nya habis langsung failed, supaya
+gambar yang membuat proses crash tidak di-requeue terus-menerus.
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DB_DIR = Path(__file__).parent.parent.parent
+JOBS_DB_PATH = Path(os.getenv("PREDICT_JOBS_DB", str(DB_DIR / "jobs.db")))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED)
+
+
+class JobStore:
+    """Akses tabel prediction_jobs (thread-safe, satu koneksi + lock)"""
+
+    def __init__(self, db_path: Path = JOBS_DB_PATH):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._token = uuid.uuid4().hex[:8]
+
+    @property
+    def owner(self) -> str:
+        """Identitas pemegang lease; pid dibaca ulang supaya proses hasil fork punya owner sendiri"""
+        return f"{socket.gethostname()}:{os.getpid()}:{self._token}"
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS prediction_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    image BLOB,
+                    image_hash TEXT,
+                    filename TEXT,
+                    user_id INTEGER,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    lease_owner TEXT,
+                    lease_expires_at REAL
+                )
+            ''')
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(prediction_jobs)")}
+            for column, kind in (("lease_owner", "TEXT"), ("lease_expires_at", "REAL")):
+                if column not in columns:  # database dari versi sebelum ada lease
+                    conn.execute(f"ALTER TABLE prediction_jobs ADD COLUMN {column} {kind}")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_prediction_jobs_status ON prediction_jobs (status, created_at)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def enqueue(self, image: bytes, image_hash: str = None, filename: str = None,
+                user_id: int = None) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO prediction_jobs (id, status, image, image_hash, filename, user_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, sqlite3.Binary(image), image_hash, filename, user_id, now)
+            )
+        return {"id": job_id, "status": JOB_QUEUED, "created_at": now}
+
+    def claim(self, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        """Ambil maksimal `limit` job queued paling lama -> status running dengan lease milik proses ini"""
+        now = time.time()
+        owner = self.owner
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id, image, image_hash, filename, attempts, created_at FROM prediction_jobs "
+                    "WHERE status = ? ORDER BY created_at LIMIT ?",
+                    (JOB_QUEUED, limit)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE prediction_jobs SET status = ?, started_at = ?, attempts = attempts + 1, "
+                    "lease_owner = ?, lease_expires_at = ? WHERE id = ?",
+                    [(JOB_RUNNING, now, owner, now + lease_seconds, row["id"]) for row in rows]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return [dict(row, attempts=row["attempts"] + 1) for row in rows]
+
+    def complete(self, outcomes: List[Dict[str, Any]]):
+        """
+        Simpan hasil batch: setiap outcome {"id", "result"} (done) atau
+        {"id", "error", "retry"} (failed, atau kembali ke antrian kalau retry).
+        Hanya job yang lease-nya masih milik proses ini yang diubah; return
+        jumlah job yang tersimpan.
+        """
+        now = time.time()
+        owner = self.owner
+        saved = 0
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for outcome in outcomes:
+                    if outcome.get("retry"):
+                        cursor = conn.execute(
+                            "UPDATE prediction_jobs SET status = ?, started_at = NULL, error = ?, "
+                            "lease_owner = NULL, lease_expires_at = NULL "
+                            "WHERE id = ? AND status = ? AND lease_owner = ?",
+                            (JOB_QUEUED, outcome["error"], outcome["id"], JOB_RUNNING, owner)
+                        )
+                    elif "result" in outcome:
+                        cursor = conn.execute(
+                            "UPDATE prediction_jobs SET status = ?, result = ?, image = NULL, error = NULL, "
+                            "finished_at = ?, lease_owner = NULL, lease_expires_at = NULL "
+                            "WHERE id = ? AND status = ? AND lease_owner = ?",
+                            (JOB_DONE, json.dumps(outcome["result"]), now, outcome["id"], JOB_RUNNING, owner)
+                        )
+                    else:
+                        cursor = conn.execute(
+                            "UPDATE prediction_jobs SET status = ?, error = ?, image = NULL, finished_at = ?, "
+                            "lease_owner = NULL, lease_expires_at = NULL "
+                            "WHERE id = ? AND status = ? AND lease_owner = ?",
+                            (JOB_FAILED, outcome["error"], now, outcome["id"], JOB_RUNNING, owner)
+                        )
+                    saved += cursor.rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if saved < len(outcomes):
+            logger.warning(" %d prediction job result(s) discarded: lease lost to another worker",
+                           len(outcomes) - saved)
+        return saved
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT id, status, filename, result, error, attempts, created_at, started_at, finished_at "
+                "FROM prediction_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            if job["status"] == JOB_QUEUED:
+                job["queue_position"] = conn.execute(
+                    "SELECT COUNT(*) FROM prediction_jobs WHERE status = ? AND created_at < ?",
+                    (JOB_QUEUED, job["created_at"])
+                ).fetchone()[0] + 1
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def renew_leases(self, lease_seconds: float) -> int:
+        """Perpanjang lease semua job running milik proses ini"""
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE prediction_jobs SET lease_expires_at = ? WHERE status = ? AND lease_owner = ?",
+                (time.time() + lease_seconds, JOB_RUNNING, self.owner)
+            )
+            return cursor.rowcount
+
+    def requeue_expired(self, max_attempts: int, lease_seconds: float) -> Dict[str, int]:
+        """
+        Job running yang lease-nya habis (pemiliknya mati/macet): kembali ke
+        antrian, atau failed kalau attempts sudah max_attempts. Baris lama tanpa
+        lease dianggap habis lease_seconds setelah started_at.
+        """
+        now = time.time()
+        expired = "status = ? AND COALESCE(lease_expires_at, started_at + ?) < ?"
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                failed = conn.execute(
+                    "UPDATE prediction_jobs SET status = ?, image = NULL, finished_at = ?, "
+                    "error = 'Worker lost while processing (gave up after ' || attempts || ' attempts)', "
+                    f"lease_owner = NULL, lease_expires_at = NULL WHERE {expired} AND attempts >= ?",
+                    (JOB_FAILED, now, JOB_RUNNING, lease_seconds, now, max_attempts)
+                ).rowcount
+                requeued = conn.execute(
+                    "UPDATE prediction_jobs SET status = ?, started_at = NULL, "
+                    f"lease_owner = NULL, lease_expires_at = NULL WHERE {expired}",
+                    (JOB_QUEUED, JOB_RUNNING, lease_seconds, now)
+                ).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return {"requeued": requeued, "failed": failed}
+
+    def purge_finished(self, older_than: float) -> int:
+        """Hapus job done/failed yang selesai lebih dari older_than detik lalu"""
+        with self._lock:
+            cursor = self._connect().execute(
+                "DELETE FROM prediction_jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (*FINISHED_STATUSES, time.time() - older_than)
+            )
+            return cursor.rowcount
+
+    def queued_count(self) -> int:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM prediction_jobs WHERE status = ?", (JOB_QUEUED,)
+            ).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Panjang antrian, umur job tertua, dan waktu tunggu/proses job satu jam terakhir"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            counts = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED)}
+            for row in conn.execute("SELECT status, COUNT(*) AS n FROM prediction_jobs GROUP BY status"):
+                counts[row["status"]] = row["n"]
+            oldest = conn.execute(
+                "SELECT MIN(created_at) FROM prediction_jobs WHERE status = ?", (JOB_QUEUED,)
+            ).fetchone()[0]
+            recent = conn.execute(
+                "SELECT AVG(started_at - created_at), AVG(finished_at - started_at), COUNT(*) "
+                "FROM prediction_jobs WHERE status = ? AND finished_at >= ?",
+                (JOB_DONE, now - 3600)
+            ).fetchone()
+        return {
+            "queue_length": counts[JOB_QUEUED],
+            "oldest_queued_age_seconds": round(now - oldest, 3) if oldest else 0.0,
+            "by_status": counts,
+            "completed_last_hour": recent[2],
+            "avg_wait_ms": round(1000 * recent[0], 1) if recent[0] is not None else None,
+            "avg_processing_ms": round(1000 * recent[1], 1) if recent[1] is not None else None,
+        }
+
+
+# Global instance
+job_store = JobStore()
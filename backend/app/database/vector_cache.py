@@ -0,0 +1,182 @@
+# app/database/vector_cache.py
+"""
+Cache embedding di disk, key = hash isi teks (sha1), satu namespace per
+model embedding (model_id). Dipakai untuk embedding produk supaya restart
+dan worker tambahan tidak meng-embed ulang katalog.
+
+Isi VECTOR_CACHE_DIR/<namespace>/:
+
+    vectors.f32   float32 (count, dim), append-only, dibuka dengan np.memmap
+    keys.bin      digest sha1 20 byte per baris, sejajar vectors.f32
+    header.json   model_id, dim, count ter-commit (commit point, atomic rename)
+
+Sama seperti app/database/embedding_index.py: data ditulis dulu, header
+terakhir; sisa append yang terputus dipotong pada append berikutnya. Append
+dari beberapa proses diserialisasi dengan flock pada file lock, dan proses
+lain memuat baris baru saat mtime header.json berubah.
+"""
+import os
+import re
+import json
+import contextlib
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: tanpa lock antar proses
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DB_DIR = Path(__file__).parent.parent.parent
+
+# Konfigurasi (bisa di-override lewat environment variable)
+VECTOR_CACHE_DIR = Path(os.getenv("VECTOR_CACHE_DIR", str(DB_DIR / "vector_cache")))
+
+VECTORS_FILE = "vectors.f32"
+KEYS_FILE = "keys.bin"
+HEADER_FILE = "header.json"
+LOCK_FILE = "lock"
+KEY_BYTES = 20
+
+
+def content_key(text: str) -> bytes:
+    return hashlib.sha1((text or "").encode("utf-8", "surrogatepass")).digest()
+
+
+@contextlib.contextmanager
+def directory_lock(directory: Path):
+    """flock eksklusif antar proses pada directory/lock (no-op tanpa fcntl)"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / LOCK_FILE, "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class VectorCache:
+    """Cache vector per hash isi teks untuk satu model (thread-safe, multi-proses)"""
+
+    def __init__(self, model_id: str, dim: int, directory: Path = VECTOR_CACHE_DIR):
+        self.model_id = model_id
+        self.dim = dim
+        namespace = re.sub(r"[^A-Za-z0-9._-]+", "_", model_id)
+        self.directory = Path(directory) / namespace
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+        self._count = 0
+        self._rows: Dict[bytes, int] = {}
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def _refresh_locked(self):
+        try:
+            mtime = self._path(HEADER_FILE).stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        header = json.loads(self._path(HEADER_FILE).read_text())
+        if header["model_id"] != self.model_id or header["dim"] != self.dim:
+            raise ValueError(f"Vector cache {self.directory} belongs to {header['model_id']} "
+                             f"(dim {header['dim']}), not {self.model_id} (dim {self.dim})")
+        count = header["count"]
+        if count > self._count:
+            with open(self._path(KEYS_FILE), "rb") as f:
+                f.seek(self._count * KEY_BYTES)
+                keys = f.read((count - self._count) * KEY_BYTES)
+            for offset in range(0, len(keys), KEY_BYTES):
+                self._rows.setdefault(keys[offset:offset + KEY_BYTES], self._count + offset // KEY_BYTES)
+            self._count = count
+            self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r",
+                                      shape=(count, self.dim))
+        self._loaded_mtime = mtime
+
+    def _file_lock(self):
+        return directory_lock(self.directory)
+
+    def _append_locked(self, keys: List[bytes], vectors: np.ndarray):
+        """Append baris baru lalu commit header (dipanggil di bawah _file_lock)"""
+        start = self._count
+        self._append_file(VECTORS_FILE, start * self.dim * 4, np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self._append_file(KEYS_FILE, start * KEY_BYTES, b"".join(keys))
+        header = {"model_id": self.model_id, "dim": self.dim, "count": start + len(keys), "updated_at": time.time()}
+        tmp_path = self._path(HEADER_FILE + ".tmp")
+        tmp_path.write_text(json.dumps(header, indent=2))
+        os.replace(tmp_path, self._path(HEADER_FILE))
+        self._refresh_locked()
+
+    def _append_file(self, name: str, committed_bytes: int, data: bytes):
+        with open(self._path(name), "ab") as f:
+            f.truncate(committed_bytes)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _missing(self, keys: List[bytes], texts: List[str]) -> Dict[bytes, str]:
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in self._rows and key not in missing:
+                missing[key] = text
+        return missing
+
+    def get_or_compute(self, texts: List[str], compute: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        (N, dim) float32 untuk texts: baris yang sudah ada diambil dari file,
+        hanya teks unik yang belum ada yang di-compute lalu disimpan.
+        """
+        keys = [content_key(text) for text in texts]
+        with self._lock:
+            self._refresh_locked()
+            missing = self._missing(keys, texts)
+            if missing:
+                # Compute di bawah file lock: worker lain yang start bersamaan menunggu
+                # lalu memakai hasilnya, bukan ikut meng-embed teks yang sama
+                with self._file_lock():
+                    self._refresh_locked()
+                    missing = self._missing(keys, texts)
+                    if missing:
+                        started = time.perf_counter()
+                        vectors = np.asarray(compute(list(missing.values())), dtype=np.float32)
+                        if vectors.shape != (len(missing), self.dim):
+                            raise ValueError(
+                                f"Expected vectors of shape {(len(missing), self.dim)}, got {vectors.shape}"
+                            )
+                        self._append_locked(list(missing), vectors)
+                        logger.info(" Vector cache %s: embedded %d new texts in %.0f ms (%d cached)",
+                                    self.model_id, len(missing), (time.perf_counter() - started) * 1000,
+                                    len(texts) - len(missing))
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            rows = np.fromiter((self._rows[key] for key in keys), dtype=np.int64, count=len(keys))
+            return np.asarray(self._vectors[rows], dtype=np.float32)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "directory": str(self.directory),
+            "model_id": self.model_id,
+            "dim": self.dim,
+            "count": self._count,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
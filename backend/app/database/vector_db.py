@@ -1,10 +1,32 @@
 # app/database/vector_db.py
+import os
+import time
+import threading
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .embedding_index import top_k as _top_k_indices
+from .bm25_index import BM25Index, product_fields
+from .vector_cache import VectorCache, content_key
+from .ann_index import ANN_BACKENDS, create_index, load_index
+from app.models.text_embedding import text_embedding_model, TextEmbeddingModel
 
 logger = logging.getLogger(__name__)
 
+# Konfigurasi (bisa di-override lewat environment variable)
+PRODUCT_SEARCH_MODE = os.getenv("PRODUCT_SEARCH_MODE", "auto").lower()  # auto, lexical, hybrid
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+PRODUCT_ANN_BACKEND = os.getenv("PRODUCT_ANN_BACKEND", "ivf").lower()  # ivf, hnsw, none
+PRODUCT_ANN_MIN_PRODUCTS = int(os.getenv("PRODUCT_ANN_MIN_PRODUCTS", "20000"))
+PRODUCT_ANN_NPROBE = int(os.getenv("PRODUCT_ANN_NPROBE", "16"))
+PRODUCT_ANN_EF_SEARCH = int(os.getenv("PRODUCT_ANN_EF_SEARCH", "64"))
+
+SEARCH_MODES = ("auto", "lexical", "hybrid")
+EMBEDDING_DIM = 100
+
 # ==== [OPSI: pakai static PRODUCTS lebih dulu] =========================
 def _load_products_from_static():
     """
@@ -73,84 +95,373 @@ def _load_products_from_db():
         except Exception:
             pass
 
+def _catalog_version() -> Tuple:
+    """
+    Versi katalog yang murah dicek per query (tanpa membaca isi katalog):
+    identitas + panjang list static PRODUCTS, atau mtime/size file database
+    kalau fallback ke DB. Berubah -> index produk di-build ulang.
+    """
+    try:
+        from .products_data import PRODUCTS as STATIC_PRODUCTS
+        if STATIC_PRODUCTS:
+            return ("static", id(STATIC_PRODUCTS), len(STATIC_PRODUCTS))
+    except Exception:
+        pass
+    from .connection import DB_PATH
+    try:
+        stat = DB_PATH.stat()
+        return ("db", stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return ("db", None, None)
+
 def _fetch_all_products():
     """
     Prefer static list; fallback DB kalau static kosong/gagal.
     """
     static_products = _load_products_from_static()
     if static_products:
-        logger.info(f"Loaded {len(static_products)} products from static PRODUCTS")
+        logger.debug("Loaded %d products from static PRODUCTS", len(static_products))
         return static_products
 
     db_products = _load_products_from_db()
-    logger.info(f"Loaded {len(db_products)} products from DB")
+    logger.debug("Loaded %d products from DB", len(db_products))
     return db_products
 
 # ==== [Embedding sederhana] ============================================
+SKINCARE_KEYWORDS = {
+    'kulit': 1.0, 'skin': 1.0, 'jerawat': 0.9, 'acne': 0.9, 
+    'kering': 0.8, 'dry': 0.8, 'berminyak': 0.8, 'oily': 0.8,
+    'sensitif': 0.7, 'sensitive': 0.7, 'pori': 0.6, 'pore': 0.6,
+    'bekas': 0.5, 'scar': 0.5, 'merah': 0.5, 'redness': 0.5,
+    'gatal': 0.4, 'itchy': 0.4, 'face': 0.3
+}
+
+def _keyword_slot_table() -> List[np.ndarray]:
+    """
+    Keyword ke-j menambah bobotnya ke slot D - 1 - (j % 10). Dipecah jadi
+    matrix (K, D) per putaran dengan slot yang tidak bentrok, sehingga
+    presence @ matrix menjumlah per slot berurutan persis seperti loop keyword
+    satu per satu (setiap slot hanya dapat satu bobot per putaran).
+    """
+    rounds: List[np.ndarray] = []
+    per_slot: Dict[int, int] = {}
+    for j, weight in enumerate(SKINCARE_KEYWORDS.values()):
+        slot = EMBEDDING_DIM - 1 - (j % 10)
+        position = per_slot.get(slot, 0)
+        per_slot[slot] = position + 1
+        if position == len(rounds):
+            rounds.append(np.zeros((len(SKINCARE_KEYWORDS), EMBEDDING_DIM), dtype=float))
+        rounds[position][j, slot] = weight
+    return rounds
+
+_KEYWORDS = list(SKINCARE_KEYWORDS)
+_KEYWORD_ROUNDS = _keyword_slot_table()
+
+def get_text_embeddings(texts: List[str]) -> np.ndarray:
+    """
+    Batch versi get_text_embedding -> (N, D) float64, hasilnya identik per
+    baris: codepoint 100 karakter pertama dibagi 1000, bobot keyword ke
+    slotnya, lalu normalisasi L2 per baris.
+    """
+    count = len(texts)
+    embeddings = np.zeros((count, EMBEDDING_DIM), dtype=float)
+    if count == 0:
+        return embeddings
+    lowered = [text.lower().strip() if text else "" for text in texts]
+
+    # char-frequency-ish features (first D chars), padding '\0' bernilai 0;
+    # surrogatepass: lone surrogate (mis. dari JSON "\ud800") tetap jadi ord()-nya
+    padded = "".join(text[:EMBEDDING_DIM].ljust(EMBEDDING_DIM, "\0") for text in lowered)
+    codepoints = np.frombuffer(padded.encode("utf-32-le", "surrogatepass"),
+                               dtype=np.uint32).reshape(count, EMBEDDING_DIM)
+    np.divide(codepoints, 1000.0, out=embeddings)
+
+    # keyword boosts: presence (N, K) x tabel keyword -> slot, per putaran
+    presence = np.fromiter((word in text for text in lowered for word in _KEYWORDS), dtype=bool,
+                           count=count * len(_KEYWORDS)).reshape(count, len(_KEYWORDS)).astype(float)
+    for slot_weights in _KEYWORD_ROUNDS:
+        embeddings += presence @ slot_weights
+
+    # normalize (dot per baris seperti np.linalg.norm 1-D, supaya hasilnya sama persis)
+    norms = np.sqrt(np.matmul(embeddings[:, None, :], embeddings[:, :, None])[:, 0, 0])
+    nonzero = norms > 0
+    embeddings[nonzero] /= norms[nonzero, None]
+    return embeddings
+
 def get_text_embedding(text: str) -> np.ndarray:
     """
     Simple text embedding menggunakan approach sederhana (karakter + keyword boost).
     """
-    if not text:
-        return np.zeros(100, dtype=float)
-
-    text = text.lower().strip()
-
-    # char-frequency-ish features (first 100 chars)
-    embedding = np.zeros(100, dtype=float)
-    for i, char in enumerate(text[:100]):
-        embedding[i % 100] += ord(char) / 1000.0
-
-    # keyword boosts
-    skincare_keywords = {
-        'kulit': 1.0, 'skin': 1.0, 'jerawat': 0.9, 'acne': 0.9, 
-        'kering': 0.8, 'dry': 0.8, 'berminyak': 0.8, 'oily': 0.8,
-        'sensitif': 0.7, 'sensitive': 0.7, 'pori': 0.6, 'pore': 0.6,
-        'bekas': 0.5, 'scar': 0.5, 'merah': 0.5, 'redness': 0.5,
-        'gatal': 0.4, 'itchy': 0.4, 'face': 0.3
-    }
-    keys = list(skincare_keywords.keys())
-    for word, weight in skincare_keywords.items():
-        if word in text:
-            idx = len(embedding) - 1 - (keys.index(word) % 10)
-            embedding[idx] += weight
-
-    # normalize
-    norm = np.linalg.norm(embedding)
-    if norm > 0:
-        embedding = embedding / norm
-    return embedding
+    return get_text_embeddings([text])[0]
 
-# ==== [Search] =========================================================
-def search_products(query: str, top_k: int = 3):
+# ==== [Index produk] ==================================================
+def product_text(p: Dict[str, Any]) -> str:
+    """Representasi teks produk yang di-embed (pakai fields yang ada)"""
+    cond_text = " ".join(p.get("for_conditions", [])) if p.get("for_conditions") else ""
+    return f"{p.get('name','')} {p.get('description','')} {p.get('category','')} {cond_text}"
+
+def semantic_product_text(p: Dict[str, Any]) -> str:
+    """Teks untuk model sentence-embedding: field pendek dulu (input dipotong TEXT_EMBEDDING_MAX_LENGTH token)"""
+    cond_text = ", ".join(p.get("for_conditions", []) or [])
+    return f"{p.get('name','')}. {p.get('category','')}. {cond_text}. {p.get('description','')}"
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[Any, float]]], k: int = RRF_K) -> List[Tuple[Any, float]]:
+    """Gabung beberapa ranking (id, skor): skor RRF = jumlah 1 / (k + rank), rank mulai 1"""
+    fused: Dict[Any, float] = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _search_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="product-search")
+    return _executor
+
+class ProductIndex:
     """
-    Search products berdasarkan cosine similarity antara embedding query vs product text.
-    Sumber data: static PRODUCTS (prefer) → fallback ke DB.
+    Embedding semua produk dihitung sekali ke satu matrix float32 (N, D) yang
+    sudah dinormalisasi, jadi satu query = satu matrix-vector product + top-k
+    (argpartition). Index di-build ulang hanya kalau versi katalog berubah;
+    panggil invalidate() setelah mengubah isi katalog di tempat (in-place).
+
+    Index leksikal BM25 (self.lexical) ikut disamakan saat versi berubah,
+    tapi inkremental: hanya produk baru/berubah yang di-tokenisasi ulang.
+
+    Untuk mode hybrid, matrix embedding semantik (model sentence-embedding
+    lokal) dibuat lazy per versi katalog dari VectorCache di disk, jadi
+    hanya produk yang isinya belum pernah di-embed yang masuk ke model.
+    Mulai ann_min_products produk, sisi semantik memakai index ANN
+    (app/database/ann_index.py) di samping VectorCache: disimpan ke disk,
+    dimuat via memmap saat restart, dan disamakan inkremental (key = hash
+    isi teks produk) setiap versi katalog berubah.
     """
-    try:
-        products = _fetch_all_products()
+
+    def __init__(self, loader=_fetch_all_products, version=_catalog_version,
+                 text_model: TextEmbeddingModel = text_embedding_model, ann_backend: str = PRODUCT_ANN_BACKEND,
+                 ann_min_products: int = PRODUCT_ANN_MIN_PRODUCTS, ann_effort: int = None):
+        if ann_backend != "none" and ann_backend not in ANN_BACKENDS:
+            raise ValueError(f"Unknown ANN backend: {ann_backend} (choose from {', '.join(ANN_BACKENDS)}, none)")
+        self._loader = loader
+        self._version = version
+        self._lock = threading.Lock()
+        self.lexical = BM25Index()
+        self.text_model = text_model
+        self.ann_backend = ann_backend
+        self.ann_min_products = ann_min_products
+        self.ann_effort = ann_effort or (PRODUCT_ANN_EF_SEARCH if ann_backend == "hnsw" else PRODUCT_ANN_NPROBE)
+        self._vector_cache: Optional[VectorCache] = None
+        self._ann = None
+        # (version, matrix, ann, posisi per key) - matrix None kalau memakai ann
+        self._semantic: Optional[Tuple[Any, Optional[np.ndarray], Any, Optional[Dict[bytes, List[int]]]]] = None
+        # (version, products, ids, matrix, posisi per id) diganti sekaligus -> search tanpa lock
+        self._snapshot: Optional[Tuple[Any, List[Dict[str, Any]], np.ndarray, np.ndarray, Dict[Any, int]]] = None
+        self.builds = 0
+        self.last_build_ms = 0.0
+
+    @staticmethod
+    def embed_products(products: List[Dict[str, Any]]) -> np.ndarray:
+        return get_text_embeddings([product_text(p) for p in products]).astype(np.float32)
+
+    def _build(self, version) -> Tuple:
+        started = time.perf_counter()
+        products = self._loader()
+        ids = np.array([p.get("id") for p in products], dtype=object)
+        matrix = np.ascontiguousarray(self.embed_products(products))
+        positions = {p.get("id"): row for row, p in enumerate(products)}
+        lexical = self.lexical.sync((p.get("id"), product_fields(p)) for p in products)
+        self.builds += 1
+        self.last_build_ms = round((time.perf_counter() - started) * 1000, 3)
+        logger.info(" Product index built: %d products in %.1f ms (catalog %s, bm25 %s)",
+                    len(products), self.last_build_ms, version[0], lexical)
+        return (version, products, ids, matrix, positions)
+
+    def _current(self) -> Tuple:
+        version = self._version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot[0] == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot[0] != version:
+                snapshot = self._snapshot = self._build(version)
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def _rank(self, query: str, top_k: int) -> Tuple[List[Dict[str, Any]], np.ndarray, np.ndarray, np.ndarray]:
+        _, products, ids, matrix, _ = self._current()
         if not products:
-            logger.info("No products available to search.")
+            return products, ids, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query_embedding = get_text_embedding(query or "").astype(np.float32)
+        scores = matrix @ query_embedding
+        order = _top_k_indices(scores, top_k)
+        return products, ids, order, scores[order]
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        products, _, order, _ = self._rank(query, top_k)
+        return [products[i] for i in order]
+
+    def search_ids(self, query: str, top_k: int = 3) -> List[Tuple[Any, float]]:
+        """(id produk, skor cosine) top-k"""
+        _, ids, order, scores = self._rank(query, top_k)
+        return list(zip(ids[order].tolist(), scores.tolist()))
+
+    def search_lexical_ids(self, query: str, top_k: int = 3) -> List[Tuple[Any, float]]:
+        """(id produk, skor BM25) top-k; hanya produk yang memuat term query"""
+        self._current()
+        return self.lexical.search_ids(query, top_k)
+
+    def search_lexical(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        _, products, _, _, positions = self._current()
+        hits = self.lexical.search_ids(query, top_k)
+        return [products[positions[doc_id]] for doc_id, _ in hits if doc_id in positions]
+
+    def _semantic_state(self, snapshot: Tuple) -> Tuple:
+        version, products = snapshot[0], snapshot[1]
+        semantic = self._semantic
+        if semantic is not None and semantic[0] == version:
+            return semantic
+        with self._lock:
+            semantic = self._semantic
+            if semantic is None or semantic[0] != version:
+                model = self.text_model
+                if self._vector_cache is None or self._vector_cache.model_id != model.model_id:
+                    self._vector_cache = VectorCache(model.model_id, model.dim)
+                    self._ann = None
+                texts = [semantic_product_text(p) for p in products]
+                if self.ann_backend == "none" or len(products) < self.ann_min_products:
+                    matrix = self._vector_cache.get_or_compute(texts, model.embed)
+                    semantic = (version, np.ascontiguousarray(matrix), None, None)
+                else:
+                    semantic = (version, None) + self._sync_ann(texts)
+                self._semantic = semantic
+        return semantic
+
+    def _sync_ann(self, texts: List[str]) -> Tuple[Any, Dict[bytes, List[int]]]:
+        """Samakan index ANN dengan katalog: hanya key baru yang ditambah, key yang hilang dihapus"""
+        started = time.perf_counter()
+        positions: Dict[bytes, List[int]] = {}
+        for row, text in enumerate(texts):
+            positions.setdefault(content_key(text), []).append(row)
+
+        directory = self._vector_cache.directory / f"ann-{self.ann_backend}"
+        ann = self._ann
+        if ann is None:
+            try:
+                ann = load_index(directory, self.ann_backend, self.ann_effort)
+            except FileNotFoundError:
+                ann = create_index(self.ann_backend, self.text_model.dim, self.ann_effort)
+        removed = ann.remove([key for key in ann.keys() if key not in positions])
+        new_keys = [key for key in positions if key not in ann]
+        if new_keys:
+            vectors = self._vector_cache.get_or_compute([texts[positions[key][0]] for key in new_keys],
+                                                        self.text_model.embed)
+            ann.add(new_keys, vectors)
+        if ann.needs_training():
+            ann.train()
+        if ann.needs_save():
+            try:
+                ann.save(directory)
+            except OSError as e:
+                logger.warning(f"Saving product ANN index failed (kept in memory): {e}")
+        self._ann = ann
+        logger.info(" Product ANN index (%s) synced: +%d -%d, %d vectors in %.1f ms",
+                    self.ann_backend, len(new_keys), removed, len(ann), (time.perf_counter() - started) * 1000)
+        return ann, positions
+
+    def search_semantic_ids(self, query: str, top_k: int = 3) -> List[Tuple[Any, float]]:
+        """(id produk, skor cosine model sentence-embedding) top-k; approximate kalau memakai ANN"""
+        snapshot = self._current()
+        if not snapshot[1]:
             return []
+        _, matrix, ann, positions = self._semantic_state(snapshot)
+        query_embedding = self.text_model.embed_query(query or "")
+        ids = snapshot[2]
+        if ann is None:
+            scores = matrix @ query_embedding
+            order = _top_k_indices(scores, top_k)
+            return list(zip(ids[order].tolist(), scores[order].tolist()))
+        hits = []
+        for key, score in ann.search(query_embedding, top_k):
+            hits.extend((ids[row], score) for row in positions.get(key, ()))
+        return hits[:top_k]
 
-        # query embedding
-        query_embedding = get_text_embedding(query or "")
+    def search_hybrid_ids(self, query: str, top_k: int = 3, candidates: int = HYBRID_CANDIDATES,
+                          rrf_k: int = RRF_K) -> List[Tuple[Any, float]]:
+        """
+        Kandidat BM25 (thread pool) dan semantik (thread ini) dihitung
+        bersamaan, lalu digabung dengan reciprocal rank fusion.
+        """
+        depth = max(candidates, top_k)
+        lexical = _search_executor().submit(self.search_lexical_ids, query, depth)
+        dense = self.search_semantic_ids(query, depth)
+        return reciprocal_rank_fusion([lexical.result(), dense], rrf_k)[:top_k]
 
-        # hitung similarity
-        scored = []
-        for p in products:
-            # representasi teks produk (pakai fields yang ada)
-            cond_text = " ".join(p.get("for_conditions", [])) if p.get("for_conditions") else ""
-            product_text = f"{p.get('name','')} {p.get('description','')} {p.get('category','')} {cond_text}"
-            prod_emb = get_text_embedding(product_text)
-            sim = float(cosine_similarity([query_embedding], [prod_emb])[0][0])
-            scored.append((p, sim))
+    def search_hybrid(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        hits = self.search_hybrid_ids(query, top_k)
+        _, products, _, _, positions = self._current()
+        return [products[positions[doc_id]] for doc_id, _ in hits if doc_id in positions]
 
-        # urutkan & ambil top_k
-        scored.sort(key=lambda x: x[1], reverse=True)
-        top_results = [prod for prod, _ in scored[:top_k]]
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "products": 0 if snapshot is None else len(snapshot[1]),
+            "catalog_version": None if snapshot is None else list(snapshot[0]),
+            "builds": self.builds,
+            "last_build_ms": self.last_build_ms,
+            "lexical": self.lexical.stats(),
+            "text_model": self.text_model.stats(),
+            "vector_cache": None if self._vector_cache is None else self._vector_cache.stats(),
+            "ann": None if self._ann is None else self._ann.stats(),
+        }
+
+# Global instance
+product_index = ProductIndex()
+
+# ==== [Search] =========================================================
+def search_products(query: str, top_k: int = 3, mode: str = None):
+    """
+    Search products.
+    - lexical: ranking BM25 (name, description, ingredients, usage, category,
+      for_conditions) untuk produk yang memuat kata dari query
+    - hybrid: BM25 + model sentence-embedding lokal digabung dengan
+      reciprocal rank fusion
+    - auto (default PRODUCT_SEARCH_MODE): hybrid kalau model lokal tersedia
+    Sisa slot top_k diisi ranking cosine embedding sederhana.
+    Sumber data: static PRODUCTS (prefer) → fallback ke DB.
+    """
+    mode = (mode or PRODUCT_SEARCH_MODE).lower()
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown product search mode: {mode} (choose from {', '.join(SEARCH_MODES)})")
+    if mode == "auto":
+        mode = "hybrid" if product_index.text_model.available else "lexical"
+    try:
+        top_results = []
+        if mode == "hybrid":
+            try:
+                top_results = product_index.search_hybrid(query, top_k)
+            except Exception as e:
+                logger.warning(f"Hybrid search failed, falling back to lexical: {e}")
+        if not top_results:
+            top_results = product_index.search_lexical(query, top_k)
+        if len(top_results) < top_k:
+            chosen = {id(p) for p in top_results}
+            dense = product_index.search(query, top_k + len(top_results))
+            top_results += [p for p in dense if id(p) not in chosen][:top_k - len(top_results)]
+        if not top_results:
+            logger.info("No products available to search.")
+            return []
 
-        logger.info(f"Search found {len(top_results)} products for query: '{query}'")
+        logger.debug("Search found %d products for query: %r", len(top_results), query)
         return top_results
 
     except Exception as e:
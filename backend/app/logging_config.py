@@ -0,0 +1,264 @@
+# app/logging_config.py
+"""
+Setup logging untuk seluruh backend - dipanggil sekali dari app/main.py
+(dan dari CLI seperti python -m app.models.snapshot). Modul lain hanya
+memakai logging.getLogger(__name__) dan tidak memanggil basicConfig.
+
+- Root logger -> QueueHandler: thread request hanya memasukkan LogRecord ke
+  antrian (non-blocking; kalau antrian penuh record dibuang dan dihitung).
+  Format pesan (argumen %-style di-format lazy) dan I/O dikerjakan thread
+  QueueListener. Karena itu jangan mengubah objek yang dikirim sebagai
+  argumen log setelah logger dipanggil.
+- Setiap record mendapat request_id dari contextvar yang diisi middleware
+  di main.py (header X-Request-ID).
+- LOG_SAMPLING: sampling per logger untuk baris volume tinggi, misalnya
+  "app.models.ai_model=0.01,app.routes.predict=0.1" (prefix nama logger
+  terpanjang yang cocok). WARNING ke atas tidak pernah di-sample.
+- LOG_FORMAT=json: satu objek JSON per baris, termasuk field dari extra={...};
+  LOG_FORMAT=text menambahkan field extra sebagai key=value.
+- Proses child: thread QueueListener tidak ikut ter-fork, jadi hook
+  os.register_at_fork mengganti queue handler di child dengan handler
+  stream langsung (filter dan formatter sama). Child hasil spawn memanggil
+  setup_process_logging() sendiri (lihat inference_pool._worker_main).
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import itertools
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+# Konfigurasi (bisa di-override lewat environment variable)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text, json
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(name)s:%(message)s"
+
+request_id_var: contextvars.ContextVar = contextvars.ContextVar("request_id", default="-")
+
+# Atribut bawaan LogRecord; sisanya berasal dari extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_handler: Optional["NonBlockingQueueHandler"] = None
+_listener: Optional[QueueListener] = None
+
+
+def parse_sampling(value: str) -> Dict[str, float]:
+    """ "logger=rate,logger=rate" -> {logger: rate}"""
+    rates = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition("=")
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            raise ValueError(f"Invalid LOG_SAMPLING entry: {item!r} (expected logger=rate)")
+    return rates
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class RequestIdFilter(logging.Filter):
+    """Tempel request_id request yang sedang berjalan ke setiap record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Loloskan 1 dari setiap round(1 / rate) record di bawah WARNING untuk
+    logger yang di-sample (deterministik per logger, tanpa random).
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+        self._every: Dict[str, int] = {}
+        self._counters: Dict[str, Any] = {}
+        self.dropped = 0
+
+    def _every_for(self, name: str) -> int:
+        every = self._every.get(name)
+        if every is None:
+            every = 1
+            for prefix, rate in self.rates:
+                if name == prefix or name.startswith(prefix + "."):
+                    every = 0 if rate <= 0 else max(1, round(1 / rate))
+                    break
+            self._every[name] = every
+        return every
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        every = self._every_for(record.name)
+        if every == 1:
+            return True
+        counter = self._counters.get(record.name)
+        if counter is None:
+            counter = self._counters.setdefault(record.name, itertools.count())
+        if every and next(counter) % every == 0:
+            return True
+        self.dropped += 1
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler yang tidak memformat di thread pemanggil dan tidak pernah menunggu"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Listener ada di proses yang sama: record dikirim apa adanya, diformat di sana
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Blocking: saat antrian penuh tunggu listener mengosongkannya dulu
+        self.queue.put(self._sentinel)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        line = super().format(record)
+        extra = _extra_fields(record)
+        if extra:
+            line += " | " + " ".join(f"{key}={value}" for key, value in extra.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage().strip(),
+        }
+        data.update(_extra_fields(record))
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+def setup_logging(level: str = None, fmt: str = None, sampling: str = None, stream=None,
+                  force: bool = False, queue_size: int = LOG_QUEUE_SIZE) -> None:
+    """Pasang queue handler di root logger (idempotent kecuali force=True)"""
+    global _handler, _listener
+    if _listener is not None:
+        if not force:
+            return
+        shutdown_logging()
+
+    output = _stream_handler(stream, fmt)
+    handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+    _add_filters(handler, sampling)
+    _install_root(handler, level)
+
+    _handler = handler
+    _listener = _Listener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def setup_process_logging(level: str = None, fmt: str = None, sampling: str = None, stream=None) -> None:
+    """
+    Handler stream langsung (tanpa antrian/listener) untuk proses child yang
+    belum punya handler, misalnya worker inference hasil spawn.
+    """
+    if logging.getLogger().handlers:
+        return
+    handler = _stream_handler(stream, fmt)
+    _add_filters(handler, sampling)
+    _install_root(handler, level)
+
+
+def _stream_handler(stream, fmt: str = None) -> logging.Handler:
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+    return output
+
+
+def _add_filters(handler: logging.Handler, sampling: str = None):
+    rates = parse_sampling(LOG_SAMPLING if sampling is None else sampling)
+    if rates:
+        handler.addFilter(SamplingFilter(rates))  # sebelum request id: record yang dibuang tidak diproses
+    handler.addFilter(RequestIdFilter())
+
+
+def _install_root(handler: logging.Handler, level: str = None):
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level or LOG_LEVEL)
+
+
+def _after_fork_in_child():
+    """Di child tidak ada thread listener yang mengosongkan antrian: tulis langsung ke stream"""
+    global _handler, _listener
+    if _listener is None:
+        return
+    output = _listener.handlers[0]
+    direct = logging.StreamHandler(output.stream)
+    direct.setFormatter(output.formatter)
+    for log_filter in _handler.filters:
+        direct.addFilter(log_filter)
+    root = logging.getLogger()
+    root.removeHandler(_handler)
+    root.addHandler(direct)
+    _handler = None
+    _listener = None
+
+
+def shutdown_logging():
+    """Kirim sisa record di antrian lalu hentikan listener"""
+    global _handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        logging.getLogger().removeHandler(_handler)
+        _listener = None
+        _handler = None
+
+
+def logging_stats() -> Dict[str, Any]:
+    """Record yang dibuang (antrian penuh / sampling) sejak setup"""
+    if _handler is None:
+        return {"configured": False}
+    sampled = sum(f.dropped for f in _handler.filters if isinstance(f, SamplingFilter))
+    return {
+        "configured": True,
+        "queue_size": _handler.queue.qsize(),
+        "dropped_queue_full": _handler.dropped,
+        "dropped_sampling": sampled,
+    }
+
+
+atexit.register(shutdown_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
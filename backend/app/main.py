@@ -1,11 +1,17 @@
 # app/main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import logging
+import uuid
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+from app.logging_config import setup_logging, request_id_var
+from app.services.upload import UploadSizeLimitMiddleware
+
+# Setup logging (satu-satunya tempat; lihat app/logging_config.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Lifespan events
@@ -21,15 +27,36 @@ async def lifespan(app: FastAPI):
         except ImportError:
             logger.info("ℹ No database configured")
         
-        # Skip pre-loading AI model for faster startup
-        # Model will be lazy-loaded on first prediction request
-        logger.info("ℹ AI model will be loaded on first use (lazy loading)")
+        # Thread torch dari konfigurasi admission control (hindari oversubscription CPU)
+        from app.services.admission import configure_torch_threads
+        configure_torch_threads()
+        
+        # Eager loading (MODEL_EAGER_LOAD=1): load + warm-up di background,
+        # /ready tetap 503 sampai selesai. Default: lazy load saat request pertama.
+        # INFERENCE_MODE=process: pool selalu di-start di sini, tidak pernah dari request
+        from app.services.warmup import EAGER_LOAD, run_background_warmup
+        from app.services.inference_pool import inference_pool
+        if EAGER_LOAD or inference_pool.enabled:
+            app.state.warmup_task = asyncio.create_task(run_background_warmup())
+            logger.info("ℹ AI model loading + warm-up started in background")
+        else:
+            logger.info("ℹ AI model will be loaded on first use (lazy loading)")
+        
+        # Worker antrian job prediksi (job yang terputus saat restart di-requeue)
+        from app.services.jobs import JOBS_ENABLED, job_workers
+        if JOBS_ENABLED:
+            await job_workers.start()
         
     except Exception as e:
         logger.error(f" Startup error: {e}")
     
     yield
-    # Shutdown would go here
+    
+    # Shutdown: hentikan job worker dan inference worker (INFERENCE_MODE=process)
+    from app.services.jobs import job_workers
+    await job_workers.stop()
+    from app.services.inference_pool import inference_pool
+    inference_pool.stop()
 
 app = FastAPI(
     title="Skin Care ChatBot API", 
@@ -37,6 +64,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Batas ukuran upload di stream request (sebelum multipart di-spool); di dalam CORS supaya 413 tetap ber-header CORS
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -44,14 +74,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Request id (dari header X-Request-ID atau baru) untuk semua log selama request"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 @app.get("/")
 async def root():
     return {
         "message": "Skin Care ChatBot API is running!",
         "endpoints": {
             "health": "/health",
+            "ready": "/ready",
             "predict": ["/predict", "/api/v1/predict"],
             "chat": ["/chat", "/api/v1/chat"],
             "routes": "/routes"
@@ -62,6 +106,13 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "skin-care-chatbot"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness untuk load balancer - 503 sampai model selesai load + warm-up"""
+    from app.services.warmup import warmup_state
+    state = warmup_state.to_dict()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
 # Import dan register routers
 try:
     # Import routers
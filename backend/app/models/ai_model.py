@@ -1,8 +1,12 @@
 # app/models/ai_model.py
 import os
 import logging
+import contextlib
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from PIL import Image
@@ -10,20 +14,201 @@ import io
 
 # Import custom layers BEFORE loading model
 from .custom_layers import MBConvBlock
+from .snapshot import SNAPSHOT_DIR, SNAPSHOT_VERSION, current_snapshot
+from .source_cache import SourceResolutionCache, SOURCE_CACHE_ENABLED, SOURCE_MANIFEST_PATH, MANIFEST_FILE
+from .compiled import EXECUTION_MODES, MODEL_EXECUTION, KERAS_XLA
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Backend inference untuk ViT: "pytorch" (eager) atau "onnx" (onnxruntime)
+MODEL_BACKEND = os.getenv("SKIN_MODEL_BACKEND", "pytorch").lower()
+
+# Precision mode untuk backend PyTorch: fp32, int8 (dynamic quantization), bf16 (autocast)
+PRECISION_MODES = ("fp32", "int8", "bf16")
+MODEL_PRECISION = os.getenv("SKIN_MODEL_PRECISION", "fp32").lower()
+PRECISION_VALIDATION_DIR = os.getenv("PRECISION_VALIDATION_DIR", "")
+PRECISION_MIN_AGREEMENT = float(os.getenv("PRECISION_MIN_AGREEMENT", "0.98"))
+# Tanpa folder validasi mode reduced ditolak; 1 = izinkan gate di gambar sintetis (ditandai unvalidated)
+PRECISION_ALLOW_UNVALIDATED = os.getenv("PRECISION_ALLOW_UNVALIDATED", "0") == "1"
+
+# Backoff setelah load model gagal (detik, dilipatgandakan tiap kegagalan berturut-turut)
+LOAD_RETRY_BACKOFF = float(os.getenv("MODEL_LOAD_RETRY_BACKOFF", "30"))
+LOAD_RETRY_BACKOFF_MAX = float(os.getenv("MODEL_LOAD_RETRY_BACKOFF_MAX", "600"))
+
+# Sumber weights yang dikenal SkinDiseaseModel._load_saved_model
+MODEL_SOURCES = ("snapshot", "hf_hub", "h5", "keras", "saved_model")
+
+
+def _parse_source_order(value: str) -> Tuple[str, ...]:
+    """SKIN_MODEL_SOURCES="h5,snapshot" -> urutan probe (nama tidak dikenal diabaikan)"""
+    order = []
+    for name in (part.strip().lower() for part in value.split(",")):
+        if not name:
+            continue
+        if name not in MODEL_SOURCES:
+            logger.warning(f"  Unknown model source in SKIN_MODEL_SOURCES: {name}")
+        elif name not in order:
+            order.append(name)
+    return tuple(order) or MODEL_SOURCES
+
+
+# Urutan probe default (sumber yang tidak disebut tidak dicoba)
+MODEL_SOURCE_ORDER = _parse_source_order(os.getenv("SKIN_MODEL_SOURCES", ""))
+
+# Lokasi weights lokal (.h5 / .keras / SavedModel)
+WEIGHTS_DIR = Path(os.getenv("SKIN_MODEL_WEIGHTS_DIR", str(Path(__file__).parent / "weights")))
+
+# Offline: jangan hubungi Hugging Face Hub (hanya snapshot lokal / HF cache)
+MODEL_OFFLINE = os.getenv("SKIN_MODEL_OFFLINE", os.getenv("HF_HUB_OFFLINE", "0")) == "1"
+
+
+# Buffer input ViT per thread (dipakai ulang antar request). Satu buffer per
+# thread yang tumbuh sampai batch terbesar; batch lebih kecil dapat slice-nya
+_pixel_buffers = threading.local()
+
+
+def _pixel_buffer(shape) -> np.ndarray:
+    count, item_shape = shape[0], tuple(shape[1:])
+    buffer = getattr(_pixel_buffers, "buffer", None)
+    if buffer is None or buffer.shape[1:] != item_shape or buffer.shape[0] < count:
+        capacity = count if buffer is None or buffer.shape[1:] != item_shape else max(count, buffer.shape[0])
+        buffer = _pixel_buffers.buffer = np.empty((capacity,) + item_shape, dtype=np.float32)
+    return buffer[:count]
+
+
+def vit_pixel_values(image_array: np.ndarray, size=(224, 224)) -> np.ndarray:
+    """
+    ViT preprocessing (Resize 224x224 -> ToTensor -> Normalize mean/std 0.5)
+    dalam numpy. Dipakai bersama oleh backend PyTorch dan ONNX supaya input
+    kedua backend identik. Return float32 (N, 3, H, W).
+    
+    Input dari SkinDiseaseModel._preprocess sudah berukuran `size`, jadi
+    langsung dinormalisasi ke buffer per-thread yang dipakai ulang (isi
+    buffer tertimpa oleh panggilan berikutnya di thread yang sama). Input
+    dengan ukuran lain di-resize dulu sekali.
+    """
+    images = image_array if image_array.ndim == 4 else image_array[np.newaxis]
+    if images.shape[1:3] != (size[1], size[0]):
+        images = np.stack([
+            np.asarray(
+                Image.fromarray((img * 255).astype(np.uint8)).resize(size, Image.Resampling.BILINEAR),
+                dtype=np.float32
+            ) / 255.0
+            for img in images
+        ])
+    
+    pixel_values = _pixel_buffer((len(images), 3, size[1], size[0]))
+    np.subtract(images.transpose(0, 3, 1, 2), 0.5, out=pixel_values)
+    pixel_values /= 0.5
+    return pixel_values
+
+
+def cpu_supports_bf16() -> bool:
+    """Cek apakah CPU punya instruksi bf16 native (AVX512-BF16 / AMX / ARM BF16)"""
+    try:
+        if Path("/proc/cpuinfo").exists():
+            flags = Path("/proc/cpuinfo").read_text()
+            return any(flag in flags for flag in ("avx512_bf16", "amx_bf16", " bf16"))
+        import subprocess
+        out = subprocess.run(["sysctl", "-n", "hw.optional.arm.FEAT_BF16"],
+                             capture_output=True, text=True, timeout=2)
+        return out.stdout.strip() == "1"
+    except Exception:
+        return False
+
 
 class PyTorchViTWrapper:
     """Wrapper untuk PyTorch ViT model agar compatible dengan Keras-style API"""
     
-    def __init__(self, model):
+    def __init__(self, model, precision: str = "fp32"):
         self.model = model
+        self.precision = precision
         self.device = "cuda" if self._has_cuda() else "cpu"
         self.model.to(self.device)
-        logger.info(f"  Using device: {self.device}")
+        self._compiled = {}  # batch size -> fungsi logits terkompilasi (TorchScript / torch.compile)
+        self._torch_compiled = None
+        logger.info(f"  Using device: {self.device} (precision: {self.precision})")
+    
+    @property
+    def compiled_batch_sizes(self) -> List[int]:
+        return sorted(self._compiled)
+    
+    def compile_for(self, batch_sizes: List[int], mode: str):
+        """Kompilasi forward pass (trace / compile) untuk setiap batch size"""
+        import torch
+        from .compiled import compile_vit_logits
+        
+        for batch_size in batch_sizes:
+            if batch_size in self._compiled:
+                continue
+            example = torch.zeros((batch_size, 3, 224, 224), dtype=torch.float32, device=self.device)
+            compiled = compile_vit_logits(self.model, example, mode, self.precision, self.device,
+                                          compiled_module=self._torch_compiled)
+            if mode == "compile":
+                self._torch_compiled = compiled
+            self._compiled[batch_size] = compiled
+        logger.info(f" ViT {mode} ready for batch sizes {self.compiled_batch_sizes} (precision: {self.precision})")
+    
+    def _logits(self, pixel_values):
+        """Forward pass -> logits (lewat fungsi terkompilasi kalau ada)"""
+        import torch
+        from .compiled import run_compiled
+        
+        if self._compiled:
+            return run_compiled(self._compiled, pixel_values, torch.cat)
+        return self.model(pixel_values).logits
+    
+    def predict_with_embeddings(self, image_array) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Probabilitas (N, num_classes) + embedding CLS (N, hidden) dari forward
+        pass yang sama: embedding = token CLS setelah layernorm terakhir, yaitu
+        input classifier. Selalu lewat graph eager (fungsi terkompilasi hanya
+        mengembalikan logits).
+        """
+        import torch
+        
+        img_tensor = torch.from_numpy(vit_pixel_values(image_array)).to(self.device)
+        autocast = (
+            torch.autocast(device_type=self.device, dtype=torch.bfloat16)
+            if self.precision == "bf16" else contextlib.nullcontext()
+        )
+        with torch.no_grad(), autocast:
+            encoder = getattr(self.model, self.model.base_model_prefix)
+            embeddings = encoder(img_tensor).last_hidden_state[:, 0]
+            logits = self.model.classifier(embeddings).float()
+            probs = torch.nn.functional.softmax(logits, dim=-1)
+        return probs.cpu().numpy(), embeddings.float().cpu().numpy()
+    
+    def with_precision(self, precision: str) -> "PyTorchViTWrapper":
+        """
+        Buat wrapper baru dengan precision lain dari model fp32 ini.
+        int8: dynamic quantization untuk semua nn.Linear (weights jadi copy INT8).
+        bf16: autocast bfloat16 saat forward pass (weights tetap fp32, di-share).
+        """
+        import torch
+        
+        if precision not in PRECISION_MODES:
+            raise ValueError(f"Unknown precision mode: {precision}")
+        if precision == self.precision:
+            return self
+        if self.precision != "fp32":
+            raise ValueError(f"Cannot derive {precision} from a {self.precision} model - reload fp32 weights first")
+        
+        if precision == "int8":
+            if self.device != "cpu":
+                raise ValueError("Dynamic INT8 quantization is only supported on CPU")
+            quantized = torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            quantized.eval()
+            return PyTorchViTWrapper(quantized, precision="int8")
+        
+        if precision == "bf16":
+            if self.device == "cpu" and not cpu_supports_bf16():
+                raise ValueError("This CPU has no native bfloat16 support")
+            return PyTorchViTWrapper(self.model, precision="bf16")
+        
+        return self
     
     def _has_cuda(self):
         try:
@@ -33,44 +218,33 @@ class PyTorchViTWrapper:
             return False
     
     def predict(self, image_array, verbose=0):
-        """Keras-style predict method"""
+        """Keras-style predict method (mendukung batch N gambar sekaligus)"""
         import torch
-        from torchvision import transforms
-        from PIL import Image
         
         try:
-            # Convert numpy array to PIL Image
-            if image_array.shape[0] == 1:
-                img = Image.fromarray((image_array[0] * 255).astype(np.uint8))
-            else:
-                img = Image.fromarray((image_array * 255).astype(np.uint8))
-            
-            # ViT preprocessing
-            transform = transforms.Compose([
-                transforms.Resize((224, 224)),  # ViT uses 224x224
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
-            ])
-            
-            img_tensor = transform(img).unsqueeze(0).to(self.device)
+            # ViT preprocessing -> satu batch tensor
+            img_tensor = torch.from_numpy(vit_pixel_values(image_array)).to(self.device)
             
-            # Inference
-            with torch.no_grad():
-                outputs = self.model(img_tensor)
-                logits = outputs.logits
+            # Inference (satu forward pass untuk seluruh batch)
+            autocast = (
+                torch.autocast(device_type=self.device, dtype=torch.bfloat16)
+                if self.precision == "bf16" else contextlib.nullcontext()
+            )
+            with torch.no_grad(), autocast:
+                logits = self._logits(img_tensor).float()
                 probs = torch.nn.functional.softmax(logits, dim=-1)
             
             # Return numpy array like Keras (batch_size, num_classes)
             result = probs.cpu().numpy()
-            logger.info(f" PyTorch prediction successful: shape={result.shape}, max_prob={result.max():.4f}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(" PyTorch prediction successful: shape=%s, max_prob=%.4f", result.shape, result.max())
             return result
             
         except Exception as e:
+            # Raise, bukan probabilitas nol: hasil nol akan terlihat "sukses" untuk
+            # seluruh batch (micro-batching) dan ikut masuk prediction cache
             logger.error(f" PyTorch prediction failed: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-            # Return zeros array to prevent crashes
-            return np.zeros((1, self.model.config.num_labels))
+            raise
     
     @property
     def input_shape(self):
@@ -80,13 +254,45 @@ class PyTorchViTWrapper:
     def output_shape(self):
         return (None, self.model.config.num_labels)
 
+class PrecisionGateError(ValueError):
+    """Mode precision ditolak karena top-1 agreement di bawah threshold"""
+    
+    def __init__(self, message: str, report: Dict[str, Any]):
+        super().__init__(message)
+        self.report = report
+
+
 class SkinDiseaseModel:
-    def __init__(self):
+    def __init__(self, sources: Optional[List[str]] = None):
         self.model = None
         self.model_loaded = False
         self.model_error = None
         self.use_fallback = False
         self.is_huggingface_model = False
+        self.model_version = None  # identitas weights yang sedang dipakai (untuk cache key)
+        self.backend = MODEL_BACKEND
+        self.active_backend = None
+        self.precision = "fp32"  # precision yang sedang aktif
+        self.precision_validated = True  # False = mode reduced aktif tanpa bukti akurasi (gambar sintetis)
+        self.requested_precision = MODEL_PRECISION
+        self.execution = MODEL_EXECUTION  # eager, trace, compile (lihat compiled.py)
+        self.compiled_batch_sizes: List[int] = []
+        self._embedding_model = None  # (model Keras, model Keras dengan output embedding)
+        self.stage_timings: Dict[str, float] = {}  # durasi per tahap load/warm-up (detik)
+        self.weights_dir = WEIGHTS_DIR
+        self.snapshot_dir = SNAPSHOT_DIR
+        self.snapshot_version = SNAPSHOT_VERSION  # kosong = snapshot CURRENT
+        self.sources = list(sources) if sources else None  # None = MODEL_SOURCE_ORDER
+        self.source = None  # sumber yang berhasil di-load
+        # Manifest + negative cache hanya untuk fallback chain otomatis (bukan sumber yang dipin)
+        self.source_cache_enabled = SOURCE_CACHE_ENABLED and sources is None
+        self.source_probes: List[Dict[str, Any]] = []  # hasil + durasi per probe pada load terakhir
+        
+        # Single-flight loading + cache kegagalan load
+        self._load_lock = threading.RLock()
+        self._load_error = None
+        self._load_failures = 0
+        self._load_retry_at = 0.0
         
         # Default class names (8 classes for local model)
         self.idx_to_label = [
@@ -204,70 +410,240 @@ class SkinDiseaseModel:
             return None
 
     def _load_saved_model(self):
-        """Try to load model - checks multiple formats"""
-        weights_dir = Path(__file__).parent / "weights"
+        """Try to load model - checks multiple formats (urutan: self.sources / SKIN_MODEL_SOURCES)"""
+        probes = {
+            "snapshot": self._probe_snapshot,
+            "hf_hub": self._probe_hf_hub,
+            "h5": self._probe_h5,
+            "keras": self._probe_keras,
+            "saved_model": self._probe_saved_model,
+        }
+        sources = list(self.sources or MODEL_SOURCE_ORDER)
+        fingerprints = {source: self._source_fingerprint(source) for source in sources}
+        cache = self._source_cache() if self.source_cache_enabled else None
+        if cache is not None:
+            sources = cache.order(sources, fingerprints)
         
-        # Priority 1: Load from Hugging Face Hub - PyTorch ViT Model (0xnu/skincare-detection)
+        self.source_probes = []
+        skipped = []
         try:
-            logger.info(" Trying to load PyTorch ViT model from Hugging Face Hub...")
-            
-            import torch
-            from transformers import ViTForImageClassification
+            for source in sources:
+                fingerprint = fingerprints[source]
+                if fingerprint is None:
+                    self._record_probe(source, "absent", 0.0)
+                    continue
+                if cache is not None and cache.is_known_bad(source, fingerprint):
+                    self._record_probe(source, "skipped (known bad)", 0.0)
+                    skipped.append(source)
+                    continue
+                model = self._run_probe(source, probes[source], fingerprints, cache)
+                if model is not None:
+                    return model
             
-            # Load pre-trained Vision Transformer
-            model = ViTForImageClassification.from_pretrained(
-                '0xnu/skincare-detection',
-                trust_remote_code=True
+            # Negative cache hanya petunjuk: kalau semua sumber lain gagal, coba juga yang dilewati
+            for source in skipped:
+                logger.info(f" Retrying negatively cached model source {source}")
+                model = self._run_probe(source, probes[source], fingerprints, cache)
+                if model is not None:
+                    return model
+        finally:
+            summary = ", ".join(
+                f"{probe['source']}={probe['result']} ({probe['ms']:.0f} ms)" for probe in self.source_probes
             )
-            model.eval()  # Set to evaluation mode
-            
-            logger.info(" PyTorch ViT model loaded from Hugging Face Hub!")
-            logger.info(f" Model: Vision Transformer (ViT)")
-            logger.info(f"  Classes: {model.config.num_labels}")
-            
-            # Mark as HuggingFace model and update labels if id2label exists
-            self.is_huggingface_model = True
-            if hasattr(model.config, 'id2label') and model.config.id2label:
-                # Use labels from HuggingFace config
-                self.idx_to_label = [model.config.id2label[i] for i in range(model.config.num_labels)]
-                logger.info(f" Using {len(self.idx_to_label)} labels from HuggingFace config")
-            else:
-                # Generate generic labels
-                self.idx_to_label = [f"Skin Condition {i+1}" for i in range(model.config.num_labels)]
-                logger.info(f" Generated {len(self.idx_to_label)} generic labels")
-            
-            # Wrap model in PyTorchWrapper
-            return PyTorchViTWrapper(model)
-            
+            logger.info(f"⏱️ Model source probes: {summary}")
+        
+        logger.error(" No model found in any format")
+        return None
+    
+    def _run_probe(self, source: str, probe, fingerprints: Dict[str, Optional[str]],
+                   cache: Optional[SourceResolutionCache]):
+        """Jalankan satu probe, catat durasinya dan update manifest / negative cache"""
+        started = time.perf_counter()
+        try:
+            model = probe()
         except Exception as e:
-            logger.warning(f"  HF Hub PyTorch loading failed: {str(e)[:200]}")
+            logger.warning(f"  Model source {source} crashed: {str(e)[:200]}")
+            model = None
+        elapsed = time.perf_counter() - started
+        self.stage_timings[f"probe.{source}"] = round(elapsed, 3)
         
-        # Priority 2: Try local .h5 file (most compatible)
-        h5_path = weights_dir / "skin_model.h5"
-        if h5_path.exists():
-            logger.info(f"📦 Found .h5 file ({h5_path.stat().st_size / (1024**3):.2f} GB)")
-            model = self._load_h5_model(h5_path)
-            if model is not None:
-                return model
+        if model is None:
+            self._record_probe(source, "failed", elapsed)
+            if cache is not None:
+                cache.record_failure(source, fingerprints[source], elapsed)
+            return None
         
-        # Priority 3: Try .keras file
-        keras_path = weights_dir / "skin_model.keras"
-        if keras_path.exists():
-            logger.info(f"📦 Found .keras file ({keras_path.stat().st_size / (1024**3):.2f} GB)")
-            model = self._load_keras_model(keras_path)
-            if model is not None:
-                return model
+        self.source = source
+        self._record_probe(source, "ok", elapsed)
+        if cache is not None:
+            cache.record_success(source, fingerprints, self.model_version, elapsed)
+        return model
+    
+    def _record_probe(self, source: str, result: str, seconds: float):
+        self.source_probes.append({"source": source, "result": result, "ms": round(seconds * 1000, 1)})
+        if result != "absent":
+            logger.info(f"⏱️ Model source {source}: {result} in {seconds * 1000:.0f} ms")
+    
+    def _source_cache(self) -> SourceResolutionCache:
+        path = Path(SOURCE_MANIFEST_PATH) if SOURCE_MANIFEST_PATH else self.weights_dir / MANIFEST_FILE
+        return SourceResolutionCache(path)
+    
+    def _source_fingerprint(self, source: str) -> Optional[str]:
+        """Identitas murah (tanpa load) dari sebuah sumber; None = sumber tidak ada"""
+        if source == "snapshot":
+            snapshot_path = current_snapshot(self.snapshot_dir, self.snapshot_version)
+            return f"snapshot:{snapshot_path.name}" if snapshot_path is not None else None
+        if source == "hf_hub":
+            return f"hf:0xnu/skincare-detection{' (offline)' if MODEL_OFFLINE else ''}"
         
-        # Priority 4: Try SavedModel directory
-        saved_model_path = weights_dir / "skin_model_saved"
-        if saved_model_path.exists() and saved_model_path.is_dir():
-            logger.info(f"📦 Found SavedModel directory")
+        local_names = {"h5": "skin_model.h5", "keras": "skin_model.keras", "saved_model": "skin_model_saved"}
+        path = self.weights_dir / local_names[source]
+        if source == "saved_model" and not path.is_dir():
+            return None
+        if not path.exists():
+            return None
+        return self._local_model_version(path)
+    
+    def _probe_snapshot(self):
+        """Local snapshot (safetensors, mmap) - tanpa network"""
+        snapshot_path = current_snapshot(self.snapshot_dir, self.snapshot_version)
+        if snapshot_path is None:
+            return None
+        with self._timed("load.snapshot"):
+            return self._load_snapshot(snapshot_path)
+    
+    def _probe_hf_hub(self):
+        """Load from Hugging Face Hub - PyTorch ViT Model (0xnu/skincare-detection)"""
+        with self._timed("load.hf_hub"):
+            try:
+                logger.info(" Trying to load PyTorch ViT model from Hugging Face Hub...")
+                
+                import torch
+                from transformers import ViTForImageClassification
+                
+                # Load pre-trained Vision Transformer (offline: hanya dari HF cache lokal)
+                model = ViTForImageClassification.from_pretrained(
+                    '0xnu/skincare-detection',
+                    trust_remote_code=True,
+                    local_files_only=MODEL_OFFLINE
+                )
+                model.eval()  # Set to evaluation mode
+                
+                logger.info(" PyTorch ViT model loaded from Hugging Face Hub!")
+                logger.info(f" Model: Vision Transformer (ViT)")
+                logger.info(f"  Classes: {model.config.num_labels}")
+                
+                if hasattr(model.config, 'id2label') and model.config.id2label:
+                    # Use labels from HuggingFace config
+                    labels = [model.config.id2label[i] for i in range(model.config.num_labels)]
+                    logger.info(f" Using {len(labels)} labels from HuggingFace config")
+                else:
+                    # Generate generic labels
+                    labels = [f"Skin Condition {i+1}" for i in range(model.config.num_labels)]
+                    logger.info(f" Generated {len(labels)} generic labels")
+                
+                return self._wrap_vit(model, labels, "hf:0xnu/skincare-detection")
+            
+            except Exception as e:
+                logger.warning(f"  HF Hub PyTorch loading failed: {str(e)[:200]}")
+                return None
+    
+    def _probe_h5(self):
+        """Local .h5 file (most compatible)"""
+        h5_path = self.weights_dir / "skin_model.h5"
+        if not h5_path.exists():
+            return None
+        logger.info(f"📦 Found .h5 file ({h5_path.stat().st_size / (1024**3):.2f} GB)")
+        with self._timed("load.h5"):
+            model = self._load_h5_model(h5_path)
+        if model is not None:
+            self.model_version = self._local_model_version(h5_path)
+            self.active_backend = "keras"
+            model = self._wrap_keras(model)
+        return model
+    
+    def _probe_keras(self):
+        """Local .keras file"""
+        keras_path = self.weights_dir / "skin_model.keras"
+        if not keras_path.exists():
+            return None
+        logger.info(f"📦 Found .keras file ({keras_path.stat().st_size / (1024**3):.2f} GB)")
+        with self._timed("load.keras"):
+            model = self._load_keras_model(keras_path)
+        if model is not None:
+            self.model_version = self._local_model_version(keras_path)
+            self.active_backend = "keras"
+            model = self._wrap_keras(model)
+        return model
+    
+    def _probe_saved_model(self):
+        """Local SavedModel directory"""
+        saved_model_path = self.weights_dir / "skin_model_saved"
+        if not (saved_model_path.exists() and saved_model_path.is_dir()):
+            return None
+        logger.info(f"📦 Found SavedModel directory")
+        with self._timed("load.saved_model"):
             model = self._load_saved_model_format(saved_model_path)
-            if model is not None:
-                return model
+        if model is not None:
+            self.model_version = self._local_model_version(saved_model_path)
+            self.active_backend = "keras"
+            model = self._wrap_keras(model)
+        return model
+    
+    @contextlib.contextmanager
+    def _timed(self, stage: str):
+        """Catat durasi satu tahap load/warm-up (detik) di self.stage_timings"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_timings[stage] = round(time.perf_counter() - started, 3)
+    
+    @staticmethod
+    def _local_model_version(model_path: Path) -> str:
+        """Versi model lokal = nama file + waktu modifikasi terakhir"""
+        return f"{model_path.name}@{int(model_path.stat().st_mtime)}"
+    
+    def _wrap_keras(self, model):
+        """Mode terkompilasi: panggil model Keras langsung (tanpa model.predict)"""
+        if self.execution == "eager":
+            return model
+        from .compiled import KerasGraphWrapper
+        return KerasGraphWrapper(model, jit_compile=KERAS_XLA)
+    
+    def _wrap_vit(self, model, labels: List[str], version: str):
+        """Pasang labels + versi untuk ViT yang sudah di-load, opsional pindah ke ONNX"""
+        self.is_huggingface_model = True
+        self.idx_to_label = labels
+        self.model_version = version
+        wrapper = PyTorchViTWrapper(model)
+        self.active_backend = "pytorch"
         
-        logger.error(" No model found in any format")
-        return None
+        # Optional: ONNX Runtime backend (export di-cache di weights/onnx/)
+        if self.backend == "onnx":
+            from .onnx_backend import load_onnx_wrapper
+            onnx_wrapper = load_onnx_wrapper(wrapper, self.model_version)
+            if onnx_wrapper is not None:
+                self.model_version += "+onnx"
+                self.active_backend = "onnx"
+                return onnx_wrapper
+        
+        return wrapper
+    
+    def _load_snapshot(self, snapshot_path: Path):
+        """Load ViT dari snapshot lokal (weights di-memory-map, tanpa network)"""
+        try:
+            from .snapshot import load_snapshot_model, read_manifest
+            
+            manifest = read_manifest(snapshot_path)
+            logger.info(f"📦 Loading model snapshot {manifest['version']} ({manifest['source']})")
+            model, labels = load_snapshot_model(snapshot_path)
+            logger.info(f" Snapshot loaded: {len(labels)} classes, weights memory-mapped")
+            return self._wrap_vit(model, labels, f"snapshot:{manifest['version']}")
+        
+        except Exception as e:
+            logger.warning(f"  Snapshot loading failed: {str(e)[:200]}")
+            return None
     
     def _load_h5_model(self, model_path):
         """Load model dari .h5 file (PALING STABLE)"""
@@ -290,12 +666,13 @@ class SkinDiseaseModel:
                 model = keras.models.load_model(str(model_path), compile=False)
                 logger.info(" Model loaded with Keras 3!")
             
-            # Compile
-            model.compile(
-                optimizer='adam',
-                loss='categorical_crossentropy',
-                metrics=['accuracy']
-            )
+            # Compile (hanya untuk jalur model.predict eager; mode terkompilasi tanpa optimizer)
+            if self.execution == "eager":
+                model.compile(
+                    optimizer='adam',
+                    loss='categorical_crossentropy',
+                    metrics=['accuracy']
+                )
             
             logger.info(f" Input shape: {model.input_shape}")
             logger.info(f"📊 Output shape: {model.output_shape}")
@@ -327,11 +704,12 @@ class SkinDiseaseModel:
                 model = keras.models.load_model(str(model_path), compile=False)
                 logger.info(" Model loaded!")
             
-            model.compile(
-                optimizer='adam',
-                loss='categorical_crossentropy',
-                metrics=['accuracy']
-            )
+            if self.execution == "eager":
+                model.compile(
+                    optimizer='adam',
+                    loss='categorical_crossentropy',
+                    metrics=['accuracy']
+                )
             
             logger.info(f" Input shape: {model.input_shape}")
             logger.info(f"📊 Output shape: {model.output_shape}")
@@ -363,14 +741,43 @@ class SkinDiseaseModel:
         if self.model_loaded:
             return
         
+        # Single-flight: hanya satu thread yang load, thread lain menunggu hasilnya
+        with self._load_lock:
+            if self.model_loaded:
+                return
+            
+            # Load gagal baru-baru ini: jangan ulangi seluruh fallback chain sebelum backoff habis
+            retry_in = self._load_retry_at - time.monotonic()
+            if self._load_error and retry_in > 0:
+                raise RuntimeError(f"{self._load_error} (next load attempt in {retry_in:.0f}s)")
+            
+            self._load_model()
+    
+    def _load_model(self):
+        """Load model (dipanggil dengan _load_lock dipegang)"""
         # Try to load saved model
         logger.info(" Loading trained model...")
-        self.model = self._load_saved_model()
+        with self._timed("load.total"):
+            try:
+                self.model = self._load_saved_model()
+            except Exception as e:
+                logger.error(f" Model loading crashed: {e}")
+                self.model = None
         
         if self.model is not None:
             self.model_loaded = True
             self.use_fallback = False
+            self._load_error = None
+            self._load_failures = 0
             logger.info(" Using TRAINED model for predictions!")
+            
+            # Optional: reduced precision (tetap fp32 kalau gagal validasi)
+            if self.requested_precision != "fp32" and self.active_backend == "pytorch":
+                try:
+                    with self._timed("load.precision"):
+                        self.set_precision(self.requested_precision)
+                except ValueError as e:
+                    logger.warning(f"  Staying on fp32: {e}")
             return
         
         # NO FALLBACK - User explicitly wants trained model only
@@ -399,70 +806,355 @@ class SkinDiseaseModel:
         logger.error(" APPLICATION CANNOT START WITHOUT TRAINED MODEL")
         logger.error("="*80)
         
-        raise RuntimeError("No trained model available. Convert model to .h5 format first.")
+        # Cache kegagalan dengan exponential backoff
+        self._load_failures += 1
+        backoff = min(LOAD_RETRY_BACKOFF * 2 ** (self._load_failures - 1), LOAD_RETRY_BACKOFF_MAX)
+        self._load_retry_at = time.monotonic() + backoff
+        self._load_error = "No trained model available. Convert model to .h5 format first."
+        logger.error(f" Next model load attempt in {backoff:.0f}s (failure #{self._load_failures})")
+        
+        raise RuntimeError(self._load_error)
 
-    def _preprocess(self, image_bytes: bytes, target_size=(512, 512)) -> np.ndarray:
-        """Preprocess image"""
+    def set_precision(self, precision: str, validation_dir: Optional[str] = None,
+                      min_agreement: float = PRECISION_MIN_AGREEMENT) -> Dict[str, Any]:
+        """
+        Ganti precision mode model PyTorch (fp32 / int8 / bf16).
+        Mode reduced divalidasi dulu terhadap fp32 di folder validasi berlabel
+        (PRECISION_VALIDATION_DIR); kalau top-1 agreement di bawah min_agreement,
+        perubahan ditolak dengan PrecisionGateError. Tanpa folder validasi
+        perubahan ditolak (ValueError), kecuali PRECISION_ALLOW_UNVALIDATED=1:
+        gate jalan di gambar sintetis dan mode ditandai unvalidated.
+        """
+        self._ensure_loaded()
+        with self._load_lock:
+            return self._set_precision_locked(precision, validation_dir, min_agreement)
+    
+    def _set_precision_locked(self, precision: str, validation_dir: Optional[str],
+                              min_agreement: float) -> Dict[str, Any]:
+        from .precision_check import compare_precision, load_labelled_folder, synthetic_images
+        
+        if precision not in PRECISION_MODES:
+            raise ValueError(f"Unknown precision mode: {precision} (choose from {', '.join(PRECISION_MODES)})")
+        if not isinstance(self.model, PyTorchViTWrapper):
+            raise ValueError("Precision modes are only supported on the PyTorch ViT backend")
+        if precision == self.precision:
+            return {"precision": precision, "changed": False}
+        
+        fp32_model = self.model
+        if fp32_model.precision != "fp32":
+            # Weights INT8 tidak bisa dikembalikan ke fp32 - load ulang weights asli
+            logger.info(" Reloading fp32 weights...")
+            fp32_model = self._load_saved_model()
+            if not isinstance(fp32_model, PyTorchViTWrapper):
+                raise ValueError("Could not reload fp32 PyTorch weights")
+        
+        base_version = self.model_version.split("+")[0] if self.model_version else None
+        if precision == "fp32":
+            candidate, report = fp32_model, {"precision": "fp32"}
+        else:
+            candidate = fp32_model.with_precision(precision)
+            
+            validation_dir = validation_dir or PRECISION_VALIDATION_DIR
+            if validation_dir:
+                image_bytes, labels = load_labelled_folder(Path(validation_dir))
+                images, errors = self.preprocess_many(image_bytes)
+                valid = [i for i, error in enumerate(errors) if error is None]
+                images, labels = images[valid], [labels[i] for i in valid]
+            elif PRECISION_ALLOW_UNVALIDATED:
+                # Noise random hanya membuktikan model tidak rusak total, bukan akurasi
+                logger.warning(f"  No PRECISION_VALIDATION_DIR set - {precision} is gated on synthetic images "
+                               f"only and will be marked UNVALIDATED")
+                images, labels = synthetic_images(), None
+            else:
+                raise ValueError(f"{precision} needs a labelled validation folder (PRECISION_VALIDATION_DIR) "
+                                 f"for the accuracy gate; set PRECISION_ALLOW_UNVALIDATED=1 to skip it")
+            
+            report = compare_precision(fp32_model, candidate, images, labels, self.idx_to_label)
+            report["min_agreement"] = min_agreement
+            report["validated"] = bool(validation_dir)
+            logger.info(f" Precision check ({precision}): {report}")
+            
+            if report["top1_agreement"] < min_agreement:
+                raise PrecisionGateError(
+                    f"{precision} rejected: top-1 agreement {report['top1_agreement']:.3f} < {min_agreement}",
+                    report
+                )
+        
+        self.model = candidate
+        self.precision = precision
+        self.precision_validated = report.get("validated", True)
+        if self.compiled_batch_sizes:
+            # Wrapper baru belum punya graph terkompilasi: kompilasi ulang batch size yang sama
+            self._compile(self.compiled_batch_sizes)
+        self.model_version = base_version if precision == "fp32" else f"{base_version}+{precision}"
+        if self.precision_validated:
+            logger.info(f" Precision mode switched to {precision}")
+        else:
+            logger.warning(f"  Precision mode switched to {precision} WITHOUT accuracy validation")
+        report["changed"] = True
+        return report
+
+    def warm_up(self, batch_sizes=(1,), iterations: int = 2) -> Dict[str, float]:
+        """
+        Jalankan beberapa forward pass sintetis untuk setiap batch size supaya
+        alokasi memory, kernel selection, dan lazy init terjadi sebelum traffic
+        asli datang. Durasi per batch size dicatat di stage_timings.
+        """
+        self._ensure_loaded()
+        width, height = self._input_size()
+        
+        timings = {}
+        if self.execution != "eager":
+            timings.update(self._compile(batch_sizes))
+        for batch_size in batch_sizes:
+            dummy = np.zeros((batch_size, height, width, 3), dtype=np.float32)
+            stage = f"warmup.batch_{batch_size}"
+            with self._timed(stage):
+                for _ in range(iterations):
+                    self.model.predict(dummy, verbose=0)
+            timings[stage] = self.stage_timings[stage]
+        
+        logger.info(f" Warm-up finished: {timings}")
+        return timings
+
+    def _compile(self, batch_sizes) -> Dict[str, float]:
+        """Kompilasi forward pass per batch size (SKIN_MODEL_EXECUTION); gagal = tetap eager"""
+        if self.execution not in EXECUTION_MODES:
+            logger.warning(f"  Unknown execution mode {self.execution} - staying eager")
+            return {}
+        if not hasattr(self.model, "compile_for"):
+            return {}  # ONNX Runtime sudah menjalankan graph teroptimasi
+        
+        timings = {}
+        for batch_size in batch_sizes:
+            stage = f"compile.batch_{batch_size}"
+            try:
+                with self._timed(stage):
+                    self.model.compile_for([batch_size], self.execution)
+            except Exception as e:
+                logger.warning(f"  {self.execution} failed for batch size {batch_size}, staying eager: {str(e)[:200]}")
+                continue
+            timings[stage] = self.stage_timings[stage]
+        self.compiled_batch_sizes = list(self.model.compiled_batch_sizes)
+        return timings
+    
+    def _input_size(self) -> Tuple[int, int]:
+        """Ukuran input asli backend (width, height) dari model.input_shape"""
         try:
-            img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            _, height, width, _ = self.model.input_shape
+            if height and width:
+                return int(width), int(height)
+        except (AttributeError, TypeError, ValueError):
+            pass
+        return 512, 512
+
+    def _decode_image(self, image_bytes: bytes, target_size=None) -> np.ndarray:
+        """
+        Decode + resize image bytes langsung ke ukuran input backend, hasilnya
+        array uint8 (H, W, 3). Untuk JPEG besar, draft mode membuat decoder
+        men-decode di skala 1/2, 1/4 atau 1/8 (tetap >= target) sehingga resize
+        hanya terjadi sekali dan jauh lebih murah.
+        """
+        target_size = target_size or self._input_size()
+        img = Image.open(io.BytesIO(image_bytes))
+        img.draft("RGB", target_size)
+        img = img.convert("RGB")
+        if img.size != tuple(target_size):
             img = img.resize(target_size, Image.Resampling.BILINEAR)
-            img_array = np.array(img)
+        return np.asarray(img, dtype=np.uint8)
+
+    def _preprocess(self, image_bytes: bytes, target_size=None) -> np.ndarray:
+        """Preprocess image -> float32 (1, H, W, 3) di ukuran input backend"""
+        try:
+            img_array = self._decode_image(image_bytes, target_size)
             img_array = np.expand_dims(img_array, axis=0)
             img_array = img_array.astype(np.float32) / 255.0
             return img_array
         except Exception as e:
             raise ValueError(f"Image preprocessing failed: {e}")
 
+    def preprocess_many(self, images: List[bytes], target_size=None,
+                        max_workers: int = None) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """
+        Decode + resize banyak gambar secara paralel (Pillow melepas GIL saat
+        decode/resize), lalu stack jadi satu array float32 (N, H, W, 3).
+        Return (batch, errors) - errors[i] berisi pesan error untuk gambar
+        yang gagal di-decode (baris batch-nya berisi nol), None kalau sukses.
+        """
+        target_size = target_size or self._input_size()
+        
+        def _decode(image_bytes):
+            try:
+                return self._decode_image(image_bytes, target_size), None
+            except Exception as e:
+                return None, f"Image preprocessing failed: {e}"
+
+        max_workers = max_workers or min(len(images), os.cpu_count() or 1) or 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            decoded = list(executor.map(_decode, images))
+
+        batch = np.zeros((len(images), target_size[1], target_size[0], 3), dtype=np.uint8)
+        errors = []
+        for i, (array, error) in enumerate(decoded):
+            if array is not None:
+                batch[i] = array
+            errors.append(error)
+
+        # Normalisasi sekali untuk seluruh batch (vectorized)
+        return batch.astype(np.float32) / 255.0, errors
+
+    def _format_prediction(self, probs: np.ndarray, topk: int = 3) -> Dict[str, Any]:
+        """Ubah satu baris probabilitas (num_classes,) jadi dict hasil top-k"""
+        predicted_class_index = int(np.argmax(probs))
+        predicted_class_name = self.idx_to_label[predicted_class_index]
+        confidence = float(probs[predicted_class_index])
+        
+        # Get top k predictions
+        topk = min(topk, len(probs))
+        top_indices = np.argsort(-probs)[:topk]
+        
+        topk_results = []
+        for idx in top_indices:
+            topk_results.append({
+                "index": int(idx),
+                "label": self.idx_to_label[idx],
+                "score": float(probs[idx])
+            })
+        
+        model_status = "enhanced_fallback" if self.use_fallback else "saved_model"
+        note = self.model_error if self.use_fallback else "Using trained model"
+        
+        return {
+            "topk": topk_results,
+            "best": {
+                "index": predicted_class_index,
+                "label": predicted_class_name, 
+                "score": confidence
+            },
+            "model_status": model_status,
+            "note": note
+        }
+
+    @staticmethod
+    def _error_result(error: Exception) -> Dict[str, Any]:
+        """Hasil prediksi standar saat terjadi error"""
+        return {
+            "topk": [],
+            "best": {"index": -1, "label": "Error", "score": 0.0},
+            "model_status": f"Error: {str(error)}",
+            "error": str(error)
+        }
+
+    def predict_batch(self, images: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Predict batch gambar yang sudah di-preprocess (N, H, W, 3) dengan
+        satu forward pass. Return list hasil per gambar (urutan sama).
+        """
+        self._ensure_loaded()
+        
+        predictions = self.model.predict(images, verbose=0)
+        return [self._format_prediction(row) for row in predictions]
+
+    def predict_batch_with_embeddings(self, images: np.ndarray) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """
+        Seperti predict_batch, plus embedding float32 L2-normalized (N, D) dari
+        forward pass yang sama - tidak ada inference kedua untuk embedding.
+        """
+        self._ensure_loaded()
+        
+        if hasattr(self.model, "predict_with_embeddings"):
+            probs, embeddings = self.model.predict_with_embeddings(images)
+        else:
+            probs, embeddings = self._keras_predict_with_embeddings(images)
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return [self._format_prediction(row) for row in probs], embeddings
+    
+    def _keras_predict_with_embeddings(self, images: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Model Keras: output layer sebelum classifier dipakai sebagai embedding"""
+        inner = getattr(self.model, "model", self.model)  # KerasGraphWrapper -> model Keras
+        cached = self._embedding_model
+        if cached is None or cached[0] is not inner:
+            try:
+                if type(inner).__module__.startswith(("tf_keras", "tensorflow")):
+                    import tensorflow as tf
+                    model_class = tf.keras.Model
+                else:
+                    from keras import Model as model_class
+                embedding_model = model_class(inputs=inner.inputs, outputs=[inner.output, inner.layers[-2].output])
+            except Exception as e:
+                raise ValueError(f"Embeddings are not available for this model: {e}")
+            cached = self._embedding_model = (inner, embedding_model)
+        probs, embeddings = cached[1].predict(np.asarray(images, dtype=np.float32), verbose=0)
+        return np.asarray(probs), np.asarray(embeddings)
+    
     def predict_bytes(self, image_bytes: bytes) -> Dict[str, Any]:
         """Predict skin disease from image bytes"""
         self._ensure_loaded()
         
         try:
             processed_image = self._preprocess(image_bytes)
-            predictions = self.model.predict(processed_image, verbose=0)
-            
-            predicted_class_index = np.argmax(predictions, axis=1)[0]
-            predicted_class_name = self.idx_to_label[predicted_class_index]
-            confidence = float(np.max(predictions, axis=1)[0])
-            
-            # Get top 3 predictions
-            topk = min(3, len(predictions[0]))
-            top_indices = np.argsort(-predictions[0])[:topk]
-            
-            topk_results = []
-            for idx in top_indices:
-                topk_results.append({
-                    "index": int(idx),
-                    "label": self.idx_to_label[idx],
-                    "score": float(predictions[0][idx])
-                })
-            
-            model_status = "enhanced_fallback" if self.use_fallback else "saved_model"
-            note = self.model_error if self.use_fallback else "Using trained model"
-            
-            result = {
-                "topk": topk_results,
-                "best": {
-                    "index": int(predicted_class_index),
-                    "label": predicted_class_name, 
-                    "score": confidence
-                },
-                "model_status": model_status,
-                "note": note
-            }
-            
-            logger.info(f" Predicted: {predicted_class_name} ({confidence:.2%})")
+            result = self.predict_batch(processed_image)[0]
+            
+            logger.debug(" Predicted: %s (%.2f%%)", result['best']['label'], result['best']['score'] * 100)
             return result
             
         except Exception as e:
             logger.error(f"Prediction failed: {e}")
-            return {
-                "topk": [],
-                "best": {"index": -1, "label": "Error", "score": 0.0},
-                "model_status": f"Error: {str(e)}",
-                "error": str(e)
-            }
+            return self._error_result(e)
 
+    def preprocessing_spec(self) -> Dict[str, Any]:
+        """Preprocessing yang dipakai versi model ini (input size + normalisasi)"""
+        width, height = self._input_size()
+        vit = isinstance(self.model, PyTorchViTWrapper) or self.active_backend == "onnx"
+        return {
+            "input_size": [width, height],
+            "resample": "bilinear",
+            "scale": "1/255",
+            "normalize": {"mean": [0.5, 0.5, 0.5], "std": [0.5, 0.5, 0.5], "size": [224, 224]} if vit else None,
+        }
+    
+    def memory_bytes(self) -> int:
+        """Perkiraan memory weights model yang sedang di-load"""
+        if self.model is None:
+            return 0
+        torch_model = getattr(self.model, "model", None)
+        if torch_model is not None and hasattr(torch_model, "state_dict"):
+            total = 0
+            for tensor in torch_model.state_dict().values():
+                if hasattr(tensor, "element_size"):
+                    total += tensor.element_size() * tensor.nelement()
+            return total
+        onnx_path = getattr(self.model, "onnx_path", None)
+        if onnx_path is not None:
+            return Path(onnx_path).stat().st_size
+        try:
+            return int(sum(np.prod(w.shape) * w.dtype.itemsize for w in self.model.get_weights()))
+        except Exception:
+            return 0
+    
+    def unload(self):
+        """Lepas weights dari memory; load berikutnya mengulang dari sumber"""
+        with self._load_lock:
+            self.model = None
+            self.model_loaded = False
+            self.precision = "fp32"
+            self.compiled_batch_sizes = []
+            self._embedding_model = None
+            self._load_error = None
+            self._load_failures = 0
+            self._load_retry_at = 0.0
+        import gc
+        gc.collect()
+    
+    @property
+    def embedding_space(self) -> Optional[str]:
+        """
+        Versi weights tanpa suffix backend/precision: embedding dari fp32, int8
+        dan ONNX untuk weights yang sama bisa dibandingkan satu sama lain.
+        """
+        return self.model_version.split("+")[0] if self.model_version else None
+    
     def get_model_info(self) -> Dict[str, Any]:
         """Get model information"""
         self._ensure_loaded()
@@ -473,10 +1165,20 @@ class SkinDiseaseModel:
             "loaded": self.model_loaded,
             "model_type": model_type,
             "use_fallback": self.use_fallback,
-            "error": self.model_error,
+            "error": self.model_error or self._load_error,
             "input_shape": str(self.model.input_shape) if self.model and hasattr(self.model, 'input_shape') else None,
             "output_shape": str(self.model.output_shape) if self.model and hasattr(self.model, 'output_shape') else None,
             "labels": self.idx_to_label,
+            "version": self.model_version,
+            "backend": self.active_backend,
+            "precision": self.precision,
+            "precision_validated": self.precision_validated,
+            "execution": self.execution,
+            "compiled_batch_sizes": self.compiled_batch_sizes,
+            "source": self.source,
+            "source_probes": self.source_probes,
+            "preprocessing": self.preprocessing_spec(),
+            "stage_timings": self.stage_timings,
             "note": note
         }
 
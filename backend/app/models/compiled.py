@@ -0,0 +1,203 @@
+# app/models/compiled.py
+"""
+Eksekusi inference-only yang dikompilasi, sebagai ganti forward pass eager.
+
+- ViT (PyTorch): SKIN_MODEL_EXECUTION=trace -> TorchScript trace (di-freeze)
+  per batch size; =compile -> torch.compile(dynamic=False), satu graph per
+  batch size. Yang dikompilasi hanya logits (tanpa ModelOutput/dict).
+- Keras: mode selain eager -> model dipanggil langsung tanpa model.predict
+  (tanpa tf.data, callback dan progress bar). Di backend TensorFlow setiap
+  batch size jadi tf.function dengan input_signature tetap, opsional XLA
+  (SKIN_MODEL_XLA=1). Model tidak di-compile dengan optimizer.
+
+Kompilasi terjadi saat warm-up (SkinDiseaseModel.warm_up) untuk setiap batch
+size yang di-warm-up. Batch dengan ukuran lain di-pad ke batch size
+terkompilasi terdekat di atasnya atau dipecah ke batch size terkompilasi
+yang lebih kecil (lihat batch_plan), jadi tidak pernah ada trace/recompile
+di jalur request. Warm-up batch size 1,2,4,8 membatasi padding ke < 2x.
+"""
+import os
+import logging
+import warnings
+import contextlib
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+EXECUTION_MODES = ("eager", "trace", "compile")
+MODEL_EXECUTION = os.getenv("SKIN_MODEL_EXECUTION", "eager").lower()
+KERAS_XLA = os.getenv("SKIN_MODEL_XLA", "0") == "1"
+TORCH_COMPILE_MODE = os.getenv("TORCH_COMPILE_MODE", "default")  # default, reduce-overhead, max-autotune
+
+
+def batch_plan(batch_size: int, compiled_sizes: List[int]) -> List[Tuple[int, int, int]]:
+    """
+    Potong batch N jadi potongan (start, end, compiled_size); potongan yang
+    lebih kecil dari compiled_size diisi padding. Padding hanya dipakai kalau
+    paling banyak separuh batch terkompilasi terbuang, selain itu sisa batch
+    dipecah ke batch size terkompilasi yang lebih kecil. compiled_sizes tidak
+    boleh kosong.
+    """
+    sizes = sorted(compiled_sizes)
+    plan = []
+    start = 0
+    while start < batch_size:
+        remaining = batch_size - start
+        size = next((s for s in sizes if s >= remaining), None)
+        if size is None or size > 2 * remaining:
+            size = max([s for s in sizes if s <= remaining] or [sizes[0]])
+        end = start + min(size, remaining)
+        plan.append((start, end, size))
+        start = end
+    return plan
+
+
+def _pad_rows(array, size: int):
+    """Tambah baris nol sampai array punya `size` baris (numpy atau torch)"""
+    missing = size - array.shape[0]
+    if missing <= 0:
+        return array
+    if isinstance(array, np.ndarray):
+        return np.concatenate([array, np.zeros((missing,) + array.shape[1:], dtype=array.dtype)])
+    import torch
+    return torch.cat([array, array.new_zeros((missing,) + tuple(array.shape[1:]))])
+
+
+def run_compiled(functions: Dict[int, Callable], inputs, concat: Callable):
+    """Jalankan inputs lewat fungsi terkompilasi per batch size (dengan padding)"""
+    outputs = []
+    for start, end, size in batch_plan(inputs.shape[0], list(functions)):
+        result = functions[size](_pad_rows(inputs[start:end], size))
+        outputs.append(result[:end - start])
+    return outputs[0] if len(outputs) == 1 else concat(outputs)
+
+
+def compile_vit_logits(model, example, mode: str, precision: str, device: str,
+                       compiled_module=None) -> Callable:
+    """
+    Fungsi pixel_values -> logits terkompilasi untuk shape `example`.
+    trace: TorchScript per shape. compile: torch.compile dipakai bersama
+    (compiled_module), dipanggil sekali di sini supaya graph shape ini dibuat.
+    """
+    import torch
+
+    class _Logits(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, pixel_values):
+            return self.inner(pixel_values).logits
+
+    autocast = (
+        torch.autocast(device_type=device, dtype=torch.bfloat16)
+        if precision == "bf16" else contextlib.nullcontext()
+    )
+
+    if mode == "trace":
+        # Trace memang per shape: warning "treated as a constant" dari HF ViT diharapkan
+        with torch.no_grad(), autocast, warnings.catch_warnings():
+            warnings.simplefilter("ignore", torch.jit.TracerWarning)
+            warnings.simplefilter("ignore", FutureWarning)
+            traced = torch.jit.trace(_Logits(model).eval(), example, check_trace=False)
+            try:
+                traced = torch.jit.freeze(traced)
+            except Exception as e:
+                # Modul INT8 dynamic quantization tidak selalu bisa di-freeze
+                logger.debug(f"TorchScript freeze skipped: {e}")
+            traced(example)
+        return traced
+
+    if mode == "compile":
+        compiled = compiled_module
+        if compiled is None:
+            compiled = torch.compile(_Logits(model).eval(), dynamic=False, mode=TORCH_COMPILE_MODE)
+        with torch.no_grad(), autocast:
+            compiled(example)
+        return compiled
+
+    raise ValueError(f"Unknown execution mode: {mode} (choose from {', '.join(EXECUTION_MODES)})")
+
+
+class KerasGraphWrapper:
+    """
+    Model Keras yang dipanggil langsung (inference-only) dengan interface
+    predict() yang sama seperti model Keras / PyTorchViTWrapper.
+    """
+
+    def __init__(self, model, jit_compile: bool = KERAS_XLA):
+        self.model = model
+        self.jit_compile = jit_compile
+        self.backend = self._detect_backend(model)
+        self._functions: Dict[int, Callable] = {}
+
+    @staticmethod
+    def _detect_backend(model) -> str:
+        # tf.keras legacy (model .h5) selalu TensorFlow
+        if type(model).__module__.startswith(("tf_keras", "tensorflow")):
+            return "tensorflow"
+        try:
+            import keras
+            return keras.backend.backend()
+        except Exception:
+            return "tensorflow"
+
+    @property
+    def compiled_batch_sizes(self) -> List[int]:
+        return sorted(self._functions)
+
+    def compile_for(self, batch_sizes: List[int], mode: str = "trace"):
+        """Buat fungsi dengan input_signature tetap untuk setiap batch size"""
+        _, height, width, channels = self.model.input_shape
+        for batch_size in batch_sizes:
+            if batch_size in self._functions:
+                continue
+            example = np.zeros((batch_size, height, width, channels), dtype=np.float32)
+            if self.backend == "tensorflow":
+                import tensorflow as tf
+                function = tf.function(
+                    lambda x: self.model(x, training=False),
+                    input_signature=[tf.TensorSpec((batch_size, height, width, channels), tf.float32)],
+                    jit_compile=self.jit_compile,
+                )
+                function(example)  # trace + (XLA) compile sekarang, bukan di request pertama
+                self._functions[batch_size] = lambda x, f=function: f(x).numpy()
+            else:
+                if self.jit_compile:
+                    logger.warning(f"  XLA is only available on the TensorFlow backend (Keras backend: {self.backend})")
+                self._eager_call(example)
+                self._functions[batch_size] = self._eager_call
+        logger.info(f" Keras graph functions ready for batch sizes {self.compiled_batch_sizes} "
+                    f"(backend={self.backend}, xla={self.jit_compile and self.backend == 'tensorflow'})")
+
+    def _eager_call(self, image_array: np.ndarray) -> np.ndarray:
+        """Panggil model langsung (tanpa model.predict), tanpa gradient tracking"""
+        if self.backend == "tensorflow":
+            return self.model(image_array, training=False).numpy()
+        import keras
+        if self.backend == "torch":
+            import torch
+            with torch.no_grad():
+                return keras.ops.convert_to_numpy(self.model(image_array, training=False))
+        return keras.ops.convert_to_numpy(self.model(image_array, training=False))
+
+    def predict(self, image_array, verbose=0):
+        image_array = np.asarray(image_array, dtype=np.float32)
+        if self._functions and self.backend == "tensorflow":
+            return run_compiled(self._functions, image_array, np.concatenate)
+        # Backend lain tidak punya graph per shape: panggilan langsung jalan di batch size apa pun
+        return self._eager_call(image_array)
+
+    def get_weights(self):
+        return self.model.get_weights()
+
+    @property
+    def input_shape(self):
+        return self.model.input_shape
+
+    @property
+    def output_shape(self):
+        return self.model.output_shape
@@ -0,0 +1,270 @@
+# app/models/onnx_backend.py
+"""
+ONNX Runtime backend untuk ViT classifier.
+
+Model HF ViT yang sudah di-load di-export sekali ke ONNX graph dan di-cache
+di app/models/weights/onnx/. Setelah itu inference jalan lewat
+onnxruntime.InferenceSession (graph optimizations + thread count yang bisa
+diatur) dengan interface yang sama seperti PyTorchViTWrapper.
+
+Parity check (top-k ONNX == top-k PyTorch):
+    python -m app.models.onnx_backend --check-parity [--images folder/]
+"""
+import os
+import json
+import time
+import logging
+import inspect
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .ai_model import vit_pixel_values
+
+logger = logging.getLogger(__name__)
+
+ONNX_DIR = Path(os.getenv("ONNX_EXPORT_DIR", str(Path(__file__).parent / "weights" / "onnx")))
+ONNX_OPSET = int(os.getenv("ONNX_OPSET", "17"))
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0 = default onnxruntime (jumlah core)
+ONNX_INTER_OP_THREADS = int(os.getenv("ONNX_INTER_OP_THREADS", "1"))
+PARITY_TOPK = 3
+EXPORT_OUTPUTS = ["logits", "embedding"]
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def onnx_path_for(model_version: str) -> Path:
+    """Lokasi file .onnx untuk versi model tertentu"""
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in model_version)
+    return ONNX_DIR / f"{safe_name}.onnx"
+
+
+def export_onnx(torch_model, onnx_path: Path, model_version: str, opset: int = ONNX_OPSET) -> Path:
+    """
+    Export HF ViTForImageClassification ke ONNX (batch dimension dinamis).
+    Output: logits + embedding CLS (input classifier) dari forward pass yang sama.
+    """
+    import torch
+
+    class _LogitsAndEmbedding(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.encoder = getattr(inner, inner.base_model_prefix)
+            self.classifier = inner.classifier
+
+        def forward(self, pixel_values):
+            embedding = self.encoder(pixel_values).last_hidden_state[:, 0]
+            return self.classifier(embedding), embedding
+
+    onnx_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = onnx_path.with_suffix(".onnx.tmp")
+    dummy_input = torch.zeros((1, 3, 224, 224), dtype=torch.float32)
+
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs["dynamo"] = False  # pakai exporter TorchScript (dynamic_axes)
+
+    logger.info(f" Exporting ViT to ONNX: {onnx_path}")
+    started = time.perf_counter()
+    torch_model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            _LogitsAndEmbedding(torch_model).eval(),
+            (dummy_input,),
+            str(tmp_path),
+            input_names=["pixel_values"],
+            output_names=EXPORT_OUTPUTS,
+            dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}, "embedding": {0: "batch"}},
+            opset_version=opset,
+            **export_kwargs
+        )
+    os.replace(tmp_path, onnx_path)
+
+    # Metadata: versi weights sumber, supaya cache export tidak basi
+    meta = {
+        "model_version": model_version,
+        "opset": opset,
+        "outputs": EXPORT_OUTPUTS,
+        "num_labels": torch_model.config.num_labels,
+        "exported_at": time.time(),
+    }
+    onnx_path.with_suffix(".json").write_text(json.dumps(meta, indent=2))
+    logger.info(f" ONNX export finished in {time.perf_counter() - started:.1f}s")
+    return onnx_path
+
+
+def _is_export_current(onnx_path: Path, model_version: str) -> bool:
+    meta_path = onnx_path.with_suffix(".json")
+    if not onnx_path.exists() or not meta_path.exists():
+        return False
+    try:
+        meta = json.loads(meta_path.read_text())
+    except ValueError:
+        return False
+    # Export lama tanpa output embedding di-export ulang
+    return (meta.get("model_version") == model_version and meta.get("opset") == ONNX_OPSET
+            and meta.get("outputs") == EXPORT_OUTPUTS)
+
+
+class ONNXViTWrapper:
+    """ONNX Runtime session dengan interface Keras-style seperti PyTorchViTWrapper"""
+
+    def __init__(self, onnx_path: Path, num_labels: int,
+                 intra_op_threads: int = ONNX_INTRA_OP_THREADS,
+                 inter_op_threads: int = ONNX_INTER_OP_THREADS):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+
+        self.onnx_path = Path(onnx_path)
+        self.num_labels = num_labels
+        self.session = ort.InferenceSession(
+            str(self.onnx_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        logger.info(
+            f"  Using ONNX Runtime (intra_op_threads={intra_op_threads or 'auto'}, "
+            f"inter_op_threads={inter_op_threads})"
+        )
+
+    def predict(self, image_array, verbose=0):
+        """Keras-style predict method"""
+        try:
+            pixel_values = vit_pixel_values(image_array)
+            logits = self.session.run(None, {self.input_name: pixel_values})[0]
+            result = _softmax(logits)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(" ONNX prediction successful: shape=%s, max_prob=%.4f", result.shape, result.max())
+            return result
+        except Exception as e:
+            # Raise seperti backend PyTorch (jangan kembalikan probabilitas nol)
+            logger.error(f" ONNX prediction failed: {e}")
+            raise
+
+    def predict_with_embeddings(self, image_array):
+        """Probabilitas + embedding CLS dari satu session.run"""
+        logits, embeddings = self.session.run(None, {self.input_name: vit_pixel_values(image_array)})[:2]
+        return _softmax(logits), embeddings
+
+    @property
+    def input_shape(self):
+        return (None, 224, 224, 3)  # ViT standard input
+
+    @property
+    def output_shape(self):
+        return (None, self.num_labels)
+
+
+def check_parity(torch_wrapper, onnx_wrapper, images: np.ndarray, k: int = PARITY_TOPK,
+                 atol: float = 1e-3) -> Dict[str, Any]:
+    """
+    Bandingkan output PyTorch vs ONNX untuk batch gambar (N, H, W, 3).
+    Lulus kalau urutan top-k identik untuk semua gambar dan selisih
+    probabilitas maksimum <= atol.
+    """
+    torch_probs = torch_wrapper.predict(images)
+    onnx_probs = onnx_wrapper.predict(images)
+
+    topk_torch = np.argsort(-torch_probs, axis=1)[:, :k]
+    topk_onnx = np.argsort(-onnx_probs, axis=1)[:, :k]
+    topk_matches = (topk_torch == topk_onnx).all(axis=1)
+    max_abs_diff = float(np.abs(torch_probs - onnx_probs).max())
+
+    return {
+        "images": int(len(images)),
+        "k": k,
+        "topk_match_rate": float(topk_matches.mean()),
+        "mismatched_indices": [int(i) for i in np.flatnonzero(~topk_matches)],
+        "max_abs_diff": max_abs_diff,
+        "passed": bool(topk_matches.all() and max_abs_diff <= atol),
+    }
+
+
+def _synthetic_images(count: int = 4, size: int = 512, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.random((count, size, size, 3), dtype=np.float32)
+
+
+def load_onnx_wrapper(torch_wrapper, model_version: str) -> Optional[ONNXViTWrapper]:
+    """
+    Export (kalau belum ada/basi) lalu buka ONNX session untuk model ini.
+    Export baru selalu diverifikasi dengan parity check; return None kalau
+    gagal supaya caller tetap memakai backend PyTorch.
+    """
+    torch_model = torch_wrapper.model
+    onnx_path = onnx_path_for(model_version)
+    try:
+        fresh_export = not _is_export_current(onnx_path, model_version)
+        if fresh_export:
+            export_onnx(torch_model.cpu(), onnx_path, model_version)
+            torch_model.to(torch_wrapper.device)
+
+        onnx_wrapper = ONNXViTWrapper(onnx_path, torch_model.config.num_labels)
+
+        if fresh_export:
+            report = check_parity(torch_wrapper, onnx_wrapper, _synthetic_images())
+            logger.info(f" ONNX parity check: {report}")
+            if not report["passed"]:
+                logger.warning("  ONNX parity check failed - staying on PyTorch backend")
+                onnx_path.unlink(missing_ok=True)
+                return None
+
+        return onnx_wrapper
+
+    except Exception as e:
+        logger.warning(f"  ONNX backend unavailable: {str(e)[:200]}")
+        return None
+
+
+def _load_folder_images(folder: Path, model) -> np.ndarray:
+    paths = sorted(p for p in folder.rglob("*") if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".bmp", ".webp"))
+    batch, errors = model.preprocess_many([p.read_bytes() for p in paths])
+    return batch[[i for i, error in enumerate(errors) if error is None]]
+
+
+def main(argv: List[str] = None):
+    import argparse
+    from .ai_model import SkinDiseaseModel, PyTorchViTWrapper
+
+    parser = argparse.ArgumentParser(description="Export ViT ke ONNX dan cek parity dengan PyTorch")
+    parser.add_argument("--check-parity", action="store_true", help="Bandingkan top-k ONNX vs PyTorch")
+    parser.add_argument("--images", type=Path, help="Folder gambar untuk parity check (default: gambar sintetis)")
+    parser.add_argument("--force", action="store_true", help="Export ulang walaupun cache ONNX masih valid")
+    parser.add_argument("-k", type=int, default=PARITY_TOPK)
+    args = parser.parse_args(argv)
+
+    from app.logging_config import setup_logging
+    setup_logging()
+
+    model = SkinDiseaseModel()
+    model.backend = "pytorch"
+    model._ensure_loaded()
+    if not isinstance(model.model, PyTorchViTWrapper):
+        raise SystemExit("Loaded model is not the PyTorch ViT - nothing to export")
+
+    onnx_path = onnx_path_for(model.model_version)
+    if args.force or not _is_export_current(onnx_path, model.model_version):
+        export_onnx(model.model.model.cpu(), onnx_path, model.model_version)
+        model.model.model.to(model.model.device)
+    print(f"ONNX model: {onnx_path}")
+
+    if args.check_parity:
+        onnx_wrapper = ONNXViTWrapper(onnx_path, model.model.model.config.num_labels)
+        images = _load_folder_images(args.images, model) if args.images else _synthetic_images(8)
+        report = check_parity(model.model, onnx_wrapper, images, k=args.k)
+        print(json.dumps(report, indent=2))
+        if not report["passed"]:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
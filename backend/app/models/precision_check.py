@@ -0,0 +1,159 @@
+# app/models/precision_check.py
+"""
+Validation harness untuk reduced-precision inference (INT8 / bf16).
+
+Folder validasi berisi satu subfolder per label, misalnya:
+    validation/
+        Nevus/             img001.jpg, img002.jpg, ...
+        Vascular Lesion/   ...
+
+Gambar dijalankan lewat model fp32 dan model reduced-precision, lalu
+dilaporkan top-1 agreement, score drift, speedup, dan ukuran weights.
+
+    python -m app.models.precision_check --mode int8 --folder path/ke/validation
+"""
+import io
+import json
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_labelled_folder(folder: Path) -> Tuple[List[bytes], List[str]]:
+    """Baca folder validasi -> (list image bytes, list nama label dari subfolder)"""
+    if not Path(folder).is_dir():
+        raise ValueError(f"Validation folder not found: {folder}")
+    images, labels = [], []
+    for path in sorted(Path(folder).rglob("*")):
+        if path.suffix.lower() in IMAGE_EXTENSIONS:
+            images.append(path.read_bytes())
+            labels.append(path.parent.name if path.parent != Path(folder) else "")
+    if not images:
+        raise ValueError(f"No validation images found in {folder} (extensions: {', '.join(IMAGE_EXTENSIONS)})")
+    return images, labels
+
+
+def synthetic_images(count: int = 16, size: int = 512, seed: int = 0) -> np.ndarray:
+    """Gambar random - dipakai kalau tidak ada folder validasi"""
+    rng = np.random.default_rng(seed)
+    return rng.random((count, size, size, 3), dtype=np.float32)
+
+
+def model_size_mb(wrapper) -> Optional[float]:
+    """Ukuran state_dict (termasuk packed INT8 weights) dalam MB"""
+    try:
+        import torch
+        buffer = io.BytesIO()
+        torch.save(wrapper.model.state_dict(), buffer)
+        return round(buffer.tell() / (1024 ** 2), 2)
+    except Exception:
+        return None
+
+
+def _timed_predict(wrapper, images: np.ndarray, batch_size: int) -> Tuple[np.ndarray, float]:
+    outputs = []
+    started = time.perf_counter()
+    for start in range(0, len(images), batch_size):
+        outputs.append(wrapper.predict(images[start:start + batch_size]))
+    return np.concatenate(outputs, axis=0), time.perf_counter() - started
+
+
+def compare_precision(fp32_wrapper, reduced_wrapper, images: np.ndarray,
+                      labels: Optional[List[str]] = None, idx_to_label: Optional[List[str]] = None,
+                      batch_size: int = 8) -> Dict[str, Any]:
+    """
+    Jalankan batch gambar (N, H, W, 3) lewat kedua model dan bandingkan.
+    Satu pass warm-up dijalankan dulu supaya speedup tidak bias cold start.
+    """
+    if len(images) == 0:
+        raise ValueError("No validation images found (none could be decoded)")
+    warmup = images[:min(len(images), batch_size)]
+    fp32_wrapper.predict(warmup)
+    reduced_wrapper.predict(warmup)
+
+    fp32_probs, fp32_time = _timed_predict(fp32_wrapper, images, batch_size)
+    reduced_probs, reduced_time = _timed_predict(reduced_wrapper, images, batch_size)
+
+    fp32_top1 = fp32_probs.argmax(axis=1)
+    reduced_top1 = reduced_probs.argmax(axis=1)
+    rows = np.arange(len(images))
+    top1_drift = np.abs(fp32_probs[rows, fp32_top1] - reduced_probs[rows, fp32_top1])
+
+    report = {
+        "images": int(len(images)),
+        "precision": getattr(reduced_wrapper, "precision", None),
+        "top1_agreement": float((fp32_top1 == reduced_top1).mean()),
+        "score_drift": {
+            "mean_abs": float(np.abs(fp32_probs - reduced_probs).mean()),
+            "max_abs": float(np.abs(fp32_probs - reduced_probs).max()),
+            "top1_mean_abs": float(top1_drift.mean()),
+        },
+        "latency_ms_per_image": {
+            "fp32": round(1000 * fp32_time / len(images), 3),
+            "reduced": round(1000 * reduced_time / len(images), 3),
+        },
+        "speedup": round(fp32_time / reduced_time, 3) if reduced_time > 0 else None,
+        "model_size_mb": {
+            "fp32": model_size_mb(fp32_wrapper),
+            "reduced": model_size_mb(reduced_wrapper),
+        },
+    }
+
+    # Akurasi terhadap label folder (kalau nama subfolder cocok dengan label model)
+    if labels and idx_to_label:
+        label_to_idx = {name.lower(): i for i, name in enumerate(idx_to_label)}
+        known = [(i, label_to_idx[label.lower()]) for i, label in enumerate(labels) if label.lower() in label_to_idx]
+        if known:
+            positions, targets = map(np.array, zip(*known))
+            report["accuracy"] = {
+                "labelled_images": len(known),
+                "fp32": float((fp32_top1[positions] == targets).mean()),
+                "reduced": float((reduced_top1[positions] == targets).mean()),
+            }
+
+    return report
+
+
+def main(argv: List[str] = None):
+    import argparse
+    from .ai_model import SkinDiseaseModel, PyTorchViTWrapper, PRECISION_MODES
+
+    parser = argparse.ArgumentParser(description="Bandingkan inference fp32 vs reduced precision")
+    parser.add_argument("--mode", choices=[m for m in PRECISION_MODES if m != "fp32"], default="int8")
+    parser.add_argument("--folder", type=Path, help="Folder validasi berlabel (default: gambar sintetis)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    from app.logging_config import setup_logging
+    setup_logging()
+
+    model = SkinDiseaseModel()
+    model.backend = "pytorch"
+    model.requested_precision = "fp32"
+    model._ensure_loaded()
+    if not isinstance(model.model, PyTorchViTWrapper):
+        raise SystemExit("Precision modes are only supported on the PyTorch ViT backend")
+
+    if args.folder:
+        image_bytes, labels = load_labelled_folder(args.folder)
+        images, errors = model.preprocess_many(image_bytes)
+        valid = [i for i, error in enumerate(errors) if error is None]
+        images, labels = images[valid], [labels[i] for i in valid]
+    else:
+        images, labels = synthetic_images(), None
+
+    reduced = model.model.with_precision(args.mode)
+    report = compare_precision(model.model, reduced, images, labels, model.idx_to_label, args.batch_size)
+    report["validated"] = bool(args.folder)  # gambar sintetis: tidak ada bukti akurasi
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
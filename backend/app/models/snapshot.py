@@ -0,0 +1,251 @@
+# app/models/snapshot.py
+"""
+Snapshot lokal untuk ViT classifier.
+
+CLI ini mengunduh model SEKALI (di mesin yang punya akses network) lalu
+menyimpannya sebagai snapshot berversi:
+
+    app/models/weights/snapshots/
+        CURRENT                     <- nama versi yang aktif
+        20250101-1a2b3c4d/
+            model.safetensors
+            config.json
+            labels.json
+            manifest.json
+
+Saat startup, SkinDiseaseModel memakai snapshot ini dan tidak menyentuh
+Hugging Face Hub sama sekali. Weights di-memory-map (mmap MAP_PRIVATE)
+langsung dari file safetensors, jadi tidak ada deserialisasi penuh dan
+beberapa worker/proses berbagi page cache yang sama.
+
+    python -m app.models.snapshot create [--repo-id 0xnu/skincare-detection] [--revision main]
+    python -m app.models.snapshot list
+    python -m app.models.snapshot use <versi>
+"""
+import os
+import json
+import time
+import struct
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = Path(os.getenv("SKIN_MODEL_SNAPSHOT_DIR", str(Path(__file__).parent / "weights" / "snapshots")))
+SNAPSHOT_VERSION = os.getenv("SKIN_MODEL_SNAPSHOT", "")  # kosong = pakai CURRENT
+DEFAULT_REPO_ID = "0xnu/skincare-detection"
+
+WEIGHTS_FILE = "model.safetensors"
+CONFIG_FILE = "config.json"
+LABELS_FILE = "labels.json"
+MANIFEST_FILE = "manifest.json"
+
+# dtype safetensors -> nama atribut torch
+_SAFETENSORS_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8",
+    "U8": "uint8", "BOOL": "bool",
+}
+
+
+def _sha256_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def current_snapshot(snapshot_dir: Path = SNAPSHOT_DIR, version: str = SNAPSHOT_VERSION) -> Optional[Path]:
+    """Folder snapshot aktif (SKIN_MODEL_SNAPSHOT atau CURRENT), None kalau belum ada"""
+    if not version:
+        pointer = snapshot_dir / "CURRENT"
+        if not pointer.exists():
+            return None
+        version = pointer.read_text().strip()
+
+    path = snapshot_dir / version
+    if not (path / WEIGHTS_FILE).exists() or not (path / MANIFEST_FILE).exists():
+        logger.warning(f"  Model snapshot '{version}' is incomplete or missing: {path}")
+        return None
+    return path
+
+
+def read_manifest(path: Path) -> Dict[str, Any]:
+    return json.loads((path / MANIFEST_FILE).read_text())
+
+
+def list_snapshots(snapshot_dir: Path = SNAPSHOT_DIR) -> List[Dict[str, Any]]:
+    if not snapshot_dir.exists():
+        return []
+    return [read_manifest(p) for p in sorted(snapshot_dir.iterdir()) if (p / MANIFEST_FILE).exists()]
+
+
+def set_current(version: str, snapshot_dir: Path = SNAPSHOT_DIR):
+    """Ganti snapshot aktif (atomic rename pointer file)"""
+    if not (snapshot_dir / version / MANIFEST_FILE).exists():
+        raise ValueError(f"Unknown snapshot version: {version}")
+    tmp_path = snapshot_dir / "CURRENT.tmp"
+    tmp_path.write_text(version + "\n")
+    os.replace(tmp_path, snapshot_dir / "CURRENT")
+
+
+def create_snapshot(repo_id: str = DEFAULT_REPO_ID, revision: Optional[str] = None,
+                    snapshot_dir: Path = SNAPSHOT_DIR, make_current: bool = True) -> Path:
+    """Download model dari Hub lalu tulis snapshot safetensors + config + labels"""
+    import torch
+    from safetensors.torch import save_file
+    from transformers import ViTForImageClassification
+
+    logger.info(f" Downloading {repo_id} ({revision or 'default revision'}) for snapshot...")
+    model = ViTForImageClassification.from_pretrained(repo_id, revision=revision, trust_remote_code=True)
+    model.eval()
+
+    config = model.config
+    if getattr(config, "id2label", None):
+        labels = [config.id2label[i] for i in range(config.num_labels)]
+    else:
+        labels = [f"Skin Condition {i+1}" for i in range(config.num_labels)]
+
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(prefix=".snapshot-", dir=snapshot_dir))
+    try:
+        # contiguous + clone: safetensors tidak menerima tensor yang berbagi storage
+        state_dict = {name: tensor.detach().contiguous().clone() for name, tensor in model.state_dict().items()}
+        save_file(state_dict, str(work_dir / WEIGHTS_FILE), metadata={"format": "pt"})
+        config.to_json_file(str(work_dir / CONFIG_FILE))
+        (work_dir / LABELS_FILE).write_text(json.dumps(labels, indent=2))
+
+        weights_sha256 = _sha256_file(work_dir / WEIGHTS_FILE)
+        version = f"{time.strftime('%Y%m%d')}-{weights_sha256[:8]}"
+        manifest = {
+            "version": version,
+            "source": repo_id,
+            "revision": revision or getattr(config, "_commit_hash", None),
+            "architecture": type(model).__name__,
+            "num_labels": config.num_labels,
+            "weights_sha256": weights_sha256,
+            "weights_bytes": (work_dir / WEIGHTS_FILE).stat().st_size,
+            "torch_version": torch.__version__,
+            "created_at": time.time(),
+        }
+        (work_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+
+        target = snapshot_dir / version
+        if target.exists():
+            logger.info(f" Snapshot {version} already exists - keeping existing files")
+        else:
+            os.replace(work_dir, target)
+    finally:
+        if work_dir.exists():
+            for path in work_dir.iterdir():
+                path.unlink()
+            work_dir.rmdir()
+
+    if make_current:
+        set_current(version, snapshot_dir)
+    logger.info(f" Snapshot written: {target}")
+    return target
+
+
+def mmap_safetensors(path: Path) -> Dict[str, Any]:
+    """
+    Buka file safetensors sebagai dict tensor yang di-memory-map.
+
+    Storage dibuat dengan torch.UntypedStorage.from_file(shared=False), yaitu
+    mmap MAP_PRIVATE: page dibaca lazily dari page cache (dibagi antar proses)
+    dan baru di-copy kalau ada yang menulis.
+    """
+    import torch
+
+    path = Path(path)
+    file_size = path.stat().st_size
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+    data_start = 8 + header_size
+
+    storage = torch.UntypedStorage.from_file(str(path), shared=False, nbytes=file_size)
+    tensors = {}
+    for name, info in header.items():
+        dtype = getattr(torch, _SAFETENSORS_DTYPES[info["dtype"]])
+        begin, end = info["data_offsets"]
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        byte_offset = data_start + begin
+        if byte_offset % itemsize:
+            raise ValueError(f"Tensor {name} is not aligned for memory mapping")
+        tensor = torch.empty(0, dtype=dtype)
+        tensor.set_(storage, byte_offset // itemsize, tuple(info["shape"]))
+        tensors[name] = tensor
+    return tensors
+
+
+def load_snapshot_model(path: Path):
+    """
+    Bangun ViTForImageClassification dari snapshot tanpa network dan tanpa
+    inisialisasi weights random: modul dibuat di meta device, lalu parameter
+    di-assign langsung ke tensor mmap.
+    """
+    import torch
+    from transformers import ViTConfig, ViTForImageClassification
+
+    path = Path(path)
+    config = ViTConfig.from_json_file(str(path / CONFIG_FILE))
+    try:
+        state_dict = mmap_safetensors(path / WEIGHTS_FILE)
+    except ValueError as e:
+        logger.warning(f"  {e} - falling back to regular safetensors load")
+        from safetensors.torch import load_file
+        state_dict = load_file(str(path / WEIGHTS_FILE))
+
+    with torch.device("meta"):
+        model = ViTForImageClassification(config)
+    model.load_state_dict(state_dict, strict=True, assign=True)
+
+    # Buffer non-persistent tidak ada di state_dict dan masih di meta device
+    if any(t.is_meta for t in list(model.parameters()) + list(model.buffers())):
+        logger.warning("  Snapshot did not cover all tensors - materializing model normally")
+        model = ViTForImageClassification(config)
+        model.load_state_dict(state_dict, strict=True)
+
+    model.eval()
+    labels = json.loads((path / LABELS_FILE).read_text())
+    return model, labels
+
+
+def main(argv: List[str] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Kelola snapshot lokal model ViT")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    create = subparsers.add_parser("create", help="Download model dan tulis snapshot baru")
+    create.add_argument("--repo-id", default=DEFAULT_REPO_ID)
+    create.add_argument("--revision", default=None)
+    create.add_argument("--no-activate", action="store_true", help="Jangan jadikan snapshot aktif")
+    subparsers.add_parser("list", help="Tampilkan snapshot yang ada")
+    use = subparsers.add_parser("use", help="Aktifkan snapshot tertentu")
+    use.add_argument("version")
+    args = parser.parse_args(argv)
+
+    from app.logging_config import setup_logging
+    setup_logging()
+
+    if args.command == "create":
+        path = create_snapshot(args.repo_id, args.revision, make_current=not args.no_activate)
+        print(json.dumps(read_manifest(path), indent=2))
+    elif args.command == "list":
+        active = current_snapshot()
+        for manifest in list_snapshots():
+            marker = "*" if active and active.name == manifest["version"] else " "
+            print(f"{marker} {manifest['version']}  {manifest['source']}  {manifest['weights_bytes'] / (1024 ** 2):.1f} MB")
+    elif args.command == "use":
+        set_current(args.version)
+        print(f"Active snapshot: {args.version}")
+
+
+if __name__ == "__main__":
+    main()
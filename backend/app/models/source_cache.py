@@ -0,0 +1,107 @@
+# app/models/source_cache.py
+"""
+Cache hasil resolusi sumber model untuk mempercepat cold start.
+
+File manifest (JSON) menyimpan:
+- "resolved": sumber yang terakhir berhasil di-load + fingerprint semua
+  sumber saat itu. Startup berikutnya langsung mencoba sumber ini selama
+  fingerprint-nya dan sumber yang urutannya lebih tinggi masih sama.
+- "failed": sumber yang gagal di-load (negative cache). Selama fingerprint
+  tidak berubah dan umur entry < SKIN_MODEL_SOURCE_NEGATIVE_TTL, sumber ini
+  dilewati - tidak perlu import TensorFlow/Keras atau menunggu Hub lagi.
+
+Fingerprint sumber lokal = nama file + mtime, jadi mengganti file weights
+otomatis membatalkan entry lama. Hapus file manifest untuk reset manual.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+SOURCE_CACHE_ENABLED = os.getenv("SKIN_MODEL_SOURCE_CACHE", "1") == "1"
+SOURCE_MANIFEST_PATH = os.getenv("SKIN_MODEL_SOURCE_MANIFEST", "")  # kosong = <weights_dir>/resolved_source.json
+NEGATIVE_TTL_SECONDS = float(os.getenv("SKIN_MODEL_SOURCE_NEGATIVE_TTL", str(24 * 3600)))
+MANIFEST_FILE = "resolved_source.json"
+
+
+class SourceResolutionCache:
+    """Manifest sumber model yang berhasil + negative cache sumber yang gagal"""
+
+    def __init__(self, path: Path, negative_ttl: float = NEGATIVE_TTL_SECONDS):
+        self.path = Path(path)
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._data: Dict[str, Any] = {"resolved": None, "failed": {}}
+        self._load()
+
+    def _load(self):
+        try:
+            data = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"  Ignoring unreadable source manifest {self.path}: {e}")
+            return
+        self._data["resolved"] = data.get("resolved")
+        self._data["failed"] = data.get("failed") or {}
+
+    def _save(self):
+        """Tulis atomic (tmp + rename); gagal tulis (read-only FS) hanya di-log"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            tmp_path.write_text(json.dumps(self._data, indent=2))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"  Could not write source manifest {self.path}: {e}")
+
+    def order(self, sources: List[str], fingerprints: Dict[str, Optional[str]]) -> List[str]:
+        """
+        Urutan probe: sumber yang terakhir berhasil di depan, selama fingerprint-nya
+        dan fingerprint sumber yang urutannya lebih tinggi tidak berubah (misalnya
+        snapshot baru dibuat -> kembali ke urutan normal).
+        """
+        resolved = self._data["resolved"]
+        if not resolved or resolved.get("source") not in sources:
+            return list(sources)
+        source = resolved["source"]
+        seen = resolved.get("fingerprints") or {}
+        for candidate in sources[:sources.index(source) + 1]:
+            if fingerprints.get(candidate) != seen.get(candidate):
+                return list(sources)
+        return [source] + [s for s in sources if s != source]
+
+    def is_known_bad(self, source: str, fingerprint: Optional[str]) -> bool:
+        entry = self._data["failed"].get(source)
+        if not entry or entry.get("fingerprint") != fingerprint:
+            return False
+        return time.time() - entry.get("failed_at", 0) < self.negative_ttl
+
+    def record_success(self, source: str, fingerprints: Dict[str, Optional[str]],
+                       model_version: str, seconds: float):
+        with self._lock:
+            self._data["resolved"] = {
+                "source": source,
+                "fingerprint": fingerprints.get(source),
+                "fingerprints": fingerprints,
+                "model_version": model_version,
+                "load_seconds": round(seconds, 3),
+                "resolved_at": time.time(),
+            }
+            self._data["failed"].pop(source, None)
+            self._save()
+
+    def record_failure(self, source: str, fingerprint: Optional[str], seconds: float):
+        with self._lock:
+            self._data["failed"][source] = {
+                "fingerprint": fingerprint,
+                "seconds": round(seconds, 3),
+                "failed_at": time.time(),
+            }
+            self._save()
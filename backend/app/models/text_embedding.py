@@ -0,0 +1,249 @@
+# app/models/text_embedding.py
+"""
+Sentence-embedding model lokal (CPU) untuk sisi dense pencarian produk.
+
+Model disimpan SEKALI ke folder lokal (butuh network hanya saat download),
+lalu selalu dimuat dengan local_files_only - tidak pernah menyentuh Hugging
+Face Hub saat runtime:
+
+    app/models/weights/text_embedding/
+        config.json, tokenizer.json, ...  (save_pretrained)
+        model.safetensors
+        manifest.json                     (source, sha256 weights)
+
+    python -m app.models.text_embedding download [--repo-id ...] [--revision ...]
+    python -m app.models.text_embedding info
+    python -m app.models.text_embedding embed "serum untuk pori besar"
+
+Embedding = mean pooling hidden state terakhir (mask padding), L2-normalized.
+Embedding query disimpan di LRU (QUERY_EMBEDDING_CACHE_SIZE) supaya query
+populer tidak memanggil model lagi.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .snapshot import _sha256_file
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+TEXT_EMBEDDING_MODEL_DIR = Path(os.getenv(
+    "TEXT_EMBEDDING_MODEL_DIR", str(Path(__file__).parent / "weights" / "text_embedding")
+))
+TEXT_EMBEDDING_REPO_ID = os.getenv(
+    "TEXT_EMBEDDING_REPO_ID", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+)
+TEXT_EMBEDDING_MAX_LENGTH = int(os.getenv("TEXT_EMBEDDING_MAX_LENGTH", "128"))
+TEXT_EMBEDDING_BATCH_SIZE = int(os.getenv("TEXT_EMBEDDING_BATCH_SIZE", "32"))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+
+MANIFEST_FILE = "manifest.json"
+WEIGHTS_FILE = "model.safetensors"
+
+
+class TextEmbeddingModel:
+    """Encoder kalimat lokal + LRU embedding query (thread-safe)"""
+
+    def __init__(self, model_dir: Path = TEXT_EMBEDDING_MODEL_DIR, max_length: int = TEXT_EMBEDDING_MAX_LENGTH,
+                 batch_size: int = TEXT_EMBEDDING_BATCH_SIZE, cache_size: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.model_dir = Path(model_dir)
+        self.max_length = max_length
+        self.batch_size = max(1, batch_size)
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._tokenizer = None
+        self._model = None
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def available(self) -> bool:
+        return (self.model_dir / MANIFEST_FILE).exists() and (self.model_dir / "config.json").exists()
+
+    @property
+    def manifest(self) -> Dict[str, Any]:
+        if self._manifest is None:
+            if not self.available:
+                raise RuntimeError(
+                    f"Text embedding model not found in {self.model_dir} "
+                    f"(run: python -m app.models.text_embedding download)"
+                )
+            self._manifest = json.loads((self.model_dir / MANIFEST_FILE).read_text())
+        return self._manifest
+
+    @property
+    def model_id(self) -> str:
+        """Identitas model + weights; key namespace cache vector di disk"""
+        manifest = self.manifest
+        return f"{manifest['source']}@{manifest['weights_sha256'][:12]}"
+
+    @property
+    def dim(self) -> int:
+        return int(self.manifest["dim"])
+
+    def _ensure_loaded(self):
+        if self._model is not None:
+            return
+        with self._lock:
+            if self._model is not None:
+                return
+            model_id = self.model_id  # RuntimeError kalau model belum di-download
+            from transformers import AutoModel, AutoTokenizer
+
+            started = time.perf_counter()
+            self._tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir), local_files_only=True)
+            self._model = AutoModel.from_pretrained(str(self.model_dir), local_files_only=True).eval()
+            logger.info(" Text embedding model loaded: %s (dim=%d) in %.0f ms",
+                        model_id, self.dim, (time.perf_counter() - started) * 1000)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        import torch
+
+        inputs = self._tokenizer(texts, padding=True, truncation=True, max_length=self.max_length,
+                                 return_tensors="pt")
+        with torch.inference_mode():
+            hidden = self._model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+        return pooled.float().numpy()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """(N, D) float32 L2-normalized; diurutkan per panjang supaya padding per batch minimal"""
+        self._ensure_loaded()
+        result = np.zeros((len(texts), self.dim), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        with self._lock:  # tokenizer fast tidak aman dipakai bersamaan dari banyak thread
+            for start in range(0, len(order), self.batch_size):
+                rows = order[start:start + self.batch_size]
+                result[rows] = self._encode_batch([texts[i] or "" for i in rows])
+        return result
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embedding satu query lewat LRU (hasil read-only, jangan diubah)"""
+        key = " ".join((text or "").split())
+        with self._cache_lock:
+            cached = self._query_cache.get(key)
+            if cached is not None:
+                self._query_cache.move_to_end(key)
+                self.cache_hits += 1
+                return cached
+            self.cache_misses += 1
+        embedding = self.embed([key])[0]
+        embedding.setflags(write=False)
+        if self.cache_size > 0:
+            with self._cache_lock:
+                self._query_cache[key] = embedding
+                self._query_cache.move_to_end(key)
+                while len(self._query_cache) > self.cache_size:
+                    self._query_cache.popitem(last=False)
+        return embedding
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._query_cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "loaded": self._model is not None,
+            "model_id": self.model_id if self.available else None,
+            "query_cache_size": len(self._query_cache),
+            "query_cache_hits": self.cache_hits,
+            "query_cache_misses": self.cache_misses,
+        }
+
+
+def download_model(repo_id: str = TEXT_EMBEDDING_REPO_ID, revision: Optional[str] = None,
+                   model_dir: Path = TEXT_EMBEDDING_MODEL_DIR) -> Path:
+    """Download encoder + tokenizer dari Hub lalu simpan ke model_dir (atomic replace)"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    logger.info(" Downloading %s (%s) for text embedding...", repo_id, revision or "default revision")
+    tokenizer = AutoTokenizer.from_pretrained(repo_id, revision=revision)
+    model = AutoModel.from_pretrained(repo_id, revision=revision).eval()
+
+    model_dir = Path(model_dir)
+    model_dir.parent.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(prefix=".text-embedding-", dir=model_dir.parent))
+    try:
+        tokenizer.save_pretrained(str(work_dir))
+        model.save_pretrained(str(work_dir), safe_serialization=True)
+        write_manifest(work_dir, source=repo_id, revision=revision or getattr(model.config, "_commit_hash", None),
+                       dim=model.config.hidden_size, architecture=type(model).__name__,
+                       torch_version=torch.__version__)
+        if model_dir.exists():
+            shutil.rmtree(model_dir)
+        os.replace(work_dir, model_dir)
+    finally:
+        if work_dir.exists():
+            shutil.rmtree(work_dir)
+    logger.info(" Text embedding model written: %s", model_dir)
+    return model_dir
+
+
+def write_manifest(model_dir: Path, source: str, dim: int, **extra) -> Dict[str, Any]:
+    manifest = {
+        "source": source,
+        "dim": dim,
+        "weights_sha256": _sha256_file(Path(model_dir) / WEIGHTS_FILE),
+        "weights_bytes": (Path(model_dir) / WEIGHTS_FILE).stat().st_size,
+        "created_at": time.time(),
+        **extra,
+    }
+    (Path(model_dir) / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+# Global instance
+text_embedding_model = TextEmbeddingModel()
+
+
+def main(argv: List[str] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Model sentence-embedding lokal untuk pencarian produk")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    download = subparsers.add_parser("download", help="Download model ke folder lokal (sekali, butuh network)")
+    download.add_argument("--repo-id", default=TEXT_EMBEDDING_REPO_ID)
+    download.add_argument("--revision", default=None)
+    subparsers.add_parser("info", help="Tampilkan manifest model lokal")
+    embed = subparsers.add_parser("embed", help="Embedding teks (cek model bisa dimuat offline)")
+    embed.add_argument("text", nargs="+")
+    args = parser.parse_args(argv)
+
+    from app.logging_config import setup_logging
+    setup_logging()
+
+    if args.command == "download":
+        path = download_model(args.repo_id, args.revision)
+        print(json.dumps(json.loads((path / MANIFEST_FILE).read_text()), indent=2))
+    elif args.command == "info":
+        if not text_embedding_model.available:
+            print(f"No text embedding model in {TEXT_EMBEDDING_MODEL_DIR}", file=sys.stderr)
+            return 1
+        print(json.dumps(text_embedding_model.manifest, indent=2))
+    else:
+        vectors = text_embedding_model.embed(args.text)
+        for text, vector in zip(args.text, vectors):
+            print(f"{text!r}: dim={len(vector)} head={np.round(vector[:4], 4).tolist()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,8 @@
 # app/routes/admin.py
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from pydantic import BaseModel
+from typing import List, Dict, Any, Optional
+import anyio
 import logging
 from datetime import datetime
 
@@ -196,3 +198,151 @@ async def debug_query(
     except Exception as e:
         logger.error(f"Debug query error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/model/precision")
+async def set_model_precision(
+    mode: str,  # "fp32", "int8" atau "bf16"
+    min_agreement: Optional[float] = None,
+    admin: dict = Depends(verify_admin)
+):
+    """Ganti precision mode model (admin only) - ditolak kalau gagal accuracy gate"""
+    from app.models.ai_model import PrecisionGateError, PRECISION_MIN_AGREEMENT
+    from app.services.model_registry import model_registry
+    
+    model = model_registry.active_model()
+    try:
+        report = await anyio.to_thread.run_sync(
+            lambda: model.set_precision(
+                mode.lower(),
+                min_agreement=PRECISION_MIN_AGREEMENT if min_agreement is None else min_agreement
+            )
+        )
+        return {"success": True, "precision": model.precision, "report": report}
+    except PrecisionGateError as e:
+        logger.warning(f"Precision switch rejected: {e}")
+        raise HTTPException(status_code=409, detail={"message": str(e), "report": e.report})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Precision switch error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class RegisterModelRequest(BaseModel):
+    id: str
+    source: str  # snapshot, hf_hub, h5, keras, saved_model
+    snapshot: Optional[str] = None
+    weights_dir: Optional[str] = None
+    backend: Optional[str] = None
+    precision: str = "fp32"
+    activate: bool = False
+
+
+@router.get("/models")
+async def list_models(admin: dict = Depends(verify_admin)):
+    """Semua versi model di registry (admin only)"""
+    from app.services.model_registry import model_registry
+    return {"success": True, **model_registry.stats()}
+
+
+@router.post("/models")
+async def register_model(request: RegisterModelRequest, admin: dict = Depends(verify_admin)):
+    """
+    Daftarkan versi model baru lalu load + warm-up di background (admin only).
+    Dengan activate=true traffic dialihkan otomatis setelah warm-up selesai.
+    """
+    from app.services.model_registry import model_registry
+    from app.services.warmup import warmup_batch_sizes
+    
+    spec = request.dict(exclude={"id", "activate"}, exclude_none=True)
+    try:
+        model_registry.register(request.id, spec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    model_registry.load_async(request.id, activate=request.activate, batch_sizes=warmup_batch_sizes())
+    return {"success": True, "id": request.id, "status": "loading", "activate": request.activate}
+
+
+@router.post("/models/{version_id}/load")
+async def load_model(version_id: str, activate: bool = False, admin: dict = Depends(verify_admin)):
+    """Load ulang + warm-up versi yang sudah terdaftar di background (admin only)"""
+    from app.services.model_registry import model_registry
+    from app.services.warmup import warmup_batch_sizes
+    
+    try:
+        model_registry.load_async(version_id, activate=activate, batch_sizes=warmup_batch_sizes())
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    return {"success": True, "id": version_id, "status": "loading", "activate": activate}
+
+
+@router.post("/models/{version_id}/activate")
+async def activate_model(version_id: str, admin: dict = Depends(verify_admin)):
+    """Alihkan traffic ke versi model yang sudah di-load (admin only)"""
+    from app.services.model_registry import model_registry
+    
+    try:
+        model_registry.activate(version_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, "active": version_id}
+
+
+@router.post("/models/{version_id}/unload")
+async def unload_model(version_id: str, admin: dict = Depends(verify_admin)):
+    """Lepas weights versi non-aktif dari memory (admin only)"""
+    from app.services.model_registry import model_registry
+    
+    try:
+        await anyio.to_thread.run_sync(model_registry.unload, version_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, "unloaded": version_id}
+
+
+@router.get("/embeddings")
+async def embedding_index_stats(admin: dict = Depends(verify_admin)):
+    """Jumlah kasus referensi per label + status index IVF (admin only)"""
+    from app.database.embedding_index import embedding_index
+    return {"success": True, **await anyio.to_thread.run_sync(embedding_index.stats)}
+
+
+@router.post("/embeddings")
+async def add_reference_case(
+    file: UploadFile = File(...),
+    label: str = Form(...),
+    case_id: Optional[str] = Form(None),
+    admin: dict = Depends(verify_admin)
+):
+    """Tambah satu gambar kasus referensi berlabel ke index embedding (admin only)"""
+    from app.services.model_registry import model_registry
+    from app.services.similar_cases import add_reference_cases
+    
+    contents = await file.read()
+    record = {"label": label, "case_id": case_id, "source": file.filename}
+    try:
+        async with model_registry.acquire_async() as model:
+            report = await anyio.to_thread.run_sync(lambda: add_reference_cases(model, [(contents, record)]))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if report["failed"]:
+        raise HTTPException(status_code=400, detail=report["failed"][0]["error"])
+    return {"success": True, "case_id": report["added"][0], "count": report["count"]}
+
+
+@router.post("/embeddings/ivf")
+async def train_embedding_ivf(nlist: Optional[int] = None, admin: dict = Depends(verify_admin)):
+    """Train ulang index approximate (IVF) dari semua embedding (admin only)"""
+    from app.database.embedding_index import embedding_index
+    
+    try:
+        report = await anyio.to_thread.run_sync(lambda: embedding_index.train_ivf(nlist=nlist))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, "ivf": report}
@@ -13,6 +13,7 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # JWT Configuration
 SECRET_KEY = "your-secret-key-change-this-in-production-2024"  # TODO: Move to env
@@ -77,6 +78,15 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
             detail="Could not validate credentials"
         )
 
+def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> Optional[dict]:
+    """User dari JWT kalau ada dan valid, None untuk request anonymous"""
+    if credentials is None:
+        return None
+    try:
+        return verify_token(credentials)
+    except HTTPException:
+        return None
+
 @router.post("/register", response_model=AuthResponse)
 async def register(request: RegisterRequest):
     """Register new user"""
@@ -90,8 +90,7 @@ async def chat_with_ai(chat_request: ChatRequest):
     Chat endpoint untuk konsultasi AI tentang kondisi kulit dengan rekomendasi produk
     """
     try:
-        logger.info(f"Chat request: {chat_request.message}")
-        logger.info(f"Disease info: {chat_request.disease_info}")
+        logger.debug("Chat request: %r (disease info: %s)", chat_request.message, chat_request.disease_info)
         
         # Validasi input
         if not chat_request.message or len(chat_request.message.strip()) == 0:
@@ -106,8 +105,12 @@ async def chat_with_ai(chat_request: ChatRequest):
         response_text = result.get('response', 'Maaf, terjadi kesalahan.')
         products = result.get('products', [])
         
-        logger.info(f"Response generated: {response_text[:100]}...")
-        logger.info(f"Products recommended: {len(products)} items")
+        logger.debug("Response generated: %.100s...", response_text)
+        logger.info("Chat response", extra={
+            "message_chars": len(chat_request.message),
+            "response_chars": len(response_text),
+            "products": len(products),
+        })
         
         return ChatResponse(
             success=True,
@@ -1,16 +1,65 @@
 # app/routes/predict.py
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.prediction import predict_disease
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from app.services.model_registry import model_registry
+from app.services.prediction import predict_disease, predict_disease_batch, predict_with_embedding, uses_pool
+from app.services.batching import batcher, QueueFullError
+from app.services.prediction_cache import prediction_cache
+from app.services.inference_pool import inference_pool, PoolUnavailable
+from app.services.admission import admission, AdmissionRejected, PRIORITY_AUTHENTICATED, PRIORITY_ANONYMOUS
+from app.services.upload import read_upload, inspect_image, upload_stats, UploadRejected, UPLOAD_MAX_BYTES, BATCH_MAX_BYTES
+from app.services.jobs import job_workers, JobQueueFull
+from app.services.tiling import TILED_DEFAULT
+from app.services.similar_cases import SIMILAR_CASES_K
+from app.routes.auth import get_optional_user
+from app.logging_config import logging_stats
+import io
+import os
+import anyio
+import json
+import zipfile
 import logging
 import traceback
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Batas jumlah gambar per request /predict/batch (total byte: PREDICT_BATCH_MAX_BYTES, app/services/upload.py)
+BATCH_MAX_FILES = int(os.getenv("PREDICT_BATCH_MAX_FILES", "500"))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+def _is_zip(file: UploadFile) -> bool:
+    return (file.content_type or "") in ("application/zip", "application/x-zip-compressed") \
+        or (file.filename or "").lower().endswith(".zip")
+
+def _extract_zip_images(data: bytes, max_bytes: int) -> List[tuple]:
+    """
+    Ambil semua file gambar dari zip archive -> list (filename, bytes).
+    Ukuran dicek dari header zip sebelum extract (zipfile tidak membaca lebih
+    dari file_size): per gambar UPLOAD_MAX_BYTES, total max_bytes.
+    """
+    images = []
+    total = 0
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if info.file_size > UPLOAD_MAX_BYTES:
+                raise UploadRejected(f"Image too large in zip: {name} ({info.file_size} > {UPLOAD_MAX_BYTES} bytes)", 413)
+            total += info.file_size
+            if total > max_bytes:
+                raise UploadRejected(f"Batch upload too large (> {max_bytes} bytes after unzip)", 413)
+            images.append((name, archive.read(info)))
+    return images
+
 @router.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(file: UploadFile = File(...), tiled: Optional[bool] = None,
+                  current_user: Optional[dict] = Depends(get_optional_user)):
     """
     Predict skin disease from uploaded image
+    ?tiled=true: tiled inference untuk foto resolusi tinggi (default PREDICT_TILED)
     Available at:
     - POST /predict (legacy)
     - POST /api/v1/predict (versioned)
@@ -20,16 +69,38 @@ async def predict(file: UploadFile = File(...)):
         raise HTTPException(400, "File must be an image")
     
     try:
-        # Read file contents
-        contents = await file.read()
-        
-        if len(contents) == 0:
-            raise HTTPException(400, "Uploaded file is empty")
+        # Read file contents per chunk (dengan batas ukuran + sha256 incremental),
+        # lalu cek dimensi dari header sebelum decode
+        try:
+            contents, image_hash = await read_upload(file)
+            image_info = inspect_image(contents, model_registry.active_model()._input_size())
+        except UploadRejected as e:
+            upload_stats.record_rejected()
+            raise HTTPException(e.status_code, str(e))
+        upload_stats.record(image_info, len(contents))
         
-        logger.info(f" Processing image: {file.filename} ({len(contents)} bytes)")
+        logger.info(" Processing image", extra={
+            "upload_filename": file.filename,
+            "bytes": len(contents),
+            "size": f"{image_info['width']}x{image_info['height']}",
+            "decode": f"{image_info['decode_width']}x{image_info['decode_height']}",
+            "peak_mb_estimate": round(image_info['peak_bytes_estimate'] / (1024 ** 2), 1),
+        })
         
-        # Run prediction
-        result = await predict_disease(contents)
+        # Run prediction (admission control: user login masuk lane prioritas)
+        priority = PRIORITY_AUTHENTICATED if current_user else PRIORITY_ANONYMOUS
+        try:
+            async with admission.slot(priority):
+                result = await predict_disease(contents, image_hash, TILED_DEFAULT if tiled is None else tiled)
+        except AdmissionRejected as e:
+            logger.warning(f"  Prediction rejected by admission control: {e.reason}")
+            raise HTTPException(503, f"Server busy: {e.reason}", headers={"Retry-After": str(e.retry_after)})
+        except QueueFullError as e:
+            logger.warning(f"  Prediction rejected by micro-batcher: {e}")
+            raise HTTPException(503, f"Server busy: {e}", headers={"Retry-After": str(e.retry_after)})
+        except PoolUnavailable as e:
+            logger.warning(f"  Prediction rejected: {e}")
+            raise HTTPException(503, str(e), headers={"Retry-After": "10"})
         
         # Check if prediction has error
         if result.get("success") is False:
@@ -37,7 +108,8 @@ async def predict(file: UploadFile = File(...)):
             logger.error(f"Prediction failed: {error_msg}")
             raise HTTPException(500, f"Prediction failed: {error_msg}")
         
-        logger.info(f" Prediction successful: {result['predictions']['best']['label']} ({result['predictions']['best']['score']:.2%})")
+        best = result['predictions']['best']
+        logger.info(" Prediction successful", extra={"label": best['label'], "score": round(best['score'], 4)})
         return result
         
     except HTTPException:
@@ -60,6 +132,191 @@ async def predict(file: UploadFile = File(...)):
             "message": "Internal server error during prediction"
         }
 
+async def _predict_with_embedding(file: UploadFile, current_user: Optional[dict], k: int = 0, mode: str = None):
+    """Upload + admission control seperti /predict, lalu prediksi + embedding satu forward pass"""
+    if not (file.content_type or "").startswith('image/'):
+        raise HTTPException(400, "File must be an image")
+    try:
+        contents, image_hash = await read_upload(file)
+        inspect_image(contents, model_registry.active_model()._input_size())
+    except UploadRejected as e:
+        upload_stats.record_rejected()
+        raise HTTPException(e.status_code, str(e))
+    
+    priority = PRIORITY_AUTHENTICATED if current_user else PRIORITY_ANONYMOUS
+    try:
+        async with admission.slot(priority):
+            return await predict_with_embedding(contents, image_hash, k, mode)
+    except AdmissionRejected as e:
+        raise HTTPException(503, f"Server busy: {e.reason}", headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        logger.error(f"Embedding prediction failed: {e}")
+        raise HTTPException(500, f"Prediction failed: {e}")
+
+@router.post("/predict/embedding")
+async def predict_embedding(file: UploadFile = File(...), current_user: Optional[dict] = Depends(get_optional_user)):
+    """
+    Prediksi + embedding gambar (L2-normalized) dari forward pass yang sama
+    Available at:
+    - POST /predict/embedding (legacy)
+    - POST /api/v1/predict/embedding (versioned)
+    """
+    return await _predict_with_embedding(file, current_user)
+
+@router.post("/predict/similar")
+async def predict_similar(file: UploadFile = File(...), k: int = SIMILAR_CASES_K, mode: Optional[str] = None,
+                          current_user: Optional[dict] = Depends(get_optional_user)):
+    """
+    Prediksi + k kasus referensi paling mirip (cosine similarity embedding).
+    mode: exact, ivf (approximate) atau auto (default EMBEDDING_INDEX_MODE)
+    """
+    result = await _predict_with_embedding(file, current_user, max(1, k), mode)
+    result.pop("embedding", None)
+    return result
+
+@router.post("/predict/batch")
+async def predict_batch(files: List[UploadFile] = File(...), current_user: Optional[dict] = Depends(get_optional_user)):
+    """
+    Predict banyak gambar dalam satu request (multipart berisi banyak file
+    atau satu zip archive). Hasil di-stream sebagai NDJSON - satu baris per
+    gambar, dikirim segera setelah chunk-nya selesai diproses.
+    Available at:
+    - POST /predict/batch (legacy)
+    - POST /api/v1/predict/batch (versioned)
+    """
+    images = []
+    total_bytes = 0
+    try:
+        for file in files:
+            # Dibaca per chunk seperti /predict: gambar dibatasi UPLOAD_MAX_BYTES,
+            # zip dan total request dibatasi sisa BATCH_MAX_BYTES
+            is_zip = _is_zip(file)
+            if not is_zip and not (file.content_type or "").startswith("image/"):
+                raise HTTPException(400, f"File must be an image or zip archive: {file.filename}")
+            remaining = BATCH_MAX_BYTES - total_bytes
+            try:
+                contents, _ = await read_upload(file, remaining if is_zip else min(UPLOAD_MAX_BYTES, remaining))
+            except UploadRejected as e:
+                if e.status_code == 400:  # file kosong: dilewati seperti sebelumnya
+                    continue
+                raise UploadRejected(f"{file.filename}: {e}", e.status_code)
+            total_bytes += len(contents)
+            if is_zip:
+                extracted = _extract_zip_images(contents, BATCH_MAX_BYTES - total_bytes)
+                total_bytes += sum(len(data) for _, data in extracted)
+                images.extend(extracted)
+            else:
+                images.append((file.filename, contents))
+    except zipfile.BadZipFile:
+        raise HTTPException(400, "Invalid zip archive")
+    except UploadRejected as e:
+        upload_stats.record_rejected()
+        raise HTTPException(e.status_code, str(e))
+
+    images = [(name, data) for name, data in images if len(data) > 0]
+    if not images:
+        raise HTTPException(400, "No images found in upload")
+    if len(images) > BATCH_MAX_FILES:
+        raise HTTPException(413, f"Too many images ({len(images)} > {BATCH_MAX_FILES})")
+
+    # Pastikan model siap sebelum response streaming dimulai (mode process: worker yang me-load)
+    try:
+        model = model_registry.active_model()
+        if not uses_pool(model):
+            await anyio.to_thread.run_sync(model._ensure_loaded)
+    except Exception as e:
+        logger.error(f"Model loading failed: {e}")
+        raise HTTPException(500, f"Prediction failed: {e}")
+
+    logger.info(f" Processing batch: {len(images)} images ({total_bytes} bytes)")
+
+    # Chunk pertama diproses sebelum response dimulai, supaya penolakan
+    # admission control masih bisa dibalas 503 + Retry-After
+    priority = PRIORITY_AUTHENTICATED if current_user else PRIORITY_ANONYMOUS
+    items = predict_disease_batch(images, priority=priority)
+    try:
+        first = await items.__anext__()
+    except AdmissionRejected as e:
+        logger.warning(f"  Batch rejected by admission control: {e.reason}")
+        raise HTTPException(503, f"Server busy: {e.reason}", headers={"Retry-After": str(e.retry_after)})
+    except PoolUnavailable as e:
+        logger.warning(f"  Batch rejected: {e}")
+        raise HTTPException(503, str(e), headers={"Retry-After": "10"})
+
+    async def _stream():
+        yield json.dumps(first) + "\n"
+        async for item in items:
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+@router.post("/predict/jobs", status_code=202)
+async def create_prediction_job(file: UploadFile = File(...), current_user: Optional[dict] = Depends(get_optional_user)):
+    """
+    Simpan gambar ke antrian job persisten dan langsung kembalikan job id.
+    Hasil diambil lewat GET /predict/jobs/{id} atau SSE /predict/jobs/{id}/events.
+    """
+    if not (file.content_type or "").startswith('image/'):
+        raise HTTPException(400, "File must be an image")
+    
+    try:
+        contents, image_hash = await read_upload(file)
+        inspect_image(contents, model_registry.active_model()._input_size())
+    except UploadRejected as e:
+        upload_stats.record_rejected()
+        raise HTTPException(e.status_code, str(e))
+    
+    try:
+        job = await job_workers.submit(
+            contents, image_hash, file.filename, current_user["id"] if current_user else None
+        )
+    except JobQueueFull as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "30"})
+    
+    logger.info(f" Queued prediction job {job['id']} ({file.filename}, {len(contents)} bytes)")
+    return {
+        "success": True,
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/api/v1/predict/jobs/{job['id']}",
+        "events_url": f"/api/v1/predict/jobs/{job['id']}/events",
+    }
+
+@router.get("/predict/jobs/{job_id}")
+async def get_prediction_job(job_id: str):
+    """Status + hasil job prediksi (result berisi response /predict kalau status done)"""
+    job = await job_workers.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return {"success": True, "job": job}
+
+@router.get("/predict/jobs/{job_id}/events")
+async def prediction_job_events(job_id: str):
+    """Server-Sent Events: event status setiap status berubah, lalu event result"""
+    if await job_workers.get(job_id) is None:
+        raise HTTPException(404, "Job not found")
+    return StreamingResponse(
+        job_workers.events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/predict/stats")
+async def predict_stats():
+    """Statistik inference (upload, admission control, micro-batching, prediction cache, process pool, job queue, logging)"""
+    return {
+        "success": True,
+        "upload": upload_stats.stats(),
+        "admission": admission.stats(),
+        "batching": batcher.stats(),
+        "cache": prediction_cache.stats(),
+        "inference_pool": inference_pool.stats(),
+        "jobs": await anyio.to_thread.run_sync(job_workers.stats),
+        "logging": logging_stats()
+    }
+
 # Test endpoints untuk kedua path
 @router.get("/test")
 async def test_endpoint_v1():
@@ -0,0 +1,219 @@
+# app/services/admission.py
+"""
+Admission control untuk /predict.
+
+Maksimal PREDICT_MAX_CONCURRENCY prediksi berjalan bersamaan; sisanya
+menunggu di antrian berukuran PREDICT_ADMISSION_QUEUE_SIZE. Request yang
+tidak kebagian tempat di antrian, atau menunggu lebih lama dari
+PREDICT_QUEUE_TIMEOUT_MS, langsung ditolak (503 + Retry-After) alih-alih
+ikut memperpanjang latency semua orang.
+
+Antrian punya dua lane: user yang login (PRIORITY_AUTHENTICATED) selalu
+dilayani sebelum anonymous, dan kalau antrian penuh request authenticated
+menggeser anonymous yang paling baru masuk.
+
+Thread torch intra-op/inter-op diatur dari konfigurasi yang sama supaya
+jumlah thread preprocessing + forward pass tidak melebihi jumlah CPU.
+"""
+import os
+import math
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+from app.services.batching import BATCHING_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+CPU_COUNT = os.cpu_count() or 1
+MAX_CONCURRENCY = int(os.getenv("PREDICT_MAX_CONCURRENCY", str(CPU_COUNT)))
+ADMISSION_QUEUE_SIZE = int(os.getenv("PREDICT_ADMISSION_QUEUE_SIZE", "32"))
+QUEUE_TIMEOUT_MS = float(os.getenv("PREDICT_QUEUE_TIMEOUT_MS", "2000"))
+RETRY_AFTER_MAX_SECONDS = int(os.getenv("PREDICT_RETRY_AFTER_MAX_SECONDS", "30"))
+
+# 0 = otomatis: dengan micro-batching hanya ada satu forward pass pada satu waktu,
+# tanpa batching setiap slot concurrency bisa menjalankan forward pass sendiri
+TORCH_INTRA_OP_THREADS = int(os.getenv("TORCH_INTRA_OP_THREADS", "0"))
+TORCH_INTER_OP_THREADS = int(os.getenv("TORCH_INTER_OP_THREADS", "1"))
+
+PRIORITY_AUTHENTICATED = 0
+PRIORITY_ANONYMOUS = 1
+_LANE_NAMES = {PRIORITY_AUTHENTICATED: "authenticated", PRIORITY_ANONYMOUS: "anonymous"}
+
+
+def torch_thread_counts(max_concurrency: int = MAX_CONCURRENCY) -> Dict[str, int]:
+    """Jumlah thread torch yang dipakai untuk konfigurasi concurrency ini"""
+    concurrent_forwards = 1 if BATCHING_ENABLED else max(1, max_concurrency)
+    intra_op = TORCH_INTRA_OP_THREADS or max(1, CPU_COUNT // concurrent_forwards)
+    return {"intra_op": intra_op, "inter_op": max(1, TORCH_INTER_OP_THREADS)}
+
+
+def configure_torch_threads(max_concurrency: int = MAX_CONCURRENCY):
+    """Set thread torch sekali saat startup (sebelum forward pass pertama)"""
+    counts = torch_thread_counts(max_concurrency)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(counts["intra_op"])
+    try:
+        # Hanya bisa di-set sebelum ada pekerjaan inter-op parallel pertama
+        torch.set_num_interop_threads(counts["inter_op"])
+    except RuntimeError as e:
+        logger.warning(f"  Could not set torch inter-op threads: {e}")
+    logger.info(f" Torch threads: intra-op={counts['intra_op']}, inter-op={counts['inter_op']}")
+
+
+class AdmissionRejected(Exception):
+    """Request ditolak oleh admission control (antrian penuh atau deadline lewat)"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Semaphore dengan antrian berprioritas, batas panjang antrian dan deadline tunggu"""
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_queue: int = ADMISSION_QUEUE_SIZE,
+                 queue_timeout_ms: float = QUEUE_TIMEOUT_MS):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout_ms / 1000.0
+
+        self._active = 0
+        self._waiters = []  # heap: (priority, seq, future)
+        self._seq = itertools.count()
+
+        # Statistik
+        self._admitted = {name: 0 for name in _LANE_NAMES.values()}
+        self._rejected_full = 0
+        self._rejected_timeout = 0
+        self._preempted = 0
+        self._max_queue_depth = 0
+        self._wait_times = deque(maxlen=1000)
+        self._service_time_ewma = None
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _retry_after(self) -> int:
+        """Perkiraan kapan antrian cukup kosong: (antrian / concurrency) x waktu layanan"""
+        service_time = self._service_time_ewma or 1.0
+        estimate = service_time * (self.queue_depth + 1) / self.max_concurrency
+        return int(min(RETRY_AFTER_MAX_SECONDS, max(1, math.ceil(estimate))))
+
+    def _evict_lower_priority(self, priority: int) -> bool:
+        """Antrian penuh: tolak waiter terbaru dengan prioritas lebih rendah"""
+        candidates = [entry for entry in self._waiters if entry[0] > priority and not entry[2].done()]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda entry: (entry[0], entry[1]))
+        victim[2].set_exception(AdmissionRejected("preempted by higher-priority request", self._retry_after()))
+        self._preempted += 1
+        return True
+
+    async def acquire(self, priority: int = PRIORITY_ANONYMOUS):
+        started = time.perf_counter()
+        if self._active < self.max_concurrency and self.queue_depth == 0:
+            self._active += 1
+            self._record_admit(priority, started)
+            return
+
+        if self.queue_depth >= self.max_queue and not self._evict_lower_priority(priority):
+            self._rejected_full += 1
+            raise AdmissionRejected("inference queue is full", self._retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._max_queue_depth = max(self._max_queue_depth, self.queue_depth)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.exception():
+                # Slot diberikan tepat saat deadline lewat - kembalikan
+                self.release(record=False)
+            else:
+                future.cancel()
+            self._rejected_timeout += 1
+            raise AdmissionRejected("timed out waiting for an inference slot", self._retry_after())
+        except asyncio.CancelledError:
+            # Client disconnect: jangan sampai slot yang sudah diberikan hilang
+            if future.done() and not future.cancelled() and not future.exception():
+                self.release(record=False)
+            else:
+                future.cancel()
+            raise
+        self._record_admit(priority, started)
+
+    def release(self, service_time: float = None, record: bool = True):
+        if record and service_time is not None:
+            alpha = 0.2
+            self._service_time_ewma = service_time if self._service_time_ewma is None \
+                else alpha * service_time + (1 - alpha) * self._service_time_ewma
+
+        # Serahkan slot langsung ke waiter berikutnya (active tetap sama)
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(True)
+                return
+        self._active -= 1
+
+    def _record_admit(self, priority: int, started: float):
+        self._admitted[_LANE_NAMES.get(priority, "anonymous")] += 1
+        self._wait_times.append(time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_ANONYMOUS):
+        """async with admission.slot(priority): ... - satu prediksi in-flight"""
+        await self.acquire(priority)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        """Kedalaman antrian, waktu tunggu, dan jumlah penolakan untuk monitoring"""
+        waits = sorted(self._wait_times)
+        queued = {name: 0 for name in _LANE_NAMES.values()}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                queued[_LANE_NAMES.get(priority, "anonymous")] += 1
+        return {
+            "config": {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "queue_timeout_ms": self.queue_timeout * 1000,
+                "torch_threads": torch_thread_counts(self.max_concurrency),
+            },
+            "active": self._active,
+            "queue_depth": sum(queued.values()),
+            "queued_by_lane": queued,
+            "max_queue_depth": self._max_queue_depth,
+            "admitted": dict(self._admitted),
+            "rejected": {
+                "queue_full": self._rejected_full,
+                "timeout": self._rejected_timeout,
+                "preempted": self._preempted,
+            },
+            "wait_ms": {
+                "avg": round(1000 * sum(waits) / len(waits), 3) if waits else 0.0,
+                "p95": round(1000 * waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+                "max": round(1000 * waits[-1], 3) if waits else 0.0,
+            },
+            "service_time_ms_ewma": round(1000 * self._service_time_ewma, 3) if self._service_time_ewma else None,
+        }
+
+
+# Global instance
+admission = AdmissionController()
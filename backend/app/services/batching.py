@@ -0,0 +1,206 @@
+# app/services/batching.py
+"""
+Dynamic micro-batching scheduler untuk SkinDiseaseModel.
+
+Request /predict yang datang bersamaan dikumpulkan sampai MAX_BATCH_SIZE
+atau sampai MAX_WAIT_MS habis, lalu dijalankan dengan SATU forward pass.
+Setiap caller tetap menerima hasil top-k miliknya sendiri.
+"""
+import os
+import math
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.models.ai_model import skin_model, SkinDiseaseModel
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+BATCHING_ENABLED = os.getenv("PREDICT_BATCHING", "1") == "1"
+MAX_BATCH_SIZE = int(os.getenv("PREDICT_MAX_BATCH_SIZE", "8"))
+MAX_WAIT_MS = float(os.getenv("PREDICT_MAX_WAIT_MS", "10"))
+MAX_QUEUE_SIZE = int(os.getenv("PREDICT_MAX_QUEUE_SIZE", "64"))
+
+
+class QueueFullError(RuntimeError):
+    """Antrian batching penuh - request ditolak (route membalas 503 + Retry-After)"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _PendingRequest:
+    __slots__ = ("image", "model", "future", "enqueued_at")
+
+    def __init__(self, image: np.ndarray, model: SkinDiseaseModel):
+        self.image = image
+        self.model = model
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """Kumpulkan request concurrent lalu jalankan satu batched forward pass"""
+
+    def __init__(self, model: SkinDiseaseModel, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS, max_queue_size: int = MAX_QUEUE_SIZE,
+                 enabled: bool = BATCHING_ENABLED):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.max_queue_size = max(1, max_queue_size)
+        self.enabled = enabled
+
+        self._queue: "queue.Queue[_PendingRequest]" = queue.Queue(maxsize=self.max_queue_size)
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        # Statistik
+        self._batches = 0
+        self._requests = 0
+        self._rejected = 0
+        self._max_queue_depth = 0
+        self._total_queue_wait = 0.0
+        self._total_forward_time = 0.0
+        self._batch_size_histogram: Dict[int, int] = {}
+
+    def _ensure_worker(self):
+        """Start worker thread (lazy, sekali saja)"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="predict-batcher", daemon=True
+                )
+                self._worker.start()
+                logger.info(
+                    f" Micro-batcher started (max_batch={self.max_batch_size}, "
+                    f"max_wait={self.max_wait_ms}ms, max_queue={self.max_queue_size})"
+                )
+
+    def submit(self, image: np.ndarray, model: SkinDiseaseModel = None) -> Future:
+        """
+        Masukkan satu gambar hasil preprocess (1, H, W, 3) ke antrian.
+        model: versi model yang dipakai untuk preprocess (default self.model);
+        forward pass memakai versi yang sama walaupun versi aktif sudah diganti.
+        """
+        self._ensure_worker()
+        request = _PendingRequest(image, model or self.model)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise QueueFullError(f"Inference queue full ({self.max_queue_size} pending requests)",
+                                 self._retry_after())
+
+        with self._stats_lock:
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return request.future
+
+    def _retry_after(self) -> int:
+        """Perkiraan detik sampai antrian kosong: jumlah batch yang antri x rata-rata forward pass"""
+        with self._stats_lock:
+            forward_time = self._total_forward_time / self._batches if self._batches else 1.0
+        batches = math.ceil((self._queue.qsize() + 1) / self.max_batch_size)
+        return max(1, math.ceil(batches * forward_time))
+
+    def predict_bytes(self, image_bytes: bytes, model: SkinDiseaseModel = None) -> Dict[str, Any]:
+        """
+        Pengganti SkinDiseaseModel.predict_bytes yang lewat scheduler.
+        Preprocess jalan di thread caller, forward pass di worker batcher.
+        """
+        model = model or self.model
+        if not self.enabled:
+            return model.predict_bytes(image_bytes)
+
+        model._ensure_loaded()
+
+        try:
+            processed_image = model._preprocess(image_bytes)
+            return self.submit(processed_image, model).result()
+        except QueueFullError:
+            raise
+        except Exception as e:
+            logger.error(f"Batched prediction failed: {e}")
+            return model._error_result(e)
+
+    def _run(self):
+        """Worker loop: ambil request pertama, tunggu sisa batch sampai deadline"""
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Satu forward pass per versi model (batch bisa berisi request dari
+            # versi lama dan baru tepat saat model di-swap)
+            groups: Dict[int, list] = {}
+            for request in batch:
+                groups.setdefault(id(request.model), []).append(request)
+            for group in groups.values():
+                self._run_batch(group)
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        try:
+            images = np.concatenate([request.image for request in batch], axis=0)
+            results = batch[0].model.predict_batch(images)
+        except Exception as e:
+            logger.error(f"Batched forward pass failed: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
+
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._total_forward_time += finished - started
+            self._total_queue_wait += sum(started - request.enqueued_at for request in batch)
+            self._batch_size_histogram[len(batch)] = self._batch_size_histogram.get(len(batch), 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Konfigurasi dan statistik scheduler untuk monitoring"""
+        with self._stats_lock:
+            return {
+                "enabled": self.enabled,
+                "config": {
+                    "max_batch_size": self.max_batch_size,
+                    "max_wait_ms": self.max_wait_ms,
+                    "max_queue_size": self.max_queue_size,
+                },
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "batches": self._batches,
+                "requests": self._requests,
+                "rejected": self._rejected,
+                "avg_batch_size": round(self._requests / self._batches, 3) if self._batches else 0.0,
+                "avg_queue_wait_ms": round(1000 * self._total_queue_wait / self._requests, 3) if self._requests else 0.0,
+                "avg_forward_ms": round(1000 * self._total_forward_time / self._batches, 3) if self._batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_size_histogram.items())),
+            }
+
+
+# Global instance
+batcher = MicroBatcher(skin_model)
@@ -0,0 +1,502 @@
+# app/services/inference_pool.py
+"""
+Process-pool inference workers.
+
+Dengan INFERENCE_MODE=process, predict_disease mengirim pekerjaan ke N proses
+inference alih-alih thread pool anyio di proses API. Pre/post-processing dan
+logging tidak lagi rebutan GIL dengan event loop.
+
+- Weights dibagi antar worker, bukan di-copy per worker. Start method
+  default "spawn" mewajibkan snapshot safetensors lokal (python -m
+  app.models.snapshot create): setiap worker me-load snapshot itu dengan
+  mmap, jadi semua worker membaca page cache yang sama. Proses API tidak
+  me-load model untuk /predict sama sekali (versi model dilaporkan worker).
+  "fork" (weights di-load sekali di proses API, di-share copy-on-write)
+  tetap bisa dipilih, tapi hanya aman kalau tidak ada thread lain yang
+  memegang lock saat fork - start() memberi warning berisi thread yang
+  sedang jalan.
+- Pool di-start dari lifespan (lihat app/services/warmup.py), tidak pernah
+  dari request. Request yang datang sebelum pool siap, atau setelah worker
+  gagal start, ditolak dengan PoolUnavailable (route membalas 503).
+- Image bytes dikirim lewat ring buffer shared memory (slot berukuran tetap);
+  hanya (job_id, slot, length) yang lewat multiprocessing.Queue. Gambar yang
+  lebih besar dari slot dikirim inline lewat queue.
+- Setiap worker punya task queue sendiri, jadi job yang sedang dipegang
+  worker (dan slot ring-nya) diketahui. Worker yang mati (OOM-killed,
+  segfault) terdeteksi di setiap putaran dispatcher: future job-nya langsung
+  gagal, slotnya dikembalikan, lalu worker di-restart dengan queue baru.
+- Ukuran pool, thread torch per worker, dan CPU affinity bisa diatur.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.ai_model import skin_model
+from app.models.snapshot import current_snapshot
+from app.services.batching import MAX_BATCH_SIZE, MAX_WAIT_MS
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "thread").lower()  # "thread" atau "process"
+POOL_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+POOL_TORCH_THREADS = int(os.getenv("INFERENCE_TORCH_THREADS", "0"))  # 0 = cpu_count / workers
+POOL_CPU_AFFINITY = os.getenv("INFERENCE_CPU_AFFINITY", "0") == "1"
+POOL_START_METHOD = os.getenv("INFERENCE_POOL_START_METHOD", "spawn")  # spawn, forkserver, fork
+POOL_RING_SLOTS = int(os.getenv("INFERENCE_RING_SLOTS", "32"))
+POOL_SLOT_BYTES = int(os.getenv("INFERENCE_SLOT_BYTES", str(8 * 1024 * 1024)))
+POOL_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_TIMEOUT_SECONDS", "60"))
+POOL_READY_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_READY_TIMEOUT_SECONDS", "300"))
+POOL_LIVENESS_INTERVAL_SECONDS = 0.2
+
+
+class WorkerDiedError(RuntimeError):
+    """Worker inference mati sebelum mengirim hasil job"""
+
+
+class PoolUnavailable(RuntimeError):
+    """Pool belum siap (masih start) atau gagal start - request tidak bisa dilayani"""
+
+
+def _worker_cpus(worker_id: int, workers: int) -> Optional[List[int]]:
+    """Bagi CPU yang tersedia jadi blok-blok berurutan, satu blok per worker"""
+    if not hasattr(os, "sched_getaffinity"):
+        return None
+    cpus = sorted(os.sched_getaffinity(0))
+    per_worker = max(1, len(cpus) // workers)
+    start = (worker_id * per_worker) % len(cpus)
+    return cpus[start:start + per_worker]
+
+
+def _worker_main(worker_id: int, task_queue, result_queue, shm_name: str, slot_bytes: int,
+                 torch_threads: int, cpus: Optional[List[int]], warmup_batch_sizes: List[int],
+                 snapshot_only: bool):
+    """Loop proses worker: ambil job, baca bytes dari shared memory, predict per batch"""
+    from app.logging_config import setup_process_logging
+    setup_process_logging()  # spawn: belum ada handler; fork: sudah diganti hook at-fork
+
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+        torch.set_num_interop_threads(1)
+    except Exception:
+        pass
+
+    ring = shared_memory.SharedMemory(name=shm_name)
+    try:
+        # Fork: model sudah ada di memory (COW). Spawn: hanya dari snapshot (mmap),
+        # supaya weights dibagi lewat page cache dan bukan satu copy per worker
+        if snapshot_only:
+            skin_model.sources = ["snapshot"]
+            skin_model.source_cache_enabled = False
+        skin_model._ensure_loaded()
+        skin_model.warm_up(warmup_batch_sizes, iterations=1)
+        result_queue.put(("ready", worker_id, os.getpid(), skin_model.model_version))
+    except Exception as e:
+        result_queue.put(("failed", worker_id, str(e)))
+        return
+
+    stop = False
+    while not stop:
+        task = task_queue.get()
+        if task is None:
+            break
+        tasks = [task]
+
+        # Micro-batching di dalam worker
+        deadline = time.perf_counter() + MAX_WAIT_MS / 1000.0
+        while len(tasks) < MAX_BATCH_SIZE:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                task = task_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if task is None:
+                stop = True
+                break
+            tasks.append(task)
+
+        images, slots = [], []
+        for job_id, slot, length, inline_bytes in tasks:
+            if inline_bytes is not None:
+                images.append(inline_bytes)
+            else:
+                offset = slot * slot_bytes
+                images.append(bytes(ring.buf[offset:offset + length]))
+            slots.append(slot)
+
+        try:
+            batch, errors = skin_model.preprocess_many(images, max_workers=1)
+            valid = [i for i, error in enumerate(errors) if error is None]
+            predictions = dict(zip(valid, skin_model.predict_batch(batch[valid]))) if valid else {}
+            for i, (job_id, slot, _, _) in enumerate(tasks):
+                result = predictions.get(i) or skin_model._error_result(ValueError(errors[i]))
+                result_queue.put(("result", job_id, slot, result))
+        except Exception as e:
+            for job_id, slot, _, _ in tasks:
+                result_queue.put(("result", job_id, slot, skin_model._error_result(e)))
+
+    ring.close()
+
+
+class InferencePool:
+    """Pool proses inference dengan transport shared-memory ring"""
+
+    def __init__(self, workers: int = POOL_WORKERS, torch_threads: int = POOL_TORCH_THREADS,
+                 cpu_affinity: bool = POOL_CPU_AFFINITY, start_method: str = POOL_START_METHOD,
+                 ring_slots: int = POOL_RING_SLOTS, slot_bytes: int = POOL_SLOT_BYTES,
+                 enabled: bool = INFERENCE_MODE == "process"):
+        self.workers = max(1, workers)
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.cpu_affinity = cpu_affinity
+        self.start_method = start_method
+        self.ring_slots = max(1, ring_slots)
+        self.slot_bytes = slot_bytes
+        self.enabled = enabled
+
+        self._ctx = None
+        self._ring: Optional[shared_memory.SharedMemory] = None
+        self._task_queues: Dict[int, Any] = {}
+        self._result_queue = None
+        self._processes: Dict[int, Any] = {}
+        self._free_slots: "queue.Queue[int]" = queue.Queue()
+        self._pending: Dict[int, Future] = {}
+        self._inflight: Dict[int, Dict[int, Optional[int]]] = {}  # worker -> {job_id: slot}
+        self._job_worker: Dict[int, int] = {}
+        self._pending_lock = threading.Lock()
+        self._last_liveness_check = 0.0
+        self._start_lock = threading.Lock()
+        self._ready_workers = set()
+        self._ready_event = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._next_job_id = 0
+        self._started = False
+        self._stopping = False
+        self._start_error = None
+        self.model_version = None  # dilaporkan worker saat ready
+
+        # Statistik
+        self._completed = 0
+        self._inline = 0
+        self._restarts = 0
+        self._lost_jobs = 0
+        self._total_latency = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    @property
+    def failed(self) -> bool:
+        return self._start_error is not None
+
+    def check_available(self):
+        """Raise PoolUnavailable kalau pool belum siap atau gagal start"""
+        if self._start_error is not None:
+            raise PoolUnavailable(f"Inference pool failed to start: {self._start_error}")
+        if not self._started or not self._ready_event.is_set():
+            raise PoolUnavailable("Inference pool is still starting")
+
+    def start(self, warmup_batch_sizes: List[int] = None):
+        """Buat shared memory ring lalu start worker (dipanggil dari lifespan, bukan dari request)"""
+        with self._start_lock:
+            if self._started:
+                return
+            if self.start_method != "fork":
+                # Tanpa snapshot setiap worker akan me-load copy weights sendiri
+                if current_snapshot(skin_model.snapshot_dir, skin_model.snapshot_version) is None:
+                    self._start_error = (
+                        f"INFERENCE_POOL_START_METHOD={self.start_method} needs a local model snapshot "
+                        f"(python -m app.models.snapshot create) so workers share memory-mapped weights; "
+                        f"or use INFERENCE_POOL_START_METHOD=fork"
+                    )
+                    raise RuntimeError(self._start_error)
+                if skin_model.backend != "pytorch" or skin_model.requested_precision != "fp32":
+                    logger.warning(f"  Inference workers use backend={skin_model.backend}, precision="
+                                   f"{skin_model.requested_precision}: converted weights are per worker, "
+                                   f"only the fp32 PyTorch weights stay memory-mapped")
+            else:
+                # Weights di-share copy-on-write; thread lain tidak ikut ke child,
+                # lock yang sedang mereka pegang bisa tertinggal terkunci di sana
+                others = [t.name for t in threading.enumerate() if t is not threading.current_thread()]
+                if others:
+                    logger.warning(" Inference pool forks from a process with running threads (%s); "
+                                   "use INFERENCE_POOL_START_METHOD=spawn if workers hang", ", ".join(others))
+                skin_model._ensure_loaded()
+
+            self._ctx = mp.get_context(self.start_method)
+            self._ring = shared_memory.SharedMemory(create=True, size=self.ring_slots * self.slot_bytes)
+            for slot in range(self.ring_slots):
+                self._free_slots.put(slot)
+            self._result_queue = self._ctx.Queue()
+            self._warmup_batch_sizes = warmup_batch_sizes or sorted({1, MAX_BATCH_SIZE})
+
+            for worker_id in range(self.workers):
+                self._spawn_worker(worker_id)
+
+            self._dispatcher = threading.Thread(target=self._dispatch, name="inference-pool-dispatcher", daemon=True)
+            self._dispatcher.start()
+            self._started = True
+
+        logger.info(
+            f" Inference pool starting: {self.workers} workers x {self.torch_threads} torch threads "
+            f"({self.start_method}, ring {self.ring_slots} x {self.slot_bytes // 1024} KB)"
+        )
+        if not self._ready_event.wait(POOL_READY_TIMEOUT_SECONDS):
+            raise RuntimeError("Inference workers did not become ready in time")
+        if self._start_error:
+            raise RuntimeError(f"Inference worker failed to start: {self._start_error}")
+        logger.info(" Inference pool ready")
+
+    def _spawn_worker(self, worker_id: int):
+        """Start worker dengan task queue baru (queue worker lama dibuang bersama job di dalamnya)"""
+        cpus = _worker_cpus(worker_id, self.workers) if self.cpu_affinity else None
+        task_queue = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, task_queue, self._result_queue, self._ring.name, self.slot_bytes,
+                  self.torch_threads, cpus, self._warmup_batch_sizes, self.start_method != "fork"),
+            name=f"inference-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        with self._pending_lock:
+            old_queue = self._task_queues.get(worker_id)
+            self._task_queues[worker_id] = task_queue
+            self._inflight.setdefault(worker_id, {})
+            self._processes[worker_id] = process
+        if old_queue is not None:
+            old_queue.cancel_join_thread()
+            old_queue.close()
+
+    def _dispatch(self):
+        """Thread di proses utama: terima hasil dari worker, bebaskan slot, resolve future"""
+        while not self._stopping:
+            try:
+                message = self._result_queue.get(timeout=POOL_LIVENESS_INTERVAL_SECONDS)
+            except queue.Empty:
+                message = None
+            if message is not None:
+                self._handle_message(message)
+            # Cek liveness juga saat trafik tinggi, bukan hanya saat queue kosong
+            if time.monotonic() - self._last_liveness_check >= POOL_LIVENESS_INTERVAL_SECONDS:
+                self._check_workers()
+
+    def _handle_message(self, message):
+        kind = message[0]
+        if kind == "ready":
+            self._ready_workers.add(message[1])
+            self.model_version = message[3]
+            if len(self._ready_workers) >= self.workers:
+                self._ready_event.set()
+        elif kind == "failed":
+            logger.error(f" Inference worker {message[1]} failed to start: {message[2]}")
+            self._start_error = message[2]
+            self._ready_event.set()
+        elif kind == "result":
+            _, job_id, slot, result = message
+            with self._pending_lock:
+                future = self._pending.pop(job_id, None)
+                worker_id = self._job_worker.pop(job_id, None)
+                if worker_id is not None:
+                    self._inflight[worker_id].pop(job_id, None)
+            # Job yang tidak tercatat lagi sudah digagalkan saat workernya mati
+            # (slotnya sudah dikembalikan di sana)
+            if worker_id is not None and slot is not None:
+                self._free_slots.put(slot)
+            if future is not None and not future.done():
+                future.set_result(result)
+
+    def _drain_results(self):
+        while True:
+            try:
+                message = self._result_queue.get_nowait()
+            except queue.Empty:
+                return
+            self._handle_message(message)
+
+    def _check_workers(self):
+        """
+        Restart worker yang mati (misalnya OOM-killed); job yang dipegangnya
+        gagal, slotnya dikembalikan. Setelah ada worker yang gagal start, pool
+        dianggap gagal dan worker tidak di-restart lagi (restart akan gagal sama).
+        """
+        self._last_liveness_check = time.monotonic()
+        dead = [(worker_id, process) for worker_id, process in list(self._processes.items())
+                if not process.is_alive()]
+        if not dead or self._stopping:
+            return
+        self._drain_results()  # hasil yang sempat dikirim sebelum worker mati tetap dipakai
+        for worker_id, process in dead:
+            if worker_id not in self._ready_workers and self._start_error is None:
+                # Mati sebelum "ready" (crash saat import/load): restart akan gagal sama
+                self._start_error = f"worker {worker_id} exited during startup (exit code {process.exitcode})"
+                self._ready_event.set()
+            with self._pending_lock:
+                lost = self._inflight.get(worker_id, {})
+                self._inflight[worker_id] = {}
+                futures = []
+                for job_id in lost:
+                    self._job_worker.pop(job_id, None)
+                    future = self._pending.pop(job_id, None)
+                    if future is not None:
+                        futures.append(future)
+                self._lost_jobs += len(lost)
+            self._ready_workers.discard(worker_id)
+            for slot in lost.values():
+                if slot is not None:
+                    self._free_slots.put(slot)
+            error = WorkerDiedError(f"Inference worker {worker_id} died (exit code {process.exitcode})")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+            if self._start_error is not None:
+                with self._pending_lock:
+                    self._processes.pop(worker_id, None)
+                logger.error(f" Inference worker {worker_id} exited (exit code {process.exitcode}) - "
+                             f"not restarting, pool failed: {self._start_error}")
+                continue
+            logger.warning(f"  Inference worker {worker_id} died (exit code {process.exitcode}) - "
+                           f"failed {len(lost)} in-flight jobs, restarting")
+            self._restarts += 1
+            self._spawn_worker(worker_id)
+
+    def _pick_worker_locked(self) -> int:
+        """Worker hidup dengan job in-flight paling sedikit (yang sudah ready lebih dulu)"""
+        alive = [w for w, p in self._processes.items() if p.is_alive()] or list(self._processes)
+        ready = [w for w in alive if w in self._ready_workers] or alive
+        return min(ready, key=lambda w: len(self._inflight[w]))
+
+    def _submit(self, image_bytes: bytes) -> Tuple[int, Future]:
+        """Tulis gambar ke slot ring (atau inline) dan kirim job ke worker"""
+        self.check_available()
+        slot, inline_bytes = None, None
+        if len(image_bytes) <= self.slot_bytes:
+            try:
+                slot = self._free_slots.get(timeout=POOL_TIMEOUT_SECONDS)
+            except queue.Empty:
+                raise TimeoutError("No free shared-memory slot for inference")
+            offset = slot * self.slot_bytes
+            self._ring.buf[offset:offset + len(image_bytes)] = image_bytes
+        else:
+            inline_bytes = image_bytes
+            self._inline += 1
+
+        future: Future = Future()
+        with self._pending_lock:
+            job_id = self._next_job_id
+            self._next_job_id += 1
+            self._pending[job_id] = future
+            worker_id = self._pick_worker_locked()
+            self._inflight[worker_id][job_id] = slot
+            self._job_worker[job_id] = worker_id
+            task_queue = self._task_queues[worker_id]
+
+        task_queue.put((job_id, slot, len(image_bytes), inline_bytes))
+        return job_id, future
+
+    def _wait(self, job_id: int, future: Future, started: float, timeout: float) -> Dict[str, Any]:
+        try:
+            result = future.result(timeout=max(0.0, timeout))
+        except Exception:
+            # Slot tidak dikembalikan di sini karena worker mungkin masih membacanya;
+            # dispatcher membebaskannya saat hasil worker datang atau saat worker mati
+            with self._pending_lock:
+                self._pending.pop(job_id, None)
+            raise
+
+        with self._pending_lock:
+            self._completed += 1
+            self._total_latency += time.perf_counter() - started
+        return result
+
+    def predict_bytes(self, image_bytes: bytes) -> Dict[str, Any]:
+        """Kirim satu gambar ke pool dan tunggu hasilnya (blocking)"""
+        started = time.perf_counter()
+        job_id, future = self._submit(image_bytes)
+        return self._wait(job_id, future, started, POOL_TIMEOUT_SECONDS)
+
+    def predict_many(self, images: List[bytes]) -> List[Any]:
+        """
+        Kirim banyak gambar sekaligus (worker mem-batch sendiri) lalu tunggu
+        semuanya. Per gambar: dict hasil (berisi "error" kalau gambarnya
+        rusak) atau exception kalau pool gagal memprosesnya (worker mati,
+        timeout) - gambar lain tetap jalan.
+        """
+        started = time.perf_counter()
+        jobs = []
+        for image_bytes in images:
+            try:
+                jobs.append(self._submit(image_bytes))
+            except PoolUnavailable:
+                raise
+            except Exception as e:
+                jobs.append(e)
+
+        deadline = started + POOL_TIMEOUT_SECONDS
+        results = []
+        for job in jobs:
+            if isinstance(job, Exception):
+                results.append(job)
+                continue
+            try:
+                results.append(self._wait(*job, started, deadline - time.perf_counter()))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def stop(self):
+        """Hentikan worker dan lepaskan shared memory"""
+        if not self._started:
+            return
+        self._stopping = True
+        for task_queue in self._task_queues.values():
+            task_queue.put(None)
+        for process in self._processes.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._ring.close()
+        self._ring.unlink()
+        self._started = False
+        logger.info(" Inference pool stopped")
+
+    def stats(self) -> Dict[str, Any]:
+        """Konfigurasi dan statistik pool untuk monitoring"""
+        return {
+            "enabled": self.enabled,
+            "started": self._started,
+            "failed": self._start_error,
+            "model_version": self.model_version,
+            "config": {
+                "workers": self.workers,
+                "torch_threads_per_worker": self.torch_threads,
+                "cpu_affinity": self.cpu_affinity,
+                "start_method": self.start_method,
+                "ring_slots": self.ring_slots,
+                "slot_bytes": self.slot_bytes,
+            },
+            "workers_alive": sum(1 for p in self._processes.values() if p.is_alive()),
+            "workers_ready": len(self._ready_workers),
+            "pending": len(self._pending),
+            "free_slots": self._free_slots.qsize(),
+            "completed": self._completed,
+            "inline_transfers": self._inline,
+            "worker_restarts": self._restarts,
+            "lost_jobs": self._lost_jobs,
+            "avg_latency_ms": round(1000 * self._total_latency / self._completed, 3) if self._completed else 0.0,
+        }
+
+
+# Global instance
+inference_pool = InferencePool()
@@ -0,0 +1,280 @@
+# app/services/jobs.py
+"""
+Prediksi asynchronous lewat antrian job yang persisten (app/database/job_store.py).
+
+POST /predict/jobs hanya menyimpan gambar ke antrian lalu langsung
+mengembalikan job id. Background worker mengambil job per batch
+(PREDICT_JOB_BATCH_SIZE), menjalankan satu forward pass lewat
+SkinDiseaseModel.predict_batch dan menyimpan hasilnya. Client mengambil hasil
+lewat polling GET /predict/jobs/{id} atau SSE /predict/jobs/{id}/events.
+
+Job yang sedang diproses memegang lease (PREDICT_JOB_LEASE_SECONDS) yang
+diperpanjang proses ini selama masih hidup. Kalau proses mati, job kembali
+ke antrian setelah lease-nya habis (dicek saat startup dan setiap menit),
+atau failed kalau sudah PREDICT_JOB_MAX_ATTEMPTS kali dicoba.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import anyio
+
+from app.database.job_store import job_store, JobStore, FINISHED_STATUSES
+from app.services.batching import MAX_BATCH_SIZE
+from app.services.model_registry import model_registry
+from app.services.prediction import format_response, uses_pool
+from app.services.inference_pool import inference_pool
+from app.services.prediction_cache import prediction_cache
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+JOBS_ENABLED = os.getenv("PREDICT_JOBS", "1") == "1"
+JOB_WORKERS = int(os.getenv("PREDICT_JOB_WORKERS", "1"))
+JOB_BATCH_SIZE = int(os.getenv("PREDICT_JOB_BATCH_SIZE", str(MAX_BATCH_SIZE)))
+JOB_POLL_SECONDS = float(os.getenv("PREDICT_JOB_POLL_SECONDS", "1.0"))
+JOB_MAX_QUEUED = int(os.getenv("PREDICT_JOB_MAX_QUEUED", "10000"))
+JOB_MAX_ATTEMPTS = int(os.getenv("PREDICT_JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_SECONDS = float(os.getenv("PREDICT_JOB_LEASE_SECONDS", "60"))
+JOB_RETENTION_SECONDS = float(os.getenv("PREDICT_JOB_RETENTION_SECONDS", str(24 * 3600)))
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+class JobQueueFull(RuntimeError):
+    """Antrian job sudah PREDICT_JOB_MAX_QUEUED"""
+
+
+class JobWorkers:
+    """Background worker (asyncio task) yang memproses antrian job per batch"""
+
+    def __init__(self, store: JobStore = job_store, workers: int = JOB_WORKERS,
+                 batch_size: int = JOB_BATCH_SIZE, poll_seconds: float = JOB_POLL_SECONDS):
+        self.store = store
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.poll_seconds = poll_seconds
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._changed: Optional[asyncio.Condition] = None
+        self._last_maintenance = 0.0
+
+        # Statistik proses ini
+        self._batches = 0
+        self._processed = 0
+        self._failed = 0
+        self._retried = 0
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def start(self):
+        """Dipanggil dari lifespan: requeue job dengan lease habis lalu jalankan worker + renew lease"""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Condition()
+        expired = await anyio.to_thread.run_sync(self.store.requeue_expired, JOB_MAX_ATTEMPTS, JOB_LEASE_SECONDS)
+        if expired["requeued"] or expired["failed"]:
+            logger.info(f" Prediction jobs with expired lease: requeued {expired['requeued']}, "
+                        f"failed {expired['failed']} (max attempts)")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._renew_leases()))
+        logger.info(f" Prediction job workers started: {self.workers} x batch {self.batch_size}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks = []
+
+    async def submit(self, image: bytes, image_hash: str = None, filename: str = None,
+                     user_id: int = None) -> Dict[str, Any]:
+        """Simpan job ke antrian persisten dan bangunkan worker"""
+        queued = await anyio.to_thread.run_sync(self.store.queued_count)
+        if queued >= JOB_MAX_QUEUED:
+            raise JobQueueFull(f"Prediction job queue is full ({queued} jobs)")
+        job = await anyio.to_thread.run_sync(
+            lambda: self.store.enqueue(image, image_hash, filename, user_id)
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                await self._maintenance()
+                jobs = await anyio.to_thread.run_sync(self.store.claim, self.batch_size, JOB_LEASE_SECONDS)
+                if not jobs:
+                    # Tunggu job baru (proses ini) atau poll berikutnya (job dari proses lain)
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                outcomes = await anyio.to_thread.run_sync(self._process, jobs)
+                await anyio.to_thread.run_sync(self.store.complete, outcomes)
+                self._batches += 1
+                async with self._changed:
+                    self._changed.notify_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f" Prediction job worker {index} error: {e}")
+                await asyncio.sleep(self.poll_seconds)
+
+    async def _renew_leases(self):
+        """Perpanjang lease job yang sedang dijalankan proses ini (3x per periode lease)"""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                await anyio.to_thread.run_sync(self.store.renew_leases, JOB_LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f" Renewing prediction job leases failed: {e}")
+
+    async def _maintenance(self):
+        """Requeue job dengan lease habis + hapus job lama (maksimal sekali per menit)"""
+        now = time.monotonic()
+        if now - self._last_maintenance < 60:
+            return
+        self._last_maintenance = now
+        expired = await anyio.to_thread.run_sync(self.store.requeue_expired, JOB_MAX_ATTEMPTS, JOB_LEASE_SECONDS)
+        purged = await anyio.to_thread.run_sync(self.store.purge_finished, JOB_RETENTION_SECONDS)
+        if expired["requeued"] or expired["failed"] or purged:
+            logger.info(f" Prediction jobs: requeued {expired['requeued']} expired, failed {expired['failed']} "
+                        f"at max attempts, purged {purged} finished")
+
+    def _process(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Satu batch job -> outcome per job (dijalankan di thread)"""
+        try:
+            with model_registry.acquire() as model:
+                if uses_pool(model):
+                    inference_pool.check_available()
+                    return self._predict_jobs(model, jobs, inference_pool.model_version)
+                model._ensure_loaded()
+                return self._predict_jobs(model, jobs, model.model_version)
+        except Exception as e:
+            # Gagal di level batch (model tidak bisa di-load dsb.): coba lagi nanti
+            logger.error(f" Prediction job batch failed: {e}")
+            outcomes = []
+            for job in jobs:
+                retry = job["attempts"] < JOB_MAX_ATTEMPTS
+                self._retried += int(retry)
+                self._failed += int(not retry)
+                outcomes.append({"id": job["id"], "error": str(e), "retry": retry})
+            return outcomes
+
+    def _predict_jobs(self, model, jobs: List[Dict[str, Any]], model_version: str) -> List[Dict[str, Any]]:
+        outcomes = []
+        pending = []
+        for job in jobs:
+            key = prediction_cache.make_key(job["image"], model_version, job["image_hash"])
+            cached = prediction_cache.get(key)
+            if cached is not None:
+                outcomes.append({"id": job["id"], "result": format_response(cached, model_version)})
+            else:
+                pending.append((job, key))
+
+        if pending:
+            results, errors = self._predict_pending(model, [job["image"] for job, _ in pending])
+            for i, (job, key) in enumerate(pending):
+                if isinstance(errors[i], Exception):
+                    # Worker pool mati / timeout: bukan salah gambarnya, coba lagi nanti
+                    retry = job["attempts"] < JOB_MAX_ATTEMPTS
+                    self._retried += int(retry)
+                    self._failed += int(not retry)
+                    outcomes.append({"id": job["id"], "error": str(errors[i]), "retry": retry})
+                elif i in results:
+                    prediction_cache.put(key, results[i])
+                    outcomes.append({"id": job["id"], "result": format_response(results[i], model_version)})
+                else:
+                    # Gambar rusak: gagal permanen, tidak di-retry
+                    self._failed += 1
+                    outcomes.append({"id": job["id"], "error": errors[i]})
+
+        self._processed += len(jobs)
+        return outcomes
+
+    @staticmethod
+    def _predict_pending(model, images: List[bytes]):
+        """-> (hasil per index yang berhasil, error per index: None, pesan, atau exception pool)"""
+        if uses_pool(model):
+            pool_results = inference_pool.predict_many(images)
+            errors = [r if isinstance(r, Exception) else r.get("error") for r in pool_results]
+            return {i: r for i, r in enumerate(pool_results) if errors[i] is None}, errors
+        batch, errors = model.preprocess_many(images)
+        valid = [i for i, error in enumerate(errors) if error is None]
+        return (dict(zip(valid, model.predict_batch(batch[valid]))) if valid else {}), errors
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await anyio.to_thread.run_sync(self.store.get, job_id)
+
+    async def events(self, job_id: str) -> AsyncIterator[str]:
+        """
+        Server-Sent Events untuk satu job: event "status" setiap status berubah,
+        lalu event "result" (done/failed) dan stream selesai.
+        """
+        last_status = None
+        last_sent = time.monotonic()
+        while True:
+            job = await self.get(job_id)
+            if job is None:
+                yield _sse("error", {"error": "Job not found"})
+                return
+            if job["status"] in FINISHED_STATUSES:
+                yield _sse("result", job)
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                last_sent = time.monotonic()
+                yield _sse("status", {k: v for k, v in job.items() if k != "result"})
+            elif time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            await self._wait_for_change()
+
+    async def _wait_for_change(self):
+        """Tunggu batch berikutnya selesai (proses ini) atau poll interval (proses lain)"""
+        if self._changed is None:
+            await asyncio.sleep(self.poll_seconds)
+            return
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "config": {
+                "workers": self.workers,
+                "batch_size": self.batch_size,
+                "max_queued": JOB_MAX_QUEUED,
+                "max_attempts": JOB_MAX_ATTEMPTS,
+                "db_path": str(self.store.db_path),
+            },
+            "running": self.running,
+            "batches": self._batches,
+            "processed": self._processed,
+            "failed": self._failed,
+            "retried": self._retried,
+            **self.store.stats(),
+        }
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Global instance
+job_workers = JobWorkers()
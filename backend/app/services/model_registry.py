@@ -0,0 +1,288 @@
+# app/services/model_registry.py
+"""
+Registry multi-model untuk hot-swap tanpa restart.
+
+Setiap versi adalah SkinDiseaseModel tersendiri (labels, preprocessing
+spec, backend dan precision masing-masing) yang dipin ke satu sumber:
+snapshot tertentu, HF Hub, .h5, .keras atau SavedModel. Versi "default"
+adalah skin_model global dengan fallback chain biasa.
+
+- Versi baru di-load + warm-up di background thread, lalu (opsional)
+  diaktifkan. Aktivasi hanya mengganti satu referensi di bawah lock;
+  request yang sedang berjalan tetap memakai versi yang di-acquire di awal.
+- Total memory weights dibatasi MODEL_MEMORY_BUDGET_MB: versi non-aktif
+  yang paling lama tidak dipakai di-unload (setelah in-flight request-nya
+  selesai).
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import anyio
+
+from app.models.ai_model import skin_model, SkinDiseaseModel, MODEL_SOURCES, PRECISION_MODES
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))  # 0 = tanpa batas
+DEFAULT_VERSION_ID = "default"
+
+
+class ModelVersion:
+    """Satu versi model di registry beserta status dan penggunaannya"""
+
+    def __init__(self, version_id: str, model: SkinDiseaseModel, spec: Dict[str, Any] = None):
+        self.id = version_id
+        self.model = model
+        self.spec = spec or {}
+        self.status = "ready" if model.model_loaded else "registered"
+        self.error = None
+        self.inflight = 0
+        self.pending_unload = False
+        self.last_used = 0.0
+        self.loaded_at = None
+        self.memory_bytes = model.memory_bytes() if model.model_loaded else 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.model.model_loaded
+
+    def refresh_memory(self):
+        """Versi yang di-load lazily (default) baru diketahui ukurannya setelah load"""
+        if self.loaded and not self.memory_bytes:
+            self.memory_bytes = self.model.memory_bytes()
+
+    def to_dict(self, active_id: str) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "active": self.id == active_id,
+            "status": "ready" if self.loaded and self.status != "loading" else self.status,
+            "error": self.error,
+            "spec": self.spec,
+            "model_version": self.model.model_version,
+            "source": self.model.source,
+            "backend": self.model.active_backend,
+            "precision": self.model.precision,
+            "labels": self.model.idx_to_label if self.loaded else None,
+            "preprocessing": self.model.preprocessing_spec() if self.loaded else None,
+            "memory_mb": round(self.memory_bytes / (1024 ** 2), 2),
+            "inflight": self.inflight,
+            "last_used": self.last_used or None,
+            "loaded_at": self.loaded_at,
+        }
+
+
+def build_model(spec: Dict[str, Any]) -> SkinDiseaseModel:
+    """
+    SkinDiseaseModel dari spec registrasi:
+        {"source": "snapshot"|"hf_hub"|"h5"|"keras"|"saved_model",
+         "snapshot": "<versi snapshot>", "weights_dir": "...",
+         "backend": "pytorch"|"onnx", "precision": "fp32"|"int8"|"bf16"}
+    """
+    source = spec.get("source")
+    if source not in MODEL_SOURCES:
+        raise ValueError(f"Unknown model source: {source} (choose from {', '.join(MODEL_SOURCES)})")
+    precision = spec.get("precision", "fp32")
+    if precision not in PRECISION_MODES:
+        raise ValueError(f"Unknown precision mode: {precision}")
+
+    model = SkinDiseaseModel(sources=[source])
+    if spec.get("snapshot"):
+        model.snapshot_version = spec["snapshot"]
+    if spec.get("weights_dir"):
+        from pathlib import Path
+        model.weights_dir = Path(spec["weights_dir"])
+    if spec.get("backend"):
+        model.backend = spec["backend"]
+    model.requested_precision = precision
+    return model
+
+
+class ModelRegistry:
+    """Kumpulan versi model dengan satu versi aktif dan budget memory"""
+
+    def __init__(self, default_model: SkinDiseaseModel, memory_budget_mb: float = MEMORY_BUDGET_MB):
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self._versions: "OrderedDict[str, ModelVersion]" = OrderedDict()
+        self._versions[DEFAULT_VERSION_ID] = ModelVersion(DEFAULT_VERSION_ID, default_model, {"source": "auto"})
+        self._active_id = DEFAULT_VERSION_ID
+        self._lock = threading.Lock()
+        self._swaps = 0
+        self._unloads = 0
+
+    @property
+    def active_id(self) -> str:
+        return self._active_id
+
+    def active_model(self) -> SkinDiseaseModel:
+        return self._versions[self._active_id].model
+
+    def _get(self, version_id: str) -> ModelVersion:
+        entry = self._versions.get(version_id)
+        if entry is None:
+            raise KeyError(f"Unknown model version: {version_id}")
+        return entry
+
+    def register(self, version_id: str, spec: Dict[str, Any]) -> ModelVersion:
+        """Daftarkan versi baru (belum di-load)"""
+        model = build_model(spec)
+        with self._lock:
+            if version_id in self._versions:
+                raise ValueError(f"Model version already registered: {version_id}")
+            entry = ModelVersion(version_id, model, dict(spec))
+            self._versions[version_id] = entry
+        logger.info(f" Registered model version {version_id}: {spec}")
+        return entry
+
+    def load(self, version_id: str, activate: bool = False, batch_sizes: List[int] = (1,)):
+        """Load + warm-up satu versi (blocking), lalu aktifkan kalau diminta"""
+        entry = self._get(version_id)
+        entry.status, entry.error = "loading", None
+        started = time.perf_counter()
+        try:
+            entry.model._ensure_loaded()
+            entry.model.warm_up(batch_sizes, iterations=1)
+        except Exception as e:
+            entry.status, entry.error = "failed", str(e)
+            logger.error(f" Model version {version_id} failed to load: {e}")
+            return
+        entry.status = "ready"
+        entry.loaded_at = time.time()
+        entry.memory_bytes = entry.model.memory_bytes()
+        logger.info(
+            f" Model version {version_id} ready in {time.perf_counter() - started:.1f}s "
+            f"({entry.model.model_version}, {entry.memory_bytes / (1024 ** 2):.1f} MB)"
+        )
+
+        if activate:
+            self.activate(version_id)
+        self._enforce_budget()
+
+    def load_async(self, version_id: str, activate: bool = False, batch_sizes: List[int] = (1,)) -> threading.Thread:
+        """Load + warm-up di background thread; traffic tetap di versi aktif sampai selesai"""
+        self._get(version_id).status = "loading"
+        thread = threading.Thread(
+            target=self.load, args=(version_id, activate, batch_sizes),
+            name=f"model-load-{version_id}", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def activate(self, version_id: str):
+        """Alihkan traffic baru ke versi ini (atomic; request in-flight tidak terganggu)"""
+        entry = self._get(version_id)
+        if not entry.loaded:
+            raise ValueError(f"Model version {version_id} is not loaded (status: {entry.status})")
+        with self._lock:
+            previous = self._active_id
+            self._active_id = version_id
+            entry.pending_unload = False
+            entry.last_used = time.time()
+            self._swaps += 1
+        logger.info(f" Active model switched: {previous} -> {version_id} ({entry.model.model_version})")
+        self._enforce_budget()
+
+    def unload(self, version_id: str):
+        """Lepas weights versi non-aktif (ditunda sampai in-flight request selesai)"""
+        with self._lock:
+            entry = self._get(version_id)
+            if version_id == self._active_id:
+                raise ValueError("Cannot unload the active model version")
+            if entry.inflight:
+                entry.pending_unload = True
+                return
+        self._unload_entry(entry)
+
+    def _unload_entry(self, entry: ModelVersion):
+        entry.model.unload()
+        entry.status = "unloaded"
+        entry.pending_unload = False
+        entry.memory_bytes = 0
+        self._unloads += 1
+        logger.info(f" Unloaded model version {entry.id}")
+
+    def _enforce_budget(self):
+        """Unload versi non-aktif yang paling lama idle sampai total memory <= budget"""
+        if self.memory_budget_bytes <= 0:
+            return
+        to_unload = []
+        with self._lock:
+            loaded = [e for e in self._versions.values() if e.loaded]
+            for entry in loaded:
+                entry.refresh_memory()
+            total = sum(e.memory_bytes for e in loaded)
+            for entry in sorted(loaded, key=lambda e: e.last_used):
+                if total <= self.memory_budget_bytes:
+                    break
+                if entry.id == self._active_id:
+                    continue
+                total -= entry.memory_bytes
+                if entry.inflight:
+                    entry.pending_unload = True
+                else:
+                    to_unload.append(entry)
+        for entry in to_unload:
+            logger.info(f" Memory budget exceeded - unloading idle model version {entry.id}")
+            self._unload_entry(entry)
+
+    def _borrow(self, version_id: Optional[str]) -> ModelVersion:
+        with self._lock:
+            entry = self._get(version_id or self._active_id)
+            entry.inflight += 1
+            entry.last_used = time.time()
+        return entry
+
+    def _release(self, entry: ModelVersion):
+        with self._lock:
+            entry.inflight -= 1
+            unload_now = entry.pending_unload and entry.inflight == 0 and entry.id != self._active_id
+        if unload_now:
+            self._unload_entry(entry)
+
+    @contextmanager
+    def acquire(self, version_id: Optional[str] = None) -> Iterator[SkinDiseaseModel]:
+        """
+        Pinjam model untuk satu request (default: versi aktif). Versi yang
+        dipinjam tidak di-unload sampai semua peminjamnya selesai.
+        Blocking (lock + unload di pelepasan terakhir): dari event loop pakai
+        acquire_async.
+        """
+        entry = self._borrow(version_id)
+        try:
+            yield entry.model
+        finally:
+            self._release(entry)
+
+    @asynccontextmanager
+    async def acquire_async(self, version_id: Optional[str] = None) -> AsyncIterator[SkinDiseaseModel]:
+        """acquire untuk kode async: lock dan unload dijalankan di worker thread"""
+        entry = await anyio.to_thread.run_sync(self._borrow, version_id)
+        try:
+            yield entry.model
+        finally:
+            # Tetap dilepas walaupun request dibatalkan (client disconnect)
+            with anyio.CancelScope(shield=True):
+                await anyio.to_thread.run_sync(self._release, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            for entry in self._versions.values():
+                entry.refresh_memory()
+            versions = [entry.to_dict(self._active_id) for entry in self._versions.values()]
+        return {
+            "active": self._active_id,
+            "memory_budget_mb": round(self.memory_budget_bytes / (1024 ** 2), 2) or None,
+            "memory_used_mb": round(sum(v["memory_mb"] for v in versions), 2),
+            "swaps": self._swaps,
+            "unloads": self._unloads,
+            "versions": versions,
+        }
+
+
+# Global instance
+model_registry = ModelRegistry(skin_model)
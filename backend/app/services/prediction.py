@@ -1,60 +1,120 @@
 # app/services/prediction.py
+import os
 import anyio
+from typing import List, Tuple
 from app.models.ai_model import skin_model
+from app.services.batching import batcher, QueueFullError
+from app.services.prediction_cache import prediction_cache
+from app.services.inference_pool import inference_pool, PoolUnavailable
+from app.services.model_registry import model_registry
+from app.services.admission import admission, AdmissionRejected, PRIORITY_ANONYMOUS
+from app.services.tiling import TilingConfig, predict_tiled
+from app.services.similar_cases import embed_images, find_similar
 import logging
 import traceback
 
 logger = logging.getLogger(__name__)
 
-async def predict_disease(image_bytes: bytes):
+# Jumlah gambar per forward pass untuk endpoint /predict/batch
+BATCH_CHUNK_SIZE = int(os.getenv("PREDICT_BATCH_CHUNK_SIZE", "32"))
+
+def format_response(raw_result: dict, model_version: str = None) -> dict:
+    """Bentuk response /predict yang konsisten untuk frontend dari hasil raw model"""
+    # Debug log (lazy: dict hanya di-format kalau DEBUG aktif)
+    logger.debug("Raw prediction result: %s", raw_result)
+    
+    # Ensure we have the expected keys with safe defaults
+    topk = raw_result.get("topk", [])
+    best = raw_result.get("best", {})
+    
+    # Validate best prediction structure
+    if not isinstance(best, dict):
+        best = {"index": -1, "label": "Unknown", "score": 0.0}
+    
+    # Ensure best has required fields
+    safe_best = {
+        "index": best.get("index", -1),
+        "label": best.get("label", "Unknown"),
+        "score": best.get("score", 0.0)
+    }
+    
+    # Build consistent response
+    response = {
+        "success": True,
+        "predictions": {
+            "topk": topk,
+            "best": safe_best
+        },
+        "model_info": {
+            "status": raw_result.get("model_status", "enhanced_fallback"),
+            "type": "skin_disease_detector",
+            "version": model_version
+        },
+        "message": "Analysis completed successfully"
+    }
+    
+    # Add note if present
+    if "note" in raw_result:
+        response["note"] = raw_result["note"]
+    
+    # Tiled inference: grid + bounding box tile yang paling berpengaruh
+    if "tiling" in raw_result:
+        response["tiling"] = raw_result["tiling"]
+        
+    logger.debug("Formatted response: %s", response)
+    return response
+
+def uses_pool(model) -> bool:
+    """
+    True kalau model dilayani process pool (INFERENCE_MODE=process, versi
+    default): weights ada di worker, proses ini tidak perlu me-load model
+    """
+    return inference_pool.enabled and model is skin_model
+
+async def predict_disease(image_bytes: bytes, image_hash: str = None, tiled: bool = False):
     """
     Predict skin disease from image bytes
     Returns consistent response format for frontend
+    image_hash: sha256 hex yang sudah dihitung saat upload di-stream (opsional)
+    tiled: potong gambar resolusi tinggi jadi tile (lihat app/services/tiling.py)
     """
     def _infer(img_bytes: bytes) -> dict:
         try:
-            # Get prediction from model
-            raw_result = skin_model.predict_bytes(img_bytes)
-            
-            # Debug log
-            logger.info(f"Raw prediction result: {raw_result}")
-            
-            # Ensure we have the expected keys with safe defaults
-            topk = raw_result.get("topk", [])
-            best = raw_result.get("best", {})
-            
-            # Validate best prediction structure
-            if not isinstance(best, dict):
-                best = {"index": -1, "label": "Unknown", "score": 0.0}
-            
-            # Ensure best has required fields
-            safe_best = {
-                "index": best.get("index", -1),
-                "label": best.get("label", "Unknown"),
-                "score": best.get("score", 0.0)
-            }
-            
-            # Build consistent response
-            response = {
-                "success": True,
-                "predictions": {
-                    "topk": topk,
-                    "best": safe_best
-                },
-                "model_info": {
-                    "status": raw_result.get("model_status", "enhanced_fallback"),
-                    "type": "skin_disease_detector"
-                },
-                "message": "Analysis completed successfully"
-            }
-            
-            # Add note if present
-            if "note" in raw_result:
-                response["note"] = raw_result["note"]
+            # Get prediction: cache (key = hash gambar + versi model), kalau
+            # miss jalankan lewat process pool (INFERENCE_MODE=process) atau
+            # micro-batching scheduler di proses ini. Versi model di-acquire
+            # dari registry supaya swap tidak mengganggu request yang berjalan
+            with model_registry.acquire() as model:
+                if tiled:
+                    # Tile sudah satu batch sendiri: langsung ke model di proses ini, tanpa batcher/pool
+                    model._ensure_loaded()
+                    config = TilingConfig()
+                    tile_size = config.tile_size or min(model._input_size())
+                    cache_key = prediction_cache.make_key(
+                        img_bytes, f"{model.model_version}+{config.signature(tile_size)}", image_hash
+                    )
+                    raw_result = prediction_cache.get_or_compute(
+                        cache_key, lambda: predict_tiled(model, img_bytes, config)
+                    )
+                    return format_response(raw_result, model.model_version)
                 
-            logger.info(f"Formatted response: {response}")
-            return response
+                if uses_pool(model):
+                    # Worker yang memegang weights (snapshot mmap / fork); versi lain jalan di proses ini
+                    inference_pool.check_available()
+                    model_version = inference_pool.model_version
+                    compute = inference_pool.predict_bytes
+                else:
+                    model._ensure_loaded()
+                    model_version = model.model_version
+                    compute = lambda data: batcher.predict_bytes(data, model)
+                cache_key = prediction_cache.make_key(img_bytes, model_version, image_hash)
+                raw_result = prediction_cache.get_or_compute(cache_key, lambda: compute(img_bytes))
+                
+                return format_response(raw_result, model_version)
             
+        except (QueueFullError, PoolUnavailable):
+            # Overload, bukan error prediksi: route membalas 503 + Retry-After
+            raise
         except Exception as e:
             logger.error(f"Prediction service error: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
@@ -69,4 +129,98 @@ async def predict_disease(image_bytes: bytes):
             }
     
     # Run in thread pool
-    return await anyio.to_thread.run_sync(_infer, image_bytes)
\ No newline at end of file
+    return await anyio.to_thread.run_sync(_infer, image_bytes)
+
+async def predict_with_embedding(image_bytes: bytes, image_hash: str = None, k: int = 0, mode: str = None):
+    """
+    Prediksi + embedding gambar dari satu forward pass. Dengan k > 0 response
+    juga berisi k kasus referensi terdekat (similar_cases). Hasil prediksi
+    ikut disimpan di prediction cache, jadi /predict berikutnya cache hit.
+    """
+    def _infer() -> dict:
+        with model_registry.acquire() as model:
+            model._ensure_loaded()
+            results, embeddings, errors = embed_images(model, [image_bytes])
+            if errors[0] is not None:
+                raise ValueError(errors[0])
+            prediction_cache.put(prediction_cache.make_key(image_bytes, model.model_version, image_hash), results[0])
+            
+            response = format_response(results[0], model.model_version)
+            response["embedding"] = {
+                "dim": int(embeddings.shape[1]),
+                "space": model.embedding_space,
+                "vector": embeddings[0].tolist(),
+            }
+            if k > 0:
+                response["similar_cases"] = find_similar(model, embeddings[0], k, mode)
+            return response
+    
+    return await anyio.to_thread.run_sync(_infer)
+
+async def predict_disease_batch(images: List[Tuple[str, bytes]], chunk_size: int = BATCH_CHUNK_SIZE,
+                                priority: int = PRIORITY_ANONYMOUS):
+    """
+    Predict banyak gambar sekaligus. Gambar diproses per chunk: decode paralel,
+    satu forward pass per chunk, lalu hasil per gambar di-yield sebagai dict
+    segera setelah chunk tersebut selesai (untuk streaming NDJSON).
+
+    Setiap chunk memegang satu slot admission control (seperti satu /predict).
+    Ditolak di chunk pertama -> AdmissionRejected di-raise (route membalas 503);
+    ditolak di tengah stream -> sisa gambar di-yield gagal dengan retry_after.
+    """
+    async with model_registry.acquire_async() as model:
+        async for item in _predict_chunks(model, images, chunk_size, priority):
+            yield item
+
+async def _predict_chunks(model, images: List[Tuple[str, bytes]], chunk_size: int, priority: int):
+    if uses_pool(model):
+        inference_pool.check_available()
+        model_version = inference_pool.model_version
+    else:
+        await anyio.to_thread.run_sync(model._ensure_loaded)
+        model_version = model.model_version
+
+    for start in range(0, len(images), chunk_size):
+        chunk = images[start:start + chunk_size]
+
+        def _infer_chunk() -> list:
+            if uses_pool(model):
+                # Kirim semua gambar chunk ke worker sekaligus; worker mem-batch sendiri
+                pool_results = inference_pool.predict_many([data for _, data in chunk])
+                errors = [str(r) if isinstance(r, Exception) else r.get("error") for r in pool_results]
+                return errors, {i: result for i, result in enumerate(pool_results) if errors[i] is None}
+
+            batch, errors = model.preprocess_many([data for _, data in chunk])
+            valid = [i for i, error in enumerate(errors) if error is None]
+            results = model.predict_batch(batch[valid]) if valid else []
+            return errors, dict(zip(valid, results))
+
+        try:
+            async with admission.slot(priority):
+                errors, results = await anyio.to_thread.run_sync(_infer_chunk)
+        except AdmissionRejected as e:
+            if start == 0:
+                raise
+            logger.warning(f"  Batch stopped at image {start}/{len(images)} by admission control: {e.reason}")
+            for index in range(start, len(images)):
+                yield {"index": index, "filename": images[index][0], "model_version": model_version,
+                       "success": False, "error": f"Server busy: {e.reason}", "retry_after": e.retry_after}
+            return
+        except Exception as e:
+            logger.error(f"Batch chunk prediction failed: {e}")
+            errors, results = [str(e)] * len(chunk), {}
+
+        for offset, (filename, _) in enumerate(chunk):
+            item = {"index": start + offset, "filename": filename, "model_version": model_version}
+            if offset in results:
+                raw_result = results[offset]
+                item.update({
+                    "success": True,
+                    "predictions": {
+                        "topk": raw_result["topk"],
+                        "best": raw_result["best"]
+                    }
+                })
+            else:
+                item.update({"success": False, "error": errors[offset]})
+            yield item
@@ -0,0 +1,225 @@
+# app/services/prediction_cache.py
+"""
+Content-addressed cache untuk hasil prediksi.
+
+Key = sha256(image bytes) + versi model, jadi upload ulang foto yang sama
+(retry, kembali ke halaman hasil, dipakai di chat) tidak menjalankan ulang
+forward pass ViT. Upload identik yang datang bersamaan menunggu satu
+inference yang sedang berjalan (single-flight) alih-alih memulai sendiri.
+"""
+import os
+import copy
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+CACHE_ENABLED = os.getenv("PREDICT_CACHE", "1") == "1"
+CACHE_MAX_ENTRIES = int(os.getenv("PREDICT_CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("PREDICT_CACHE_TTL_SECONDS", "3600"))
+CACHE_DIR = os.getenv("PREDICT_CACHE_DIR", "")  # kosong = disk tier nonaktif
+CACHE_DISK_MAX_ENTRIES = int(os.getenv("PREDICT_CACHE_DISK_MAX_ENTRIES", "10000"))
+
+
+class PredictionCache:
+    """LRU + TTL di memory, opsional disk tier, dan single-flight per key"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_seconds: float = CACHE_TTL_SECONDS,
+                 disk_dir: Optional[str] = CACHE_DIR or None,
+                 disk_max_entries: int = CACHE_DISK_MAX_ENTRIES, enabled: bool = CACHE_ENABLED):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_entries = disk_max_entries
+        self.enabled = enabled
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, result)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+
+        # Statistik
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_bytes: bytes, model_version: Optional[str], digest: Optional[str] = None) -> str:
+        """Key = versi model + hash isi gambar (digest sha256 yang sudah dihitung bisa dipakai ulang)"""
+        digest = digest or hashlib.sha256(image_bytes).hexdigest()
+        return f"{model_version or 'unknown'}:{digest}"
+
+    # ---- memory tier -------------------------------------------------
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def _put_memory(self, key: str, result: Dict[str, Any], expires_at: float):
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    # ---- disk tier ---------------------------------------------------
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def _get_disk(self, key: str) -> Optional[tuple]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if entry.get("key") != key or entry.get("expires_at", 0) < time.time():
+            path.unlink(missing_ok=True)
+            return None
+        return entry["expires_at"], entry["result"]
+
+    def _put_disk(self, key: str, result: Dict[str, Any], expires_at: float):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"key": key, "expires_at": expires_at, "result": result}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Prediction cache disk write failed: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        self._disk_writes += 1
+        if self._disk_writes % 100 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Hapus entry disk yang paling lama kalau melebihi batas"""
+        files = sorted(self.disk_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for path in files[:max(0, len(files) - self.disk_max_entries)]:
+            path.unlink(missing_ok=True)
+
+    # ---- public API --------------------------------------------------
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cari di memory lalu disk. Hit dari disk dipromosikan ke memory"""
+        with self._lock:
+            result = self._get_memory(key)
+            if result is not None:
+                self._hits += 1
+                return copy.deepcopy(result)
+
+        entry = self._get_disk(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        with self._lock:
+            self._put_memory(key, result, expires_at)
+            self._disk_hits += 1
+        return copy.deepcopy(result)
+
+    def put(self, key: str, result: Dict[str, Any]):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._put_memory(key, copy.deepcopy(result), expires_at)
+        self._put_disk(key, result, expires_at)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Return hasil dari cache, atau jalankan compute() sekali saja untuk
+        semua caller concurrent dengan key yang sama. Hasil error tidak di-cache.
+        """
+        if not self.enabled:
+            return compute()
+
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            # Cek ulang LRU: leader sebelumnya bisa saja selesai (put lalu
+            # keluar dari _inflight) di antara get() di atas dan lock ini
+            result = self._get_memory(key)
+            if result is not None:
+                self._hits += 1
+                return copy.deepcopy(result)
+            future = self._inflight.get(key)
+            if future is not None:
+                self._coalesced += 1
+                leader = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                self._misses += 1
+                leader = True
+
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = compute()
+            if "error" not in result:
+                self.put(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk_dir:
+            for path in self.disk_dir.glob("*.json"):
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counter hit/miss/coalesce untuk monitoring"""
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses + self._coalesced
+            return {
+                "enabled": self.enabled,
+                "config": {
+                    "max_entries": self.max_entries,
+                    "ttl_seconds": self.ttl_seconds,
+                    "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+                },
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "evictions": self._evictions,
+                "hit_rate": round((self._hits + self._disk_hits + self._coalesced) / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Global instance
+prediction_cache = PredictionCache()
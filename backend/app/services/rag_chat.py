@@ -181,12 +181,12 @@ RESPONSE GUIDELINES:
             }
         }
         
-        logger.info(f"Calling Ollama API for: '{user_message[:50]}...'")
+        logger.debug("Calling Ollama API for: '%.50s...'", user_message)
         response = requests.post(OLLAMA_URL, json=payload, timeout=60)
         
         if response.status_code == 200:
             result = response.json()
-            logger.info("Successfully received response from Ollama")
+            logger.debug("Successfully received response from Ollama")
             return {
                 "success": True,
                 "response": result.get("response", "").strip()
@@ -282,33 +282,34 @@ def generate_response(user_message: str, disease_info: dict = None) -> Dict:
     and intelligent product recommendations
     """
     try:
-        logger.info(f"Processing RAG request: '{user_message}'")
+        logger.debug("Processing RAG request: %r", user_message)
         
         # Step 1: Classify user intent
         intents = IntentClassifier.classify(user_message)
-        logger.info(f"Detected intents: {intents}")
         
         # Step 2: Extract price constraints
         price_limit = PriceExtractor.extract(user_message)
-        if price_limit:
-            logger.info(f"Extracted price limit: Rp {price_limit:,}")
         
         # Step 3: Extract skin conditions
         conditions = ConditionExtractor.extract(user_message)
-        if conditions:
-            logger.info(f"Detected conditions: {conditions}")
+        logger.info("RAG request", extra={
+            "message_chars": len(user_message),
+            "intents": [name for name, active in intents.items() if active],
+            "price_limit": price_limit,
+            "conditions": conditions,
+        })
         
         # Step 4: Determine search strategy
         if intents.get('medical_info') and not intents.get('product_search'):
             # Pure medical info query - no product search needed
-            logger.info("Medical info query detected - minimal product search")
+            logger.debug("Medical info query detected - minimal product search")
             relevant_products = []
         else:
             # Product-related query - perform smart search
             # IMPORTANT: Use ALL products if price filter active to ensure enough cheap options
             top_k = 60 if price_limit else 10  # Search all 60 products when filtering by price
             relevant_products = search_products(user_message, top_k=top_k)
-            logger.info(f"Found {len(relevant_products)} initial products")
+            logger.debug("Found %d initial products", len(relevant_products))
         
         # Step 5: Apply filters
         if price_limit and relevant_products:
@@ -316,7 +317,7 @@ def generate_response(user_message: str, disease_info: dict = None) -> Dict:
             relevant_products = [p for p in relevant_products if p.get('price', 0) <= price_limit]
             # Sort by price (cheapest first) when price filter is active
             relevant_products = sorted(relevant_products, key=lambda x: x.get('price', 0))
-            logger.info(f"Price filter: {original_count} -> {len(relevant_products)} products (sorted by price)")
+            logger.debug("Price filter: %d -> %d products (sorted by price)", original_count, len(relevant_products))
         
         # Filter by conditions if detected
         if conditions and relevant_products:
@@ -328,7 +329,7 @@ def generate_response(user_message: str, disease_info: dict = None) -> Dict:
             
             if filtered:
                 relevant_products = filtered
-                logger.info(f"Condition filter applied: {len(relevant_products)} matching products")
+                logger.debug("Condition filter applied: %d matching products", len(relevant_products))
         
         # Step 6: Build context
         product_context = build_product_context(relevant_products[:10], price_limit, conditions)
@@ -382,7 +383,7 @@ def generate_response(user_message: str, disease_info: dict = None) -> Dict:
         
         # Step 9: Prepare response
         if ollama_result and ollama_result.get("success"):
-            logger.info("Successfully generated Ollama response")
+            logger.debug("Successfully generated Ollama response")
             
             # Return products based on intent
             if intents.get('medical_info') and not intents.get('product_search'):
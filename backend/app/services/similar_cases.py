@@ -0,0 +1,131 @@
+# app/services/similar_cases.py
+"""
+Similar-case retrieval: embedding gambar diambil dari forward pass prediksi
+yang sama (token CLS ViT / layer sebelum classifier Keras, lihat
+SkinDiseaseModel.predict_batch_with_embeddings), lalu dicari kasus
+referensi terdekat di index embedding (app/database/embedding_index.py).
+
+Isi index dari folder gambar berlabel (nama subfolder = label):
+
+    python -m app.services.similar_cases add-folder path/ke/folder [--batch-size 32]
+    python -m app.services.similar_cases train-ivf [--nlist 512]
+    python -m app.services.similar_cases stats
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.database.embedding_index import embedding_index, EmbeddingIndex
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+SIMILAR_CASES_K = int(os.getenv("SIMILAR_CASES_K", "5"))
+SIMILAR_CASES_MAX_K = 50
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+
+def embed_images(model, images: List[bytes]) -> Tuple[List[Optional[Dict[str, Any]]], np.ndarray, List[Optional[str]]]:
+    """
+    Decode + satu forward pass untuk banyak gambar -> (hasil raw per gambar,
+    embedding (N_valid, D), error per gambar). Gambar yang gagal di-decode
+    hasilnya None dan tidak punya baris embedding.
+    """
+    batch, errors = model.preprocess_many(images)
+    valid = [i for i, error in enumerate(errors) if error is None]
+    if not valid:
+        return [None] * len(images), np.zeros((0, 0), dtype=np.float32), errors
+    valid_results, embeddings = model.predict_batch_with_embeddings(batch[valid])
+    results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+    for i, result in zip(valid, valid_results):
+        results[i] = result
+    return results, embeddings, errors
+
+
+def find_similar(model, embedding: np.ndarray, k: int = SIMILAR_CASES_K, mode: str = None,
+                 index: EmbeddingIndex = embedding_index) -> Dict[str, Any]:
+    """k kasus referensi terdekat + waktu search"""
+    started = time.perf_counter()
+    neighbors = index.search(embedding, k=min(max(1, k), SIMILAR_CASES_MAX_K), mode=mode,
+                             embedding_space=model.embedding_space)
+    return {
+        "neighbors": neighbors,
+        "index_size": index.count,
+        "search_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def add_reference_cases(model, items: List[Tuple[bytes, Dict[str, Any]]], batch_size: int = 32,
+                        index: EmbeddingIndex = embedding_index) -> Dict[str, Any]:
+    """
+    Tambah kasus referensi (bytes gambar, record {"label", "case_id", "source"})
+    ke index, per batch. Return case_id yang ditambahkan + error per gambar.
+    """
+    model._ensure_loaded()
+    added, failed = [], []
+    for start in range(0, len(items), batch_size):
+        chunk = items[start:start + batch_size]
+        _, embeddings, errors = embed_images(model, [data for data, _ in chunk])
+        records = [record for (_, record), error in zip(chunk, errors) if error is None]
+        if records:
+            added.extend(index.add(embeddings, records, model.embedding_space))
+        failed.extend(
+            {"source": record.get("source"), "error": error}
+            for (_, record), error in zip(chunk, errors) if error is not None
+        )
+    return {"added": added, "failed": failed, "count": index.count}
+
+
+def _folder_items(folder: Path) -> List[Tuple[bytes, Dict[str, Any]]]:
+    items = []
+    for path in sorted(folder.rglob("*")):
+        if path.suffix.lower() in IMAGE_EXTENSIONS and path.parent != folder:
+            relative = path.relative_to(folder)
+            items.append((path.read_bytes(), {"label": relative.parts[0], "source": str(relative)}))
+    return items
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Index embedding kasus referensi")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add_parser = commands.add_parser("add-folder", help="Tambah gambar dari folder/<label>/*.jpg")
+    add_parser.add_argument("folder", type=Path)
+    add_parser.add_argument("--batch-size", type=int, default=32)
+    train_parser = commands.add_parser("train-ivf", help="Train index approximate (IVF)")
+    train_parser.add_argument("--nlist", type=int, default=None, help="Jumlah list (default sqrt(jumlah vectors))")
+    commands.add_parser("stats")
+    args = parser.parse_args(argv)
+
+    from app.logging_config import setup_logging
+    setup_logging()
+    if args.command == "add-folder":
+        from app.models.ai_model import skin_model
+
+        items = _folder_items(args.folder)
+        if not items:
+            print(f"No labelled images found under {args.folder}/<label>/", file=sys.stderr)
+            return 1
+        started = time.perf_counter()
+        report = add_reference_cases(skin_model, items, batch_size=args.batch_size)
+        print(json.dumps({
+            "added": len(report["added"]),
+            "failed": report["failed"],
+            "count": report["count"],
+            "seconds": round(time.perf_counter() - started, 1),
+        }, indent=2))
+    elif args.command == "train-ivf":
+        print(json.dumps(embedding_index.train_ivf(nlist=args.nlist), indent=2))
+    else:
+        print(json.dumps(embedding_index.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
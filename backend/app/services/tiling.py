@@ -0,0 +1,192 @@
+# app/services/tiling.py
+"""
+Tiled inference untuk foto dermatoskop resolusi tinggi.
+
+Alih-alih memampatkan seluruh foto ke ukuran input model, gambar dipotong
+menjadi tile yang saling overlap pada resolusi asli model (224x224 untuk
+ViT). Semua tile dijalankan dalam satu batched forward pass (dipecah per
+PREDICT_TILE_BATCH_SIZE kalau lebih besar), lalu probabilitas per tile
+digabung:
+
+    max        probabilitas maksimum per kelas di semua tile (dinormalisasi)
+    attention  rata-rata berbobot; bobot tile = softmax(-entropy / suhu), jadi
+               tile yang yakin (lesi) lebih berpengaruh dari tile kulit normal
+
+Budget latency: jumlah tile dibatasi PREDICT_TILE_MAX. Kalau grid pada
+resolusi penuh melebihi batas, gambar di-downscale dulu (JPEG: draft mode
+saat decode) sampai grid muat. Lihat benchmarks/bench_tiling.py.
+"""
+import io
+import os
+import math
+import logging
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+TILED_DEFAULT = os.getenv("PREDICT_TILED", "0") == "1"
+TILE_SIZE = int(os.getenv("PREDICT_TILE_SIZE", "0"))  # 0 = ukuran input model
+TILE_OVERLAP = float(os.getenv("PREDICT_TILE_OVERLAP", "0.25"))
+TILE_MAX = int(os.getenv("PREDICT_TILE_MAX", "16"))
+TILE_BATCH_SIZE = int(os.getenv("PREDICT_TILE_BATCH_SIZE", "16"))
+TILE_POOLING = os.getenv("PREDICT_TILE_POOLING", "attention").lower()
+TILE_ATTENTION_TEMPERATURE = float(os.getenv("PREDICT_TILE_ATTENTION_TEMPERATURE", "0.25"))
+
+POOLING_MODES = ("max", "attention")
+
+
+class TilingConfig:
+    """Parameter tiling untuk satu request (default dari environment)"""
+
+    def __init__(self, tile_size: int = TILE_SIZE, overlap: float = TILE_OVERLAP, max_tiles: int = TILE_MAX,
+                 batch_size: int = TILE_BATCH_SIZE, pooling: str = TILE_POOLING,
+                 temperature: float = TILE_ATTENTION_TEMPERATURE):
+        if pooling not in POOLING_MODES:
+            raise ValueError(f"Unknown tile pooling: {pooling} (choose from {', '.join(POOLING_MODES)})")
+        if not 0.0 <= overlap < 1.0:
+            raise ValueError(f"Tile overlap must be in [0, 1): {overlap}")
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.max_tiles = max(1, max_tiles)
+        self.batch_size = max(1, batch_size)
+        self.pooling = pooling
+        self.temperature = max(1e-3, temperature)
+
+    def signature(self, tile_size: int) -> str:
+        """Bagian cache key: hasil tiling berbeda untuk setiap konfigurasi"""
+        return f"tiled:{tile_size}:{self.overlap}:{self.max_tiles}:{self.pooling}:{self.temperature}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tile_size": self.tile_size or None,
+            "overlap": self.overlap,
+            "max_tiles": self.max_tiles,
+            "batch_size": self.batch_size,
+            "pooling": self.pooling,
+        }
+
+
+def _axis_positions(length: int, tile: int, stride: int) -> List[int]:
+    """Posisi awal tile di satu sumbu; tile terakhir menempel ke tepi gambar"""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - tile) / stride) + 1
+    return [min(i * stride, length - tile) for i in range(count)]
+
+
+def tile_grid(width: int, height: int, tile: int, overlap: float) -> List[Tuple[int, int, int, int]]:
+    """Kotak (x, y, w, h) semua tile yang menutupi gambar width x height"""
+    stride = max(1, int(round(tile * (1.0 - overlap))))
+    boxes = []
+    for y in _axis_positions(height, tile, stride):
+        for x in _axis_positions(width, tile, stride):
+            boxes.append((x, y, min(tile, width), min(tile, height)))
+    return boxes
+
+
+def working_size(width: int, height: int, tile: int, overlap: float, max_tiles: int) -> Tuple[int, int]:
+    """Ukuran gambar (<= asli) yang grid tile-nya muat dalam max_tiles"""
+    scale = 1.0
+    while True:
+        w, h = max(tile, int(width * scale)), max(tile, int(height * scale))
+        if len(tile_grid(w, h, tile, overlap)) <= max_tiles or (w == tile and h == tile):
+            return w, h
+        scale *= 0.9
+
+
+def pool_probabilities(probs: np.ndarray, pooling: str, temperature: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Gabung probabilitas per tile (T, C) -> (probabilitas gambar (C,), bobot tile (T,))"""
+    if pooling == "max":
+        pooled = probs.max(axis=0)
+        weights = (probs == pooled).any(axis=1).astype(np.float32)
+    else:
+        entropy = -(probs * np.log(np.clip(probs, 1e-12, 1.0))).sum(axis=1)
+        logits = -entropy / temperature
+        weights = np.exp(logits - logits.max())
+        pooled = (weights[:, None] * probs).sum(axis=0)
+    weights = weights / weights.sum()
+    return pooled / pooled.sum(), weights
+
+
+def decode_tiles(image_bytes: bytes, tile: int, config: TilingConfig) -> Dict[str, Any]:
+    """Decode gambar ke ukuran kerja lalu potong jadi tile uint8 (T, tile, tile, 3)"""
+    img = Image.open(io.BytesIO(image_bytes))
+    original_width, original_height = img.size
+    width, height = working_size(original_width, original_height, tile, config.overlap, config.max_tiles)
+
+    img.draft("RGB", (width, height))
+    img = img.convert("RGB")
+    if img.size != (width, height):
+        img = img.resize((width, height), Image.Resampling.BILINEAR)
+    array = np.asarray(img, dtype=np.uint8)
+
+    boxes = tile_grid(width, height, tile, config.overlap)
+    tiles = np.zeros((len(boxes), tile, tile, 3), dtype=np.uint8)
+    for i, (x, y, w, h) in enumerate(boxes):
+        tiles[i, :h, :w] = array[y:y + h, x:x + w]
+    return {
+        "tiles": tiles,
+        "boxes": boxes,
+        "original_size": (original_width, original_height),
+        "working_size": (width, height),
+    }
+
+
+def predict_tiled(model, image_bytes: bytes, config: TilingConfig = None) -> Dict[str, Any]:
+    """
+    Prediksi satu gambar dengan tiling. Return hasil raw model (sama seperti
+    predict_bytes) + bagian "tiling" berisi grid dan bounding box tile terbaik
+    (koordinat gambar asli).
+    """
+    config = config or TilingConfig()
+    model._ensure_loaded()
+    tile = config.tile_size or min(model._input_size())
+
+    decoded = decode_tiles(image_bytes, tile, config)
+    tiles = decoded["tiles"]
+    input_size = model._input_size()
+    if (tile, tile) != tuple(input_size):
+        tiles = np.stack([
+            np.asarray(Image.fromarray(t).resize(input_size, Image.Resampling.BILINEAR)) for t in tiles
+        ])
+    tiles = tiles.astype(np.float32) / 255.0
+
+    # Satu forward pass untuk semua tile (dipecah kalau melebihi batch size)
+    probs = np.concatenate([
+        model.model.predict(tiles[start:start + config.batch_size], verbose=0)
+        for start in range(0, len(tiles), config.batch_size)
+    ])
+    # Forward pass gagal (NaN / probabilitas nol) jangan sampai jadi pooled NaN yang ikut di-cache
+    if not np.isfinite(probs).all() or (probs.sum(axis=1) <= 0).any():
+        raise ValueError("Tiled forward pass returned invalid probabilities")
+    pooled, weights = pool_probabilities(probs, config.pooling, config.temperature)
+
+    result = model._format_prediction(pooled)
+    best_class = result["best"]["index"]
+    best_tile = int(np.argmax(probs[:, best_class]))
+    scale_x = decoded["original_size"][0] / decoded["working_size"][0]
+    scale_y = decoded["original_size"][1] / decoded["working_size"][1]
+    x, y, w, h = decoded["boxes"][best_tile]
+    nx = len({box[0] for box in decoded["boxes"]})
+
+    result["tiling"] = {
+        **config.to_dict(),
+        "tile_size": tile,
+        "tiles": len(decoded["boxes"]),
+        "grid": [nx, len(decoded["boxes"]) // nx],
+        "working_size": list(decoded["working_size"]),
+        "best_tile": {
+            "index": best_tile,
+            "box": {
+                "x": int(round(x * scale_x)), "y": int(round(y * scale_y)),
+                "width": int(round(w * scale_x)), "height": int(round(h * scale_y)),
+            },
+            "score": float(probs[best_tile, best_class]),
+            "weight": float(weights[best_tile]),
+        },
+    }
+    return result
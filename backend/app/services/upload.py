@@ -0,0 +1,223 @@
+# app/services/upload.py
+"""
+Ingestion upload gambar untuk /predict dengan memory yang bisa diprediksi.
+
+- Batas byte ditegakkan di stream request (UploadSizeLimitMiddleware):
+  Content-Length di atas batas langsung 413 tanpa membaca body, dan body
+  tanpa Content-Length (chunked) dihitung saat diterima, jadi Starlette
+  berhenti sebelum multipart selesai di-spool ke temp file.
+- Upload dibaca per chunk dengan batas byte (PREDICT_UPLOAD_MAX_BYTES) dan
+  di-hash sha256 sambil dibaca, jadi cache tidak perlu hash ulang.
+- Dimensi gambar dicek dari header (Image.open tidak men-decode pixel)
+  sebelum decode. Gambar di atas PREDICT_IMAGE_MAX_PIXELS di-downscale saat
+  decode (JPEG draft mode: DCT scaling 1/2..1/8) atau ditolak kalau format
+  tidak bisa di-decode di skala kecil / policy = reject.
+- Peak memory per request diperkirakan dari formula (ukuran upload + bitmap
+  hasil decode + tensor input), bukan diukur; dilaporkan di log dan
+  /predict/stats dengan akhiran _estimate.
+"""
+import io
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Tuple
+
+from fastapi import HTTPException
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+UPLOAD_MAX_BYTES = int(os.getenv("PREDICT_UPLOAD_MAX_BYTES", str(15 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("PREDICT_UPLOAD_CHUNK_BYTES", str(256 * 1024)))
+IMAGE_MAX_PIXELS = int(os.getenv("PREDICT_IMAGE_MAX_PIXELS", str(25_000_000)))
+OVERSIZE_POLICY = os.getenv("PREDICT_OVERSIZE_POLICY", "downscale").lower()  # "downscale" atau "reject"
+BATCH_MAX_BYTES = int(os.getenv("PREDICT_BATCH_MAX_BYTES", str(200 * 1024 * 1024)))
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024  # boundary, header part, field form lain
+
+# Bytes per pixel bitmap hasil decode per mode Pillow
+_MODE_BYTES = {"1": 1, "L": 1, "P": 1, "RGB": 3, "YCbCr": 3, "LAB": 3, "HSV": 3,
+               "RGBA": 4, "RGBX": 4, "CMYK": 4, "I": 4, "F": 4, "I;16": 2}
+
+
+class UploadRejected(ValueError):
+    """Upload ditolak sebelum decode (terlalu besar, bukan gambar, dimensi berlebihan)"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware: batas ukuran body POST endpoint upload prediksi, dicek
+    sebelum Starlette mem-parse multipart (yang men-spool seluruh file dulu)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def limit_for(path: str):
+        path = path.rstrip("/")
+        if path.endswith("/predict/batch"):
+            return BATCH_MAX_BYTES + MULTIPART_OVERHEAD_BYTES
+        if path.endswith(("/predict", "/predict/embedding", "/predict/similar", "/predict/jobs")):
+            return UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES
+        return None
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limit_for(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            # Tolak dari header saja, body tidak pernah dibaca
+            upload_stats.record_rejected()
+            await self._reject(send, f"Upload too large ({int(content_length)} > {limit} bytes)")
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Di-raise saat form di-parse; FastAPI meneruskan HTTPException apa adanya
+                    upload_stats.record_rejected()
+                    raise HTTPException(status_code=413, detail=f"Upload too large (> {limit} bytes)")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    async def _reject(send, detail: str):
+        body = json.dumps({"detail": detail}).encode()
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                                (b"connection", b"close")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+async def read_upload(file, max_bytes: int = UPLOAD_MAX_BYTES,
+                      chunk_size: int = UPLOAD_CHUNK_BYTES) -> Tuple[bytes, str]:
+    """Baca UploadFile per chunk dengan batas ukuran -> (bytes, sha256 hex)"""
+    # Starlette sudah tahu ukuran file (multipart di-spool ke temp file): tolak tanpa membaca
+    if getattr(file, "size", None) is not None and file.size > max_bytes:
+        raise UploadRejected(f"Upload too large ({file.size} > {max_bytes} bytes)", 413)
+
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        if len(buffer) + len(chunk) > max_bytes:
+            raise UploadRejected(f"Upload too large (> {max_bytes} bytes)", 413)
+        digest.update(chunk)
+        buffer.extend(chunk)
+
+    if not buffer:
+        raise UploadRejected("Uploaded file is empty", 400)
+    return bytes(buffer), digest.hexdigest()
+
+
+def inspect_image(image_bytes: bytes, target_size: Tuple[int, int],
+                  max_pixels: int = IMAGE_MAX_PIXELS, policy: str = OVERSIZE_POLICY) -> Dict[str, Any]:
+    """
+    Baca header gambar (tanpa decode pixel) dan tentukan ukuran decode.
+    Return info dimensi + perkiraan peak memory (formula); raise UploadRejected kalau
+    gambar tidak boleh di-decode.
+    """
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+    except Image.DecompressionBombError as e:
+        raise UploadRejected(str(e), 413)
+    except Exception as e:
+        raise UploadRejected(f"Unsupported or corrupt image: {e}", 400)
+
+    width, height = img.size
+    image_format = img.format
+    oversize = width * height > max_pixels
+
+    # draft() hanya mengubah konfigurasi decoder (JPEG: skala DCT), belum men-decode
+    img.draft("RGB", tuple(target_size))
+    decode_width, decode_height = img.size
+    downscaled = (decode_width, decode_height) != (width, height)
+
+    if oversize and (policy == "reject" or decode_width * decode_height > max_pixels):
+        raise UploadRejected(
+            f"Image dimensions {width}x{height} exceed limit of {max_pixels} pixels", 413
+        )
+
+    bitmap_bytes = decode_width * decode_height * _MODE_BYTES.get(img.mode, 4)
+    target_width, target_height = target_size
+    peak_bytes = (
+        len(image_bytes)                            # upload
+        + bitmap_bytes                              # hasil decode
+        + decode_width * decode_height * 3          # konversi ke RGB
+        + target_width * target_height * 3          # resize uint8
+        + target_width * target_height * 3 * 4 * 2  # float32 [0,1] + pixel values ViT
+    )
+    return {
+        "format": image_format,
+        "width": width,
+        "height": height,
+        "decode_width": decode_width,
+        "decode_height": decode_height,
+        "downscaled_on_decode": downscaled,
+        "peak_bytes_estimate": peak_bytes,
+    }
+
+
+class UploadStats:
+    """Counter ingestion untuk /predict/stats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._accepted = 0
+        self._rejected = 0
+        self._downscaled = 0
+        self._total_bytes = 0
+        self._total_peak = 0
+        self._max_peak = 0
+
+    def record(self, info: Dict[str, Any], upload_bytes: int):
+        with self._lock:
+            self._accepted += 1
+            self._downscaled += int(info["downscaled_on_decode"])
+            self._total_bytes += upload_bytes
+            self._total_peak += info["peak_bytes_estimate"]
+            self._max_peak = max(self._max_peak, info["peak_bytes_estimate"])
+
+    def record_rejected(self):
+        with self._lock:
+            self._rejected += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "config": {
+                    "max_bytes": UPLOAD_MAX_BYTES,
+                    "batch_max_bytes": BATCH_MAX_BYTES,
+                    "chunk_bytes": UPLOAD_CHUNK_BYTES,
+                    "max_pixels": IMAGE_MAX_PIXELS,
+                    "oversize_policy": OVERSIZE_POLICY,
+                },
+                "accepted": self._accepted,
+                "rejected": self._rejected,
+                "downscaled_on_decode": self._downscaled,
+                "avg_upload_bytes": self._total_bytes // self._accepted if self._accepted else 0,
+                "avg_peak_bytes_estimate": self._total_peak // self._accepted if self._accepted else 0,
+                "max_peak_bytes_estimate": self._max_peak,
+            }
+
+
+# Global instance
+upload_stats = UploadStats()
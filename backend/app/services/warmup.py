@@ -0,0 +1,101 @@
+# app/services/warmup.py
+"""
+Background model loading + warm-up saat startup.
+
+Dengan MODEL_EAGER_LOAD=1, lifespan menjalankan _ensure_loaded dan beberapa
+forward pass sintetis di background thread, jadi request /predict pertama
+setelah deploy tidak menanggung seluruh proses load. Endpoint /ready
+mengembalikan 503 sampai warm-up selesai.
+
+Dengan INFERENCE_MODE=process warm-up selalu jalan (apa pun MODEL_EAGER_LOAD):
+di sini pool di-start, dan worker yang me-load + warm-up model. Proses API
+sendiri tidak me-load model (kecuali start method fork).
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List
+
+import anyio
+
+from app.models.ai_model import skin_model
+from app.services.batching import batcher
+from app.services.inference_pool import inference_pool
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi (bisa di-override lewat environment variable)
+EAGER_LOAD = os.getenv("MODEL_EAGER_LOAD", "0") == "1"
+WARMUP_ITERATIONS = int(os.getenv("MODEL_WARMUP_ITERATIONS", "2"))
+
+
+def warmup_batch_sizes() -> List[int]:
+    """Batch size yang di-warm-up: dari env, default 1 + ukuran batch maksimal batcher"""
+    configured = os.getenv("MODEL_WARMUP_BATCH_SIZES", "")
+    if configured:
+        return sorted({int(size) for size in configured.split(",") if size.strip()})
+    return sorted({1, batcher.max_batch_size})
+
+
+class WarmupState:
+    """Status warm-up: lazy -> loading -> warming -> ready (atau failed)"""
+
+    def __init__(self):
+        self.status = "pending" if EAGER_LOAD or inference_pool.enabled else "lazy"
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        # Mode lazy: model di-load saat request pertama, service dianggap siap
+        return self.status in ("lazy", "ready")
+
+    def _set(self, status: str, error: str = None):
+        with self._lock:
+            self.status = status
+            self.error = error
+
+    def run(self, batch_sizes: List[int] = None, iterations: int = WARMUP_ITERATIONS):
+        """Load model + warm-up (blocking - jalankan di thread)"""
+        batch_sizes = batch_sizes or warmup_batch_sizes()
+        self.started_at = time.time()
+        try:
+            if inference_pool.enabled:
+                # Mode process: worker me-load (snapshot mmap) dan warm-up sendiri
+                self._set("warming")
+                inference_pool.start(batch_sizes)
+            else:
+                self._set("loading")
+                skin_model._ensure_loaded()
+                self._set("warming")
+                skin_model.warm_up(batch_sizes, iterations)
+
+            self._set("ready")
+            logger.info(f" Model ready in {time.time() - self.started_at:.1f}s")
+        except Exception as e:
+            logger.error(f" Background model warm-up failed: {e}")
+            self._set("failed", str(e))
+        finally:
+            self.finished_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "status": self.status,
+                "error": self.error,
+                "elapsed_seconds": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None,
+                "stage_timings": dict(skin_model.stage_timings),
+            }
+
+
+# Global instance
+warmup_state = WarmupState()
+
+
+async def run_background_warmup():
+    """Dipanggil dari lifespan sebagai background task"""
+    await anyio.to_thread.run_sync(warmup_state.run)
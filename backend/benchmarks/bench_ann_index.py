@@ -0,0 +1,191 @@
+# benchmarks/bench_ann_index.py
+"""
+Recall@k dan QPS index ANN (app/database/ann_index.py) dibanding exact search
+(satu matrix-vector product + argpartition atas semua vector).
+
+Per backend: build (add + train), save, load (memmap), lalu sweep knob
+effort (IVF: nprobe, HNSW: ef_search). Baris "+churn" mengukur ulang di
+effort default setelah 1% vector dihapus dan 1% vector baru ditambahkan
+tanpa save/train ulang (delta + tombstone), terhadap ground truth baru.
+
+Data default: vector sintetis L2-normalized berkelompok (campuran Gaussian,
+dim 384 seperti MiniLM) - query adalah titik baru dari distribusi yang sama.
+Pakai --vectors file.npy untuk embedding asli (mis. vectors.f32 dari
+VectorCache yang disimpan dengan np.save). HNSW dilewati kalau hnswlib tidak
+terpasang. Jalankan dari folder backend:
+
+    python -m benchmarks.bench_ann_index [--count 100000] [--backends ivf,hnsw] [--json hasil.json]
+"""
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.database.ann_index import create_index, load_index, IVF_NPROBE, HNSW_EF_SEARCH
+from app.database.embedding_index import top_k
+from app.database.vector_cache import content_key
+
+EFFORTS = {"ivf": [1, 2, 4, 8, 16, 32, 64], "hnsw": [16, 32, 64, 128, 256]}
+DEFAULT_EFFORT = {"ivf": IVF_NPROBE, "hnsw": HNSW_EF_SEARCH}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def make_vectors(count: int, dim: int, queries: int, clusters: int, spread: float, seed: int = 0):
+    """Cluster saling tumpang tindih (spread > 1), jadi tetangga terdekat sering ada di list IVF lain"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    points = centers[rng.integers(0, clusters, count + queries)] + spread * rng.normal(size=(count + queries, dim))
+    points = _normalize(points)
+    return points[:count], points[count:]
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[np.ndarray]:
+    return [top_k(vectors @ query, k) for query in queries]
+
+
+def _recall(found: List[List[int]], truth: List[np.ndarray]) -> float:
+    return float(np.mean([len(set(f) & set(t.tolist())) / len(t) for f, t in zip(found, truth)]))
+
+
+def _run_queries(index, queries: np.ndarray, k: int, effort: int, rows: Dict[bytes, int]):
+    index.search(queries[0], k, effort)  # warm-up
+    found, samples = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = index.search(query, k, effort)
+        samples.append(time.perf_counter() - started)
+        found.append([rows[key] for key, _ in hits])
+    return found, np.array(samples)
+
+
+def _row(backend: str, effort, recall: float, samples: np.ndarray) -> Dict[str, Any]:
+    return {
+        "backend": backend,
+        "effort": effort,
+        "recall": round(recall, 4),
+        "qps": round(len(samples) / float(samples.sum()), 1),
+        "median_ms": round(float(np.median(samples)) * 1000, 3),
+        "p90_ms": round(float(np.percentile(samples, 90)) * 1000, 3),
+    }
+
+
+def bench_backend(backend: str, vectors: np.ndarray, queries: np.ndarray, truth: List[np.ndarray],
+                  k: int, work_dir: Path, seed: int = 0) -> Dict[str, Any]:
+    keys = [content_key(str(i)) for i in range(len(vectors))]
+    rows = {key: i for i, key in enumerate(keys)}
+
+    started = time.perf_counter()
+    index = create_index(backend, vectors.shape[1])
+    index.add(keys, vectors)
+    if index.needs_training():
+        index.train()
+    build_s = time.perf_counter() - started
+    directory = work_dir / backend
+    started = time.perf_counter()
+    index.save(directory)
+    save_s = time.perf_counter() - started
+    started = time.perf_counter()
+    index = load_index(directory, backend)
+    load_s = time.perf_counter() - started
+
+    results = []
+    for effort in EFFORTS[backend]:
+        found, samples = _run_queries(index, queries, k, effort, rows)
+        results.append(_row(backend, effort, _recall(found, truth), samples))
+
+    # churn: hapus 1%, tambah 1% vector baru (key baru), tanpa train/save
+    rng = np.random.default_rng(seed + 1)
+    churn = max(1, len(vectors) // 100)
+    removed = rng.choice(len(vectors), size=churn, replace=False)
+    index.remove([keys[i] for i in removed])
+    extra = _normalize(vectors[rng.choice(len(vectors), size=churn)] + 0.05 * rng.normal(size=(churn, vectors.shape[1])))
+    extra_keys = [content_key(f"new-{i}") for i in range(churn)]
+    index.add(extra_keys, extra)
+    alive = np.ones(len(vectors), dtype=bool)
+    alive[removed] = False
+    live_rows = np.flatnonzero(alive)
+    merged = np.concatenate([vectors[live_rows], extra])
+    merged_rows = {keys[i]: j for j, i in enumerate(live_rows)}
+    merged_rows.update((key, len(live_rows) + j) for j, key in enumerate(extra_keys))
+    found, samples = _run_queries(index, queries, k, DEFAULT_EFFORT[backend], merged_rows)
+    results.append(_row(f"{backend}+churn", DEFAULT_EFFORT[backend],
+                        _recall(found, exact_top_k(merged, queries, k)), samples))
+
+    return {
+        "backend": backend,
+        "build_s": round(build_s, 2),
+        "save_s": round(save_s, 2),
+        "load_ms": round(load_s * 1000, 1),
+        "stats": index.stats(),
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall@k dan QPS index ANN vs exact search")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--spread", type=float, default=1.5, help="Noise per dimensi relatif ke centroid")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backends", default="ivf,hnsw")
+    parser.add_argument("--vectors", type=str, help="File .npy (N, D) embedding asli; query = baris terakhir")
+    parser.add_argument("--json", type=str, help="Simpan hasil ke file JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.vectors:
+        data = _normalize(np.load(args.vectors))
+        vectors, queries = data[:-args.queries], data[-args.queries:]
+    else:
+        vectors, queries = make_vectors(args.count, args.dim, args.queries, args.clusters, args.spread)
+
+    truth = exact_top_k(vectors, queries, args.k)
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        top_k(vectors @ query, args.k)
+        samples.append(time.perf_counter() - started)
+    results = [_row("exact", "-", 1.0, np.array(samples))]
+    backends = []
+    with tempfile.TemporaryDirectory(prefix="bench-ann-") as tmp:
+        for backend in [b for b in args.backends.split(",") if b]:
+            try:
+                report = bench_backend(backend, vectors, queries, truth, args.k, Path(tmp))
+            except RuntimeError as e:  # backend opsional yang tidak terpasang
+                print(f"skip {backend}: {e}")
+                continue
+            backends.append({key: value for key, value in report.items() if key != "results"})
+            results += report["results"]
+
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    for report in backends:
+        print(f"{report['backend']}: build {report['build_s']}s, save {report['save_s']}s, "
+              f"load {report['load_ms']} ms (memmap={report['stats']['memmap']})")
+    print(f"{'backend':>11} {'effort':>7} {'recall@' + str(args.k):>10} {'qps':>9} {'median_ms':>10} {'p90_ms':>8}")
+    for row in results:
+        print(f"{row['backend']:>11} {str(row['effort']):>7} {row['recall']:>10.4f} {row['qps']:>9.1f} "
+              f"{row['median_ms']:>10.3f} {row['p90_ms']:>8.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "meta": {"python": platform.python_version(), "numpy": np.__version__, "count": len(vectors),
+                         "dim": int(vectors.shape[1]), "queries": len(queries), "k": args.k},
+                "backends": backends,
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/bench_compiled.py
+"""
+Latency forward pass: jalur eager sekarang vs eksekusi terkompilasi
+(app/models/compiled.py) untuk setiap backend dan batch size.
+
+    pytorch*   eager (nn.Module) vs trace (TorchScript) vs compile (torch.compile)
+    keras      eager (model.predict) vs trace (panggilan langsung / tf.function)
+
+Kompilasi dilakukan lewat warm_up() seperti di server, untuk batch size di
+--batch-sizes. Batch size di --extra-sizes tidak dikompilasi dan mengukur
+biaya padding ke batch size terkompilasi terdekat. Kolom max_diff adalah
+selisih probabilitas maksimum terhadap eager. Jalankan dari folder backend:
+
+    python -m benchmarks.bench_compiled [--backends pytorch,keras] [--json hasil.json]
+"""
+import sys
+import json
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.bench_inference import _setup_environment, _metadata, _time, load_backend
+
+BACKENDS = ["pytorch", "pytorch-int8", "pytorch-bf16", "keras"]
+EXECUTIONS = {"keras": ["eager", "trace"]}
+DEFAULT_EXECUTIONS = ["eager", "trace", "compile"]
+BATCH_SIZES = [1, 8]
+EXTRA_SIZES = [3]
+
+
+def bench_backend(backend: str, batch_sizes: List[int], extra_sizes: List[int],
+                  repeat: int, work_dir: Path, executions: List[str]) -> List[Dict[str, Any]]:
+    rows = []
+    rng = np.random.default_rng(0)
+    inputs = {size: rng.random((size, 224, 224, 3), dtype=np.float32) for size in batch_sizes + extra_sizes}
+    reference = {}
+    for execution in executions:
+        try:
+            model = load_backend(backend, work_dir, execution)
+            model.warm_up(batch_sizes, iterations=1)
+        except Exception as e:
+            print(f"skip {backend}/{execution}: {e}", file=sys.stderr)
+            rows.append({"backend": backend, "execution": execution, "skipped": str(e)})
+            continue
+        if execution != "eager" and not model.compiled_batch_sizes:
+            rows.append({"backend": backend, "execution": execution, "skipped": "compilation failed"})
+            continue
+
+        compile_seconds = sum(v for k, v in model.stage_timings.items() if k.startswith("compile."))
+        for size, batch in inputs.items():
+            probs = model.model.predict(batch, verbose=0)
+            if execution == "eager":
+                reference[size] = probs
+            timing = _time(lambda: model.model.predict(batch, verbose=0), repeat)
+            rows.append({
+                "backend": backend,
+                "execution": execution,
+                "batch_size": size,
+                "compiled": size in model.compiled_batch_sizes,
+                "compile_seconds": round(compile_seconds, 3),
+                "max_diff": float(np.abs(probs - reference[size]).max()) if size in reference else None,
+                **timing,
+            })
+    return rows
+
+
+def print_table(rows: List[Dict[str, Any]]):
+    eager = {(r["backend"], r["batch_size"]): r["median_ms"] for r in rows
+             if r.get("execution") == "eager" and "median_ms" in r}
+    print(f"{'backend':<13} {'execution':<9} {'batch':>5} {'compiled':>8} {'median_ms':>10} "
+          f"{'p90_ms':>9} {'speedup':>8} {'max_diff':>9} {'compile_s':>9}")
+    for row in rows:
+        if "median_ms" not in row:
+            print(f"{row['backend']:<13} {row['execution']:<9} skipped: {row['skipped'][:80]}")
+            continue
+        baseline = eager.get((row["backend"], row["batch_size"]))
+        speedup = f"{baseline / row['median_ms']:.2f}x" if baseline else "-"
+        diff = f"{row['max_diff']:.1e}" if row["max_diff"] is not None else "-"
+        print(f"{row['backend']:<13} {row['execution']:<9} {row['batch_size']:>5} {str(row['compiled']):>8} "
+              f"{row['median_ms']:>10.2f} {row['p90_ms']:>9.2f} {speedup:>8} {diff:>9} {row['compile_seconds']:>9.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency eager vs compiled execution")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help=f"Subset dari {','.join(BACKENDS)}")
+    parser.add_argument("--executions", default=",".join(DEFAULT_EXECUTIONS))
+    parser.add_argument("--batch-sizes", default=",".join(str(b) for b in BATCH_SIZES),
+                        help="Batch size yang dikompilasi saat warm-up")
+    parser.add_argument("--extra-sizes", default=",".join(str(b) for b in EXTRA_SIZES),
+                        help="Batch size tambahan yang tidak dikompilasi (di-pad)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", type=str, help="Simpan hasil ke file JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b]
+    extra_sizes = [int(b) for b in args.extra_sizes.split(",") if b and int(b) not in batch_sizes]
+    requested = [e for e in args.executions.split(",") if e]
+    if "eager" not in requested:
+        requested.insert(0, "eager")  # baseline untuk speedup dan max_diff
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench-compiled-") as tmp:
+        work_dir = Path(tmp)
+        _setup_environment(work_dir)
+        for backend in [b for b in args.backends.split(",") if b]:
+            executions = [e for e in requested if e in EXECUTIONS.get(backend, DEFAULT_EXECUTIONS)]
+            rows.extend(bench_backend(backend, batch_sizes, extra_sizes, args.repeat, work_dir, executions))
+
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": _metadata(args.repeat), "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/bench_hybrid_search.py
+"""
+Biaya pencarian produk hybrid (BM25 + sentence-embedding lokal + RRF).
+
+Per ukuran katalog:
+
+    embed_cold   embedding seluruh katalog ke VectorCache kosong
+    embed_warm   proses/worker baru: katalog yang sama, semua dari cache di disk
+    lexical      search_lexical_ids
+    semantic     search_semantic_ids (query dari LRU)
+    hybrid       search_hybrid_ids: lexical di thread pool + semantic bersamaan
+    query_miss   embedding query baru (LRU miss) / query_hit dari LRU
+
+Tanpa --model-dir dipakai encoder BERT mini (benchmarks/standin_models.py),
+jadi angka embed/query_miss hanya berguna relatif; dengan --model-dir folder
+hasil `python -m app.models.text_embedding download`. Jalankan dari folder
+backend:
+
+    python -m benchmarks.bench_hybrid_search [--sizes 60,10000] [--model-dir path] [--json hasil.json]
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+
+SIZES = [60, 10000]
+
+
+def _ms(fn, repeat: int = 1) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(float(np.median(samples)) * 1000, 3)
+
+
+def bench_size(size: int, model_dir: Path, repeat: int) -> Dict[str, Any]:
+    from app.database.vector_db import ProductIndex
+    from app.models.text_embedding import TextEmbeddingModel
+    from benchmarks.bench_product_search import make_catalog, QUERIES
+
+    catalog = make_catalog(size)
+
+    def _index():
+        index = ProductIndex(loader=lambda: catalog, version=lambda: ("bench", size),
+                             text_model=TextEmbeddingModel(model_dir))
+        index.search("", 1)  # build dense + BM25
+        index.text_model._ensure_loaded()
+        return index
+
+    cold = _index()
+    embed_cold = _ms(lambda: cold.search_semantic_ids(QUERIES[0], 3))
+    warm = _index()
+    embed_warm = _ms(lambda: warm.search_semantic_ids(QUERIES[0], 3))
+
+    for query in QUERIES:
+        warm.search_hybrid_ids(query, 3)  # isi LRU + warm-up thread pool
+    row = {
+        "products": size,
+        "embed_cold_ms": embed_cold,
+        "embed_warm_ms": embed_warm,
+        "lexical_ms": _ms(lambda: [warm.search_lexical_ids(q, 50) for q in QUERIES], repeat) / len(QUERIES),
+        "semantic_ms": _ms(lambda: [warm.search_semantic_ids(q, 50) for q in QUERIES], repeat) / len(QUERIES),
+        "hybrid_ms": _ms(lambda: [warm.search_hybrid_ids(q, 3) for q in QUERIES], repeat) / len(QUERIES),
+        "query_hit_ms": _ms(lambda: warm.text_model.embed_query(QUERIES[0]), repeat),
+    }
+    counter = iter(range(10 ** 9))
+    row["query_miss_ms"] = _ms(lambda: warm.text_model.embed_query(f"{QUERIES[1]} {next(counter)}"), repeat)
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency pencarian produk hybrid")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES))
+    parser.add_argument("--model-dir", type=Path, default=None, help="Folder model text embedding (default: stand-in)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", type=str, help="Simpan hasil ke file JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix="bench-hybrid-") as tmp:
+        work_dir = Path(tmp)
+        os.environ["VECTOR_CACHE_DIR"] = str(work_dir / "cache")  # sebelum modul app di-import
+        model_dir = args.model_dir
+        if model_dir is None:
+            from app.database.products_data import PRODUCTS
+            from app.database.vector_db import semantic_product_text
+            from benchmarks.standin_models import write_text_encoder
+
+            model_dir = write_text_encoder(work_dir / "model", [semantic_product_text(p) for p in PRODUCTS])
+        rows = [bench_size(int(s), model_dir, args.repeat) for s in args.sizes.split(",") if s]
+
+    columns = ["products", "embed_cold_ms", "embed_warm_ms", "lexical_ms", "semantic_ms", "hybrid_ms",
+               "query_miss_ms", "query_hit_ms"]
+    print(" ".join(f"{c:>13}" for c in columns))
+    for row in rows:
+        print(" ".join(f"{row[c]:>13.3f}" if isinstance(row[c], float) else f"{row[c]:>13}" for c in columns))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": {"model_dir": str(args.model_dir or "standin"), "cpu_count": os.cpu_count()},
+                       "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
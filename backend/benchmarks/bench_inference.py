@@ -0,0 +1,251 @@
+# benchmarks/bench_inference.py
+"""
+Benchmark per tahap untuk jalur inference /predict:
+
+    upload_read      read_upload (chunked read + sha256)
+    header_check     inspect_image (dimensi dari header)
+    preprocess       _preprocess / preprocess_many
+    forward          model.predict (forward pass backend)
+    postprocess      _format_prediction (top-k)
+    format_response  format_response di predict_disease
+
+Dijalankan untuk batch tunggal dan batch, beberapa ukuran + format gambar,
+dan semua backend yang bisa di-load SkinDiseaseModel. Model yang dipakai
+adalah stand-in kecil yang dibuat lokal (benchmarks/standin_models.py), jadi
+tidak butuh network atau weights asli. Jalankan dari folder backend:
+
+    python -m benchmarks.bench_inference [--repeat 5] [--json hasil.json] [--compare sebelum.json]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+BACKENDS = ["pytorch", "pytorch-int8", "pytorch-bf16", "onnx", "keras"]
+IMAGE_SIZES = [(640, 480), (2000, 1500), (4000, 3000)]
+FORMATS = ["JPEG", "PNG"]
+BATCH_SIZES = [1, 8]
+STAGES = ["upload_read", "header_check", "preprocess", "forward", "postprocess", "format_response"]
+
+
+def _setup_environment(work_dir: Path):
+    """
+    Semua lokasi model di folder sementara dan tanpa akses Hugging Face Hub.
+    Harus dipanggil sebelum modul app di-import (konfigurasi dibaca saat import).
+    """
+    os.environ["SKIN_MODEL_OFFLINE"] = "1"
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["ONNX_EXPORT_DIR"] = str(work_dir / "onnx")
+    os.environ.setdefault("KERAS_BACKEND", "torch")
+
+
+def load_backend(backend: str, work_dir: Path, execution: str = "eager"):
+    """SkinDiseaseModel yang sudah di-load dengan stand-in model untuk backend ini"""
+    from app.models.ai_model import SkinDiseaseModel, cpu_supports_bf16
+    from benchmarks.standin_models import write_vit_snapshot, write_keras_model
+
+    model = SkinDiseaseModel()
+    model.requested_precision = "fp32"
+    model.execution = execution
+    if backend == "keras":
+        model.snapshot_dir = work_dir / "no-snapshots"
+        model.weights_dir = work_dir / "keras"
+        if not (model.weights_dir / "skin_model.keras").exists():
+            write_keras_model(model.weights_dir)
+    else:
+        model.snapshot_dir = work_dir / "snapshots"
+        model.weights_dir = work_dir / "no-weights"
+        if not (model.snapshot_dir / "CURRENT").exists():
+            write_vit_snapshot(model.snapshot_dir)
+        model.backend = "onnx" if backend == "onnx" else "pytorch"
+
+    model._ensure_loaded()
+    expected = {"pytorch": "pytorch", "pytorch-int8": "pytorch", "pytorch-bf16": "pytorch",
+                "onnx": "onnx", "keras": "keras"}[backend]
+    if model.active_backend != expected:
+        raise RuntimeError(f"loaded {model.active_backend} instead of {expected}")
+
+    if backend == "pytorch-bf16" and not cpu_supports_bf16():
+        raise RuntimeError("CPU has no native bf16 support")
+    if backend in ("pytorch-int8", "pytorch-bf16"):
+        # Stand-in berweights random: accuracy gate tidak bermakna di sini
+        model.set_precision(backend.split("-")[1], min_agreement=0.0)
+    return model
+
+
+class _BytesUpload:
+    """UploadFile minimal (async read per chunk) di atas bytes"""
+
+    def __init__(self, data: bytes):
+        self._data = data
+        self._offset = 0
+        self.size = len(data)
+
+    async def read(self, size: int = -1) -> bytes:
+        end = len(self._data) if size < 0 else self._offset + size
+        chunk = self._data[self._offset:end]
+        self._offset += len(chunk)
+        return chunk
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples = np.array(samples) * 1000
+    return {"median_ms": round(float(np.median(samples)), 3), "p90_ms": round(float(np.percentile(samples, 90)), 3)}
+
+
+def bench_case(model, image_bytes: bytes, batch_size: int, repeat: int, loop) -> Dict[str, Dict[str, float]]:
+    """Waktu tiap tahap untuk satu kombinasi backend/gambar/batch size"""
+    from app.services.upload import read_upload, inspect_image
+    from app.services.prediction import format_response
+
+    images = [image_bytes] * batch_size
+    target_size = model._input_size()
+    batch = model.preprocess_many(images)[0] if batch_size > 1 else model._preprocess(image_bytes)
+    probs = model.model.predict(batch, verbose=0)
+    raw_results = [model._format_prediction(row) for row in probs]
+
+    def upload_read():
+        for data in images:
+            loop.run_until_complete(read_upload(_BytesUpload(data), max_bytes=len(data)))
+
+    def preprocess():
+        if batch_size > 1:
+            model.preprocess_many(images)
+        else:
+            model._preprocess(image_bytes)
+
+    stages = {
+        "upload_read": upload_read,
+        "header_check": lambda: [inspect_image(data, target_size) for data in images],
+        "preprocess": preprocess,
+        "forward": lambda: model.model.predict(batch, verbose=0),
+        "postprocess": lambda: [model._format_prediction(row) for row in probs],
+        "format_response": lambda: [format_response(result) for result in raw_results],
+    }
+    return {name: _time(stages[name], repeat) for name in STAGES}
+
+
+def run(backends: List[str], sizes, formats: List[str], batch_sizes: List[int],
+        repeat: int, work_dir: Path) -> List[Dict[str, Any]]:
+    from benchmarks.bench_preprocess import make_image
+
+    loop = asyncio.new_event_loop()
+    results = []
+    for backend in backends:
+        try:
+            model = load_backend(backend, work_dir)
+        except Exception as e:
+            print(f"skip {backend}: {e}", file=sys.stderr)
+            results.append({"backend": backend, "skipped": str(e)})
+            continue
+
+        for fmt in formats:
+            for size in sizes:
+                image_bytes = make_image(size, fmt)
+                for batch_size in batch_sizes:
+                    stages = bench_case(model, image_bytes, batch_size, repeat, loop)
+                    total = sum(stage["median_ms"] for stage in stages.values())
+                    results.append({
+                        "backend": backend,
+                        "model_version": model.model_version,
+                        "format": fmt,
+                        "size": f"{size[0]}x{size[1]}",
+                        "bytes": len(image_bytes),
+                        "batch_size": batch_size,
+                        "stages": stages,
+                        "total_ms": round(total, 3),
+                        "per_image_ms": round(total / batch_size, 3),
+                    })
+    loop.close()
+    return results
+
+
+def _metadata(repeat: int) -> Dict[str, Any]:
+    meta = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+    }
+    try:
+        import torch
+        meta["torch"] = torch.__version__
+        meta["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return meta
+
+
+def _case_key(row: Dict[str, Any]) -> tuple:
+    return row["backend"], row.get("format"), row.get("size"), row.get("batch_size")
+
+
+def print_table(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]] = None):
+    previous = {_case_key(row): row for row in baseline or [] if "stages" in row}
+    header = f"{'backend':<13} {'fmt':<5} {'size':>10} {'batch':>5} " + " ".join(f"{s[:11]:>11}" for s in STAGES)
+    print(header + f" {'total':>9}" + (f" {'delta':>8}" if baseline else ""))
+    for row in results:
+        if "stages" not in row:
+            continue
+        line = (f"{row['backend']:<13} {row['format']:<5} {row['size']:>10} {row['batch_size']:>5} "
+                + " ".join(f"{row['stages'][s]['median_ms']:>11.2f}" for s in STAGES)
+                + f" {row['total_ms']:>9.2f}")
+        before = previous.get(_case_key(row))
+        if before:
+            line += f" {100 * (row['total_ms'] - before['total_ms']) / before['total_ms']:>+7.1f}%"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark per tahap jalur inference /predict")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help=f"Subset dari {','.join(BACKENDS)}")
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--sizes", default=",".join(f"{w}x{h}" for w, h in IMAGE_SIZES))
+    parser.add_argument("--batch-sizes", default=",".join(str(b) for b in BATCH_SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", type=str, help="Simpan hasil ke file JSON")
+    parser.add_argument("--compare", type=str, help="File JSON hasil sebelumnya untuk dibandingkan")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix="bench-inference-") as tmp:
+        work_dir = Path(tmp)
+        _setup_environment(work_dir)
+        results = run(
+            backends=[b for b in args.backends.split(",") if b],
+            sizes=[tuple(int(v) for v in size.split("x")) for size in args.sizes.split(",") if size],
+            formats=[f.upper() for f in args.formats.split(",") if f],
+            batch_sizes=[int(b) for b in args.batch_sizes.split(",") if b],
+            repeat=args.repeat,
+            work_dir=work_dir,
+        )
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": _metadata(args.repeat), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
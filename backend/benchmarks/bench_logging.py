@@ -0,0 +1,189 @@
+# benchmarks/bench_logging.py
+"""
+Overhead logging per request di jalur /predict dan /chat:
+
+    legacy           pola lama: basicConfig (StreamHandler sinkron), f-string
+                     eager di level INFO termasuk dict hasil raw + response
+    current          app/logging_config.py: queue handler, argumen lazy,
+                     dict hasil hanya di DEBUG, field terstruktur lewat extra
+    current-json     sama, LOG_FORMAT=json
+    current-sampled  sama, LOG_SAMPLING untuk logger per-request (1 dari 10)
+
+Baris log setiap skenario meniru urutan log satu request (route ->
+forward pass -> format_response -> route). caller_us = waktu di thread
+request, cpu_us = CPU proses termasuk thread listener yang memformat dan
+menulis (output ke /dev/null). Antrian tidak dibatasi supaya tidak ada record
+yang dibuang karena antrian penuh. Jalankan dari folder backend:
+
+    python -m benchmarks.bench_logging [--requests 20000] [--json hasil.json]
+"""
+import os
+import io
+import json
+import time
+import logging
+import argparse
+import platform
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from app.logging_config import setup_logging, shutdown_logging, logging_stats
+
+ROUTE = logging.getLogger("app.routes.predict")
+MODEL = logging.getLogger("app.models.ai_model")
+PREDICTION = logging.getLogger("app.services.prediction")
+CHAT = logging.getLogger("app.routes.chat")
+RAG = logging.getLogger("app.services.rag_chat")
+
+RAW_RESULT = {
+    "topk": [{"index": i, "label": label, "score": score} for i, (label, score) in
+             enumerate([("Nevus", 0.81), ("Seborrheic Keratosis", 0.12), ("Dermatofibroma", 0.04)])],
+    "best": {"index": 0, "label": "Nevus", "score": 0.81},
+    "model_status": "saved_model",
+    "note": "Using trained model",
+}
+RESPONSE = {
+    "success": True,
+    "predictions": {"topk": RAW_RESULT["topk"], "best": RAW_RESULT["best"]},
+    "model_info": {"status": "saved_model", "type": "skin_disease_detector", "version": "hf:0xnu/skincare-detection"},
+    "message": "Analysis completed successfully",
+    "note": "Using trained model",
+}
+IMAGE_INFO = {"width": 4000, "height": 3000, "decode_width": 500, "decode_height": 375,
+              "peak_bytes_estimate": 4_300_000}
+PROBS = np.random.default_rng(0).random((1, 8), dtype=np.float32)
+CHAT_MESSAGE = "serum niacinamide untuk pori besar di bawah 100 ribu yang cocok untuk kulit berminyak"
+INTENTS = {"product_search": True, "medical_info": False, "comparison": False, "routine": False}
+
+
+def legacy_request():
+    """Urutan log satu request /predict + /chat sebelum perubahan (disalin dari kode lama)"""
+    contents_len, filename, image_info = 512_000, "foto.jpg", IMAGE_INFO
+    ROUTE.info(
+        f" Processing image: {filename} ({contents_len} bytes, "
+        f"{image_info['width']}x{image_info['height']} -> decode {image_info['decode_width']}x{image_info['decode_height']}, "
+        f"peak ~{image_info['peak_bytes_estimate'] / (1024 ** 2):.1f} MB)"
+    )
+    MODEL.info(f" PyTorch prediction successful: shape={PROBS.shape}, max_prob={PROBS.max():.4f}")
+    PREDICTION.info(f"Raw prediction result: {RAW_RESULT}")
+    PREDICTION.info(f"Formatted response: {RESPONSE}")
+    ROUTE.info(f" Prediction successful: {RESPONSE['predictions']['best']['label']} ({RESPONSE['predictions']['best']['score']:.2%})")
+
+    CHAT.info(f"Chat request: {CHAT_MESSAGE}")
+    CHAT.info(f"Disease info: {None}")
+    RAG.info(f"Processing RAG request: '{CHAT_MESSAGE}'")
+    RAG.info(f"Detected intents: {INTENTS}")
+    RAG.info(f"Found {10} initial products")
+    RAG.info("Successfully generated Ollama response")
+    CHAT.info(f"Response generated: {CHAT_MESSAGE[:100]}...")
+    CHAT.info(f"Products recommended: {3} items")
+
+
+def current_request():
+    """Urutan log yang sama dengan statement saat ini"""
+    contents_len, filename, image_info = 512_000, "foto.jpg", IMAGE_INFO
+    ROUTE.info(" Processing image", extra={
+        "upload_filename": filename,
+        "bytes": contents_len,
+        "size": f"{image_info['width']}x{image_info['height']}",
+        "decode": f"{image_info['decode_width']}x{image_info['decode_height']}",
+        "peak_mb": round(image_info['peak_bytes_estimate'] / (1024 ** 2), 1),
+    })
+    if MODEL.isEnabledFor(logging.DEBUG):
+        MODEL.debug(" PyTorch prediction successful: shape=%s, max_prob=%.4f", PROBS.shape, PROBS.max())
+    PREDICTION.debug("Raw prediction result: %s", RAW_RESULT)
+    PREDICTION.debug("Formatted response: %s", RESPONSE)
+    best = RESPONSE['predictions']['best']
+    ROUTE.info(" Prediction successful", extra={"label": best['label'], "score": round(best['score'], 4)})
+
+    CHAT.debug("Chat request: %r (disease info: %s)", CHAT_MESSAGE, None)
+    RAG.debug("Processing RAG request: %r", CHAT_MESSAGE)
+    RAG.info("RAG request", extra={
+        "message_chars": len(CHAT_MESSAGE),
+        "intents": [name for name, active in INTENTS.items() if active],
+        "price_limit": 100000,
+        "conditions": ["berminyak"],
+    })
+    RAG.debug("Found %d initial products", 10)
+    RAG.debug("Successfully generated Ollama response")
+    CHAT.debug("Response generated: %.100s...", CHAT_MESSAGE)
+    CHAT.info("Chat response", extra={"message_chars": len(CHAT_MESSAGE), "response_chars": 420, "products": 3})
+
+
+def _configure_legacy(stream):
+    """Setara logging.basicConfig(level=INFO) tapi ke stream benchmark"""
+    shutdown_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+SCENARIOS = {
+    "legacy": (legacy_request, lambda stream: _configure_legacy(stream)),
+    "current": (current_request, lambda stream: setup_logging("INFO", "text", "", stream, force=True, queue_size=0)),
+    "current-json": (current_request, lambda stream: setup_logging("INFO", "json", "", stream, force=True, queue_size=0)),
+    "current-sampled": (current_request, lambda stream: setup_logging(
+        "INFO", "text", "app.routes=0.1,app.services.rag_chat=0.1", stream, force=True, queue_size=0)),
+}
+
+
+def bench_scenario(request: Callable[[], None], configure: Callable[[Any], None], requests: int) -> Dict[str, Any]:
+    with open(os.devnull, "w") as devnull:
+        configure(devnull)
+        for _ in range(min(1000, requests)):
+            request()  # warm-up
+        shutdown_logging()  # kosongkan antrian warm-up
+        configure(devnull)
+
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        for _ in range(requests):
+            request()
+        caller_seconds = time.perf_counter() - started
+        stats = logging_stats()
+        shutdown_logging()  # tunggu listener selesai menulis semua record
+        cpu_seconds = time.process_time() - cpu_started
+        for handler in list(logging.getLogger().handlers):
+            logging.getLogger().removeHandler(handler)
+    return {
+        "caller_us": round(caller_seconds / requests * 1e6, 2),
+        "cpu_us": round(cpu_seconds / requests * 1e6, 2),
+        "dropped_queue_full": stats.get("dropped_queue_full", 0),
+        "dropped_sampling": stats.get("dropped_sampling", 0),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Overhead logging per request")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--json", type=str, help="Simpan hasil ke file JSON")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for name in [s for s in args.scenarios.split(",") if s]:
+        request, configure = SCENARIOS[name]
+        rows.append({"scenario": name, **bench_scenario(request, configure, args.requests)})
+
+    legacy = next((r for r in rows if r["scenario"] == "legacy"), None)
+    print(f"{'scenario':<16} {'caller_us':>10} {'cpu_us':>9} {'saved_us':>9} {'dropped':>8}")
+    for row in rows:
+        saved = f"{legacy['caller_us'] - row['caller_us']:.2f}" if legacy else "-"
+        dropped = row["dropped_queue_full"] + row["dropped_sampling"]
+        print(f"{row['scenario']:<16} {row['caller_us']:>10.2f} {row['cpu_us']:>9.2f} {saved:>9} {dropped:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "meta": {"python": platform.python_version(), "requests": args.requests},
+                "results": rows,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/bench_preprocess.py
+"""
+Benchmark CPU time preprocessing per gambar: pipeline lama (decode -> 512x512
+float32 -> uint8 -> PIL -> Resize 224 -> transforms.Compose baru tiap call)
+vs pipeline baru (JPEG draft decode -> resize sekali ke input backend ->
+normalisasi ke buffer yang dipakai ulang).
+
+Tidak butuh weights model. Jalankan dari folder backend:
+    python -m benchmarks.bench_preprocess [--repeat 20] [--json hasil.json]
+"""
+import io
+import json
+import time
+import argparse
+from typing import Callable, Dict, List
+
+import numpy as np
+from PIL import Image
+
+from app.models.ai_model import SkinDiseaseModel, vit_pixel_values
+
+VIT_SIZE = (224, 224)
+IMAGE_SIZES = [(640, 480), (2000, 1500), (4000, 3000)]
+FORMATS = ["JPEG", "PNG"]
+
+
+def make_image(size, fmt: str, seed: int = 0) -> bytes:
+    """Gambar sintetis dengan gradien + noise (lebih realistis dari noise murni untuk JPEG)"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    noise = rng.normal(0, 12, (height, width, 3))
+    array = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    save_kwargs = {"quality": 90} if fmt == "JPEG" else {}
+    Image.fromarray(array).save(buffer, fmt, **save_kwargs)
+    return buffer.getvalue()
+
+
+def legacy_pipeline(image_bytes: bytes) -> np.ndarray:
+    """Reproduksi preprocessing sebelum perubahan ini"""
+    from torchvision import transforms
+
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    img = img.resize((512, 512), Image.Resampling.BILINEAR)
+    img_array = np.expand_dims(np.array(img), axis=0).astype(np.float32) / 255.0
+
+    transform = transforms.Compose([
+        transforms.Resize(VIT_SIZE),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
+    ])
+    pil_img = Image.fromarray((img_array[0] * 255).astype(np.uint8))
+    return transform(pil_img).unsqueeze(0).numpy()
+
+
+def make_direct_pipeline() -> Callable[[bytes], np.ndarray]:
+    model = SkinDiseaseModel()
+
+    def direct_pipeline(image_bytes: bytes) -> np.ndarray:
+        return vit_pixel_values(model._preprocess(image_bytes, target_size=VIT_SIZE))
+
+    return direct_pipeline
+
+
+def time_cpu(fn: Callable[[bytes], np.ndarray], image_bytes: bytes, repeat: int) -> float:
+    """Median CPU time (ms) per panggilan"""
+    fn(image_bytes)  # warm-up
+    samples = []
+    for _ in range(repeat):
+        started = time.process_time()
+        fn(image_bytes)
+        samples.append(time.process_time() - started)
+    return 1000 * float(np.median(samples))
+
+
+def run(repeat: int) -> List[Dict]:
+    direct_pipeline = make_direct_pipeline()
+    results = []
+    for fmt in FORMATS:
+        for size in IMAGE_SIZES:
+            image_bytes = make_image(size, fmt)
+            legacy_ms = time_cpu(legacy_pipeline, image_bytes, repeat)
+            direct_ms = time_cpu(direct_pipeline, image_bytes, repeat)
+            results.append({
+                "format": fmt,
+                "size": f"{size[0]}x{size[1]}",
+                "bytes": len(image_bytes),
+                "legacy_cpu_ms": round(legacy_ms, 3),
+                "direct_cpu_ms": round(direct_ms, 3),
+                "saved_cpu_ms": round(legacy_ms - direct_ms, 3),
+                "speedup": round(legacy_ms / direct_ms, 2) if direct_ms > 0 else None,
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing lama vs decode-to-tensor")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", type=str, help="Simpan hasil ke file JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat)
+    print(f"{'format':<6} {'size':>10} {'legacy ms':>10} {'direct ms':>10} {'saved ms':>9} {'speedup':>8}")
+    for row in results:
+        print(f"{row['format']:<6} {row['size']:>10} {row['legacy_cpu_ms']:>10.2f} "
+              f"{row['direct_cpu_ms']:>10.2f} {row['saved_cpu_ms']:>9.2f} {row['speedup']:>7}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# benchmarks/bench_product_search.py
+"""
+Latency search_products: cara lama (normalisasi katalog + embedding setiap
+produk + sklearn cosine_similarity per produk di setiap query) vs
+ProductIndex (matrix float32 dihitung sekali, satu matrix-vector product +
+argpartition per query).
+
+Kolom bm25_ms: query leksikal BM25 (ProductIndex.search_lexical) yang hanya
+membaca posting list term query; build_ms sudah termasuk membangun index BM25.
+
+Kolom embed_*: waktu embedding seluruh katalog (= rebuild index) dengan loop
+get_text_embedding lama per teks vs get_text_embeddings batch, plus
+pengecekan bahwa vectornya identik (termasuk EDGE_TEXTS: teks kosong,
+emoji, lone surrogate).
+
+Katalog sintetis dibuat dengan mengulang PRODUCTS (nama/deskripsi diberi
+suffix supaya embedding berbeda). Cara lama hanya diukur sampai
+--legacy-max produk karena di 100k produk satu query butuh belasan detik.
+Jalankan dari folder backend:
+
+    python -m benchmarks.bench_product_search [--sizes 60,10000,100000] [--json hasil.json]
+"""
+import json
+import time
+import logging
+import argparse
+import platform
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.database.products_data import PRODUCTS
+from app.database.vector_db import ProductIndex, get_text_embeddings, product_text
+
+SIZES = [60, 10000, 100000]
+QUERIES = [
+    "jerawat kulit berminyak",
+    "serum niacinamide untuk pori besar",
+    "sunscreen untuk kulit sensitif",
+    "moisturizer dry skin barrier",
+    "bekas jerawat merah",
+]
+# Teks tepi untuk cek identical_vectors: kosong, non-ASCII, emoji (di luar
+# BMP), lone surrogate (lolos dari JSON "\ud800"), lebih panjang dari dim
+EDGE_TEXTS = ["", "   ", "Crème hydratante 保湿", "sunscreen \U0001F31E spf50", "abc\ud800", "\udfff acne",
+              "serum " * 40]
+
+
+def make_catalog(size: int) -> List[Dict[str, Any]]:
+    catalog = []
+    for i in range(size):
+        base = PRODUCTS[i % len(PRODUCTS)]
+        variant = i // len(PRODUCTS)
+        suffix = f" v{variant}" if variant else ""
+        catalog.append({
+            **base,
+            "id": str(i + 1),
+            "name": base["name"] + suffix,
+            "description": base["description"] + suffix,
+        })
+    return catalog
+
+
+def legacy_text_embedding(text: str) -> np.ndarray:
+    """get_text_embedding sebelum versi batch (disalin dari kode lama)"""
+    if not text:
+        return np.zeros(100, dtype=float)
+
+    text = text.lower().strip()
+
+    embedding = np.zeros(100, dtype=float)
+    for i, char in enumerate(text[:100]):
+        embedding[i % 100] += ord(char) / 1000.0
+
+    skincare_keywords = {
+        'kulit': 1.0, 'skin': 1.0, 'jerawat': 0.9, 'acne': 0.9,
+        'kering': 0.8, 'dry': 0.8, 'berminyak': 0.8, 'oily': 0.8,
+        'sensitif': 0.7, 'sensitive': 0.7, 'pori': 0.6, 'pore': 0.6,
+        'bekas': 0.5, 'scar': 0.5, 'merah': 0.5, 'redness': 0.5,
+        'gatal': 0.4, 'itchy': 0.4, 'face': 0.3
+    }
+    keys = list(skincare_keywords.keys())
+    for word, weight in skincare_keywords.items():
+        if word in text:
+            idx = len(embedding) - 1 - (keys.index(word) % 10)
+            embedding[idx] += weight
+
+    norm = np.linalg.norm(embedding)
+    if norm > 0:
+        embedding = embedding / norm
+    return embedding
+
+
+def legacy_search(products: List[Dict[str, Any]], query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    """search_products sebelum ProductIndex (disalin dari kode lama)"""
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    normalized = [{**p, "description": p.get("description", "")} for p in products]
+    query_embedding = legacy_text_embedding(query or "")
+    scored = []
+    for p in normalized:
+        prod_emb = legacy_text_embedding(product_text(p))
+        sim = float(cosine_similarity([query_embedding], [prod_emb])[0][0])
+        scored.append((p, sim))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return [prod for prod, _ in scored[:top_k]]
+
+
+def _time_queries(fn, repeat: int) -> Dict[str, float]:
+    fn(QUERIES[0])  # warm-up
+    samples = []
+    for r in range(repeat):
+        query = QUERIES[r % len(QUERIES)]
+        started = time.perf_counter()
+        fn(query)
+        samples.append(time.perf_counter() - started)
+    samples = np.array(samples) * 1000
+    return {"median_ms": round(float(np.median(samples)), 3), "p90_ms": round(float(np.percentile(samples, 90)), 3)}
+
+
+def bench_size(size: int, repeat: int, legacy_max: int) -> Dict[str, Any]:
+    catalog = make_catalog(size)
+    index = ProductIndex(loader=lambda: catalog, version=lambda: ("bench", size))
+    started = time.perf_counter()
+    index.search("", 1)  # build
+    build_ms = (time.perf_counter() - started) * 1000
+
+    texts = [product_text(p) for p in catalog] + EDGE_TEXTS
+    started = time.perf_counter()
+    legacy_vectors = np.array([legacy_text_embedding(text) for text in texts])
+    embed_legacy_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    batch_vectors = get_text_embeddings(texts)
+    embed_batch_ms = (time.perf_counter() - started) * 1000
+
+    row = {
+        "products": size,
+        "build_ms": round(build_ms, 1),
+        "embed_legacy_ms": round(embed_legacy_ms, 1),
+        "embed_batch_ms": round(embed_batch_ms, 1),
+        "identical_vectors": bool(np.array_equal(legacy_vectors, batch_vectors)),
+        "index": _time_queries(lambda q: index.search(q, 3), repeat),
+        "bm25": _time_queries(lambda q: index.search_lexical(q, 3), repeat),
+    }
+    if size <= legacy_max:
+        row["legacy"] = _time_queries(lambda q: legacy_search(catalog, q, 3), max(1, repeat // 10))
+        row["same_top3"] = all(
+            [p["id"] for p in legacy_search(catalog, q, 3)] == [p["id"] for p in index.search(q, 3)]
+            for q in QUERIES
+        )
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency search_products: loop per produk vs ProductIndex")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES))
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--legacy-max", type=int, default=10000, help="Ukuran katalog terbesar untuk cara lama")
+    parser.add_argument("--json", type=str, help="Simpan hasil ke file JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    rows = [bench_size(int(s), args.repeat, args.legacy_max) for s in args.sizes.split(",") if s]
+
+    print(f"{'products':>9} {'embed_old':>10} {'embed_new':>10} {'identical':>9} {'build_ms':>9} "
+          f"{'index_ms':>9} {'index_p90':>9} {'bm25_ms':>8} {'legacy_ms':>10} {'speedup':>8} {'same':>5}")
+    for row in rows:
+        legacy = row.get("legacy")
+        legacy_ms = f"{legacy['median_ms']:.2f}" if legacy else "-"
+        speedup = f"{legacy['median_ms'] / row['index']['median_ms']:.0f}x" if legacy else "-"
+        same = str(row["same_top3"]) if legacy else "-"
+        print(f"{row['products']:>9} {row['embed_legacy_ms']:>10.1f} {row['embed_batch_ms']:>10.1f} "
+              f"{str(row['identical_vectors']):>9} {row['build_ms']:>9.1f} {row['index']['median_ms']:>9.3f} "
+              f"{row['index']['p90_ms']:>9.3f} {row['bm25']['median_ms']:>8.3f} {legacy_ms:>10} {speedup:>8} {same:>5}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "meta": {"python": platform.python_version(), "numpy": np.__version__, "repeat": args.repeat},
+                "results": rows,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/bench_tiling.py
+"""
+Biaya tiled inference (app/services/tiling.py) dibanding satu forward pass
+pada gambar yang di-resize ke ukuran input model.
+
+Untuk setiap ukuran gambar, kombinasi PREDICT_TILE_MAX x overlap x batch
+size diukur per tahap:
+
+    decode   decode + downscale ke ukuran kerja + potong tile
+    forward  forward pass semua tile (per tile batch size)
+    pooling  gabung probabilitas tile (attention/max)
+    total    predict_tiled end-to-end
+
+Baris dengan total di atas --budget-ms ditandai, dipakai untuk memilih
+PREDICT_TILE_MAX dan PREDICT_TILE_BATCH_SIZE. Memakai stand-in ViT yang sama
+dengan bench_inference. Jalankan dari folder backend:
+
+    python -m benchmarks.bench_tiling [--max-tiles 4,9,16,25] [--budget-ms 500] [--json hasil.json]
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.bench_inference import _setup_environment, _metadata, _time, load_backend
+
+IMAGE_SIZES = [(2000, 1500), (4000, 3000)]
+MAX_TILES = [4, 9, 16, 25]
+OVERLAPS = [0.0, 0.25, 0.5]
+BATCH_SIZES = [4, 8, 16, 32]
+
+
+def bench_case(model, image_bytes: bytes, config, repeat: int) -> Dict[str, Any]:
+    from app.services.tiling import decode_tiles, pool_probabilities, predict_tiled
+
+    tile = min(model._input_size())
+    decoded = decode_tiles(image_bytes, tile, config)
+    tiles = decoded["tiles"].astype(np.float32) / 255.0
+
+    def _forward():
+        return np.concatenate([
+            model.model.predict(tiles[start:start + config.batch_size], verbose=0)
+            for start in range(0, len(tiles), config.batch_size)
+        ])
+
+    probs = _forward()
+    return {
+        "tiles": len(decoded["boxes"]),
+        "working_size": list(decoded["working_size"]),
+        "decode": _time(lambda: decode_tiles(image_bytes, tile, config), repeat),
+        "forward": _time(_forward, repeat),
+        "pooling": _time(lambda: pool_probabilities(probs, config.pooling, config.temperature), repeat),
+        "total": _time(lambda: predict_tiled(model, image_bytes, config), repeat),
+    }
+
+
+def run(sizes, max_tiles: List[int], overlaps: List[float], batch_sizes: List[int],
+        pooling: str, repeat: int, work_dir: Path) -> List[Dict[str, Any]]:
+    from app.services.tiling import TilingConfig
+    from benchmarks.bench_preprocess import make_image
+
+    model = load_backend("pytorch", work_dir)
+    rows = []
+    for size in sizes:
+        image_bytes = make_image(size, "JPEG")
+        baseline = _time(lambda: model.predict_bytes(image_bytes), repeat)
+        rows.append({"image_size": list(size), "mode": "single", "tiles": 1, "total": baseline})
+        for limit in max_tiles:
+            for overlap in overlaps:
+                for batch_size in batch_sizes:
+                    config = TilingConfig(overlap=overlap, max_tiles=limit, batch_size=batch_size, pooling=pooling)
+                    started = time.perf_counter()
+                    case = bench_case(model, image_bytes, config, repeat)
+                    print(f"  {size[0]}x{size[1]} max_tiles={limit} overlap={overlap} batch={batch_size}: "
+                          f"{time.perf_counter() - started:.1f}s", file=sys.stderr)
+                    rows.append({
+                        "image_size": list(size),
+                        "mode": "tiled",
+                        "max_tiles": limit,
+                        "overlap": overlap,
+                        "batch_size": batch_size,
+                        **case,
+                    })
+    return rows
+
+
+def print_table(rows: List[Dict[str, Any]], budget_ms: float):
+    print(f"{'image':<10} {'max':>4} {'overlap':>7} {'batch':>5} {'tiles':>5} {'working':>10} "
+          f"{'decode':>8} {'forward':>9} {'pooling':>8} {'total_ms':>9} {'vs_single':>9}")
+    single = {}
+    for row in rows:
+        image = f"{row['image_size'][0]}x{row['image_size'][1]}"
+        total = row["total"]["median_ms"]
+        if row["mode"] == "single":
+            single[image] = total
+            print(f"{image:<10} {'-':>4} {'-':>7} {'-':>5} {1:>5} {'-':>10} {'-':>8} {'-':>9} {'-':>8} "
+                  f"{total:>9.2f} {'1.00x':>9}")
+            continue
+        working = f"{row['working_size'][0]}x{row['working_size'][1]}"
+        flag = "  over budget" if budget_ms and total > budget_ms else ""
+        print(f"{image:<10} {row['max_tiles']:>4} {row['overlap']:>7} {row['batch_size']:>5} {row['tiles']:>5} "
+              f"{working:>10} {row['decode']['median_ms']:>8.2f} {row['forward']['median_ms']:>9.2f} "
+              f"{row['pooling']['median_ms']:>8.3f} {total:>9.2f} {total / single[image]:>8.2f}x{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency tiled inference vs single pass")
+    parser.add_argument("--sizes", default=",".join(f"{w}x{h}" for w, h in IMAGE_SIZES))
+    parser.add_argument("--max-tiles", default=",".join(str(n) for n in MAX_TILES))
+    parser.add_argument("--overlaps", default=",".join(str(o) for o in OVERLAPS))
+    parser.add_argument("--batch-sizes", default=",".join(str(b) for b in BATCH_SIZES))
+    parser.add_argument("--pooling", default="attention", choices=["attention", "max"])
+    parser.add_argument("--budget-ms", type=float, default=0, help="Tandai konfigurasi di atas budget latency")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", type=str, help="Simpan hasil ke file JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    sizes = [tuple(int(v) for v in s.split("x")) for s in args.sizes.split(",") if s]
+    max_tiles = [int(n) for n in args.max_tiles.split(",") if n]
+    overlaps = [float(o) for o in args.overlaps.split(",") if o]
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b]
+
+    with tempfile.TemporaryDirectory(prefix="bench-tiling-") as tmp:
+        work_dir = Path(tmp)
+        _setup_environment(work_dir)
+        rows = run(sizes, max_tiles, overlaps, batch_sizes, args.pooling, args.repeat, work_dir)
+
+    print_table(rows, args.budget_ms)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": _metadata(args.repeat), "budget_ms": args.budget_ms, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
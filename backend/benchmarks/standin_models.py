@@ -0,0 +1,120 @@
+# benchmarks/standin_models.py
+"""
+Model pengganti kecil yang dibuat lokal untuk benchmark (tanpa network).
+
+- ViT: ViTForImageClassification dengan config mini, weights random seed
+  tetap, ditulis dalam format snapshot lokal (app/models/snapshot.py) jadi
+  dimuat lewat jalur load yang sama dengan model produksi.
+- Keras: CNN kecil dengan input 224x224x3, disimpan sebagai skin_model.keras.
+- Text encoder: BERT mini + tokenizer WordPiece yang di-train dari teks
+  katalog, ditulis dalam format folder app/models/text_embedding.py.
+
+Ukuran model jauh lebih kecil dari aslinya, jadi angka forward pass hanya
+berguna untuk membandingkan sebelum/sesudah perubahan, bukan latency absolut.
+"""
+import json
+import time
+from pathlib import Path
+from typing import List
+
+STANDIN_LABELS: List[str] = [
+    'Acitinic Keratosis', 'Basal Cell Carcinoma', 'Dermatofibroma', 'Nevus',
+    'Pigmented Benign Keratosis', 'Seborrheic Keratosis',
+    'Squamous Cell Carcinoma', 'Vascular Lesion'
+]
+
+
+def write_vit_snapshot(snapshot_dir: Path, seed: int = 0, hidden_size: int = 64,
+                       num_layers: int = 2, patch_size: int = 16) -> Path:
+    """Tulis ViT mini sebagai snapshot aktif di snapshot_dir"""
+    import torch
+    from safetensors.torch import save_file
+    from transformers import ViTConfig, ViTForImageClassification
+    from app.models.snapshot import (
+        WEIGHTS_FILE, CONFIG_FILE, LABELS_FILE, MANIFEST_FILE, set_current, _sha256_file
+    )
+
+    torch.manual_seed(seed)
+    config = ViTConfig(
+        image_size=224, patch_size=patch_size, hidden_size=hidden_size,
+        num_hidden_layers=num_layers, num_attention_heads=4, intermediate_size=hidden_size * 4,
+        num_labels=len(STANDIN_LABELS),
+        id2label=dict(enumerate(STANDIN_LABELS)),
+        label2id={label: i for i, label in enumerate(STANDIN_LABELS)},
+    )
+    model = ViTForImageClassification(config).eval()
+
+    version = f"standin-vit-{hidden_size}x{num_layers}-seed{seed}"
+    path = Path(snapshot_dir) / version
+    path.mkdir(parents=True, exist_ok=True)
+    state_dict = {name: tensor.detach().contiguous().clone() for name, tensor in model.state_dict().items()}
+    save_file(state_dict, str(path / WEIGHTS_FILE), metadata={"format": "pt"})
+    config.to_json_file(str(path / CONFIG_FILE))
+    (path / LABELS_FILE).write_text(json.dumps(STANDIN_LABELS, indent=2))
+    (path / MANIFEST_FILE).write_text(json.dumps({
+        "version": version,
+        "source": "benchmarks.standin_models",
+        "revision": None,
+        "architecture": type(model).__name__,
+        "num_labels": config.num_labels,
+        "weights_sha256": _sha256_file(path / WEIGHTS_FILE),
+        "weights_bytes": (path / WEIGHTS_FILE).stat().st_size,
+        "torch_version": torch.__version__,
+        "created_at": time.time(),
+    }, indent=2))
+    set_current(version, Path(snapshot_dir))
+    return path
+
+
+def write_keras_model(weights_dir: Path, seed: int = 0) -> Path:
+    """Tulis CNN Keras mini sebagai weights_dir/skin_model.keras"""
+    import keras
+    from keras import layers
+
+    keras.utils.set_random_seed(seed)
+    inputs = keras.Input(shape=(224, 224, 3))
+    x = layers.Conv2D(16, 3, strides=2, padding="same", activation="relu")(inputs)
+    x = layers.Conv2D(32, 3, strides=2, padding="same", activation="relu")(x)
+    x = layers.GlobalAveragePooling2D()(x)
+    outputs = layers.Dense(len(STANDIN_LABELS), activation="softmax")(x)
+    model = keras.Model(inputs, outputs, name="standin_cnn")
+
+    path = Path(weights_dir) / "skin_model.keras"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    model.save(str(path))
+    return path
+
+
+def write_text_encoder(model_dir: Path, texts: List[str], seed: int = 0, hidden_size: int = 128,
+                       num_layers: int = 2, vocab_size: int = 4000) -> Path:
+    """Tulis encoder kalimat mini (BERT) + tokenizer sebagai model text embedding lokal"""
+    import torch
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers, trainers, processors
+    from transformers import BertConfig, BertModel, PreTrainedTokenizerFast
+    from app.models.text_embedding import write_manifest
+
+    special = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    tokenizer = Tokenizer(models.WordPiece(unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.train_from_iterator(texts, trainers.WordPieceTrainer(vocab_size=vocab_size, special_tokens=special))
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", tokenizer.token_to_id("[CLS]")),
+                                                 ("[SEP]", tokenizer.token_to_id("[SEP]"))],
+    )
+    fast = PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]", pad_token="[PAD]",
+                                   cls_token="[CLS]", sep_token="[SEP]", mask_token="[MASK]")
+
+    torch.manual_seed(seed)
+    config = BertConfig(vocab_size=tokenizer.get_vocab_size(), hidden_size=hidden_size,
+                        num_hidden_layers=num_layers, num_attention_heads=4,
+                        intermediate_size=hidden_size * 4, max_position_embeddings=512)
+    model = BertModel(config).eval()
+
+    path = Path(model_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    fast.save_pretrained(str(path))
+    model.save_pretrained(str(path), safe_serialization=True)
+    write_manifest(path, source=f"standin-bert-{hidden_size}x{num_layers}-seed{seed}", dim=hidden_size,
+                   architecture=type(model).__name__, torch_version=torch.__version__)
+    return path
@@ -0,0 +1,71 @@
+# tests/test_admission.py
+import asyncio
+
+import pytest
+
+from app.services.admission import (
+    AdmissionController, AdmissionRejected, PRIORITY_ANONYMOUS, PRIORITY_AUTHENTICATED,
+)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_authenticated_lane_is_served_first():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout_ms=5000)
+    await controller.acquire(PRIORITY_ANONYMOUS)
+    order = []
+
+    async def wait(name, priority):
+        await controller.acquire(priority)
+        order.append(name)
+        controller.release()
+
+    anonymous = asyncio.create_task(wait("anonymous", PRIORITY_ANONYMOUS))
+    await asyncio.sleep(0)
+    authenticated = asyncio.create_task(wait("authenticated", PRIORITY_AUTHENTICATED))
+    await asyncio.sleep(0)
+    assert controller.queue_depth == 2
+
+    controller.release()
+    await asyncio.gather(anonymous, authenticated)
+    assert order == ["authenticated", "anonymous"]
+    assert controller.stats()["active"] == 0
+
+
+@pytest.mark.anyio
+async def test_full_queue_preempts_anonymous_then_sheds():
+    controller = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout_ms=5000)
+    await controller.acquire(PRIORITY_ANONYMOUS)
+
+    anonymous = asyncio.create_task(controller.acquire(PRIORITY_ANONYMOUS))
+    await asyncio.sleep(0)
+    authenticated = asyncio.create_task(controller.acquire(PRIORITY_AUTHENTICATED))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected, match="preempted"):
+        await anonymous
+    # Antrian penuh oleh request authenticated: anonymous berikutnya langsung ditolak
+    with pytest.raises(AdmissionRejected, match="queue is full") as rejected:
+        await controller.acquire(PRIORITY_ANONYMOUS)
+    assert rejected.value.retry_after >= 1
+
+    controller.release()
+    await authenticated
+    controller.release()
+    stats = controller.stats()
+    assert stats["rejected"] == {"queue_full": 1, "timeout": 0, "preempted": 1}
+    assert stats["active"] == 0
+
+
+@pytest.mark.anyio
+async def test_queue_deadline_rejects_waiter():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout_ms=50)
+    await controller.acquire(PRIORITY_AUTHENTICATED)
+    with pytest.raises(AdmissionRejected, match="timed out"):
+        await controller.acquire(PRIORITY_AUTHENTICATED)
+    controller.release()
+    assert controller.stats()["active"] == 0
@@ -0,0 +1,66 @@
+# tests/test_ann_index.py
+import numpy as np
+import pytest
+
+from app.database.ann_index import IVFFlatIndex, load_index
+
+DIM = 16
+
+
+def _key(i: int) -> bytes:
+    return i.to_bytes(20, "big")
+
+
+def _vectors(count: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def index():
+    index = IVFFlatIndex(DIM, effort=4)
+    index.add([_key(i) for i in range(200)], _vectors(200, seed=0))
+    index.train(nlist=4)
+    return index
+
+
+def test_delta_rows_are_searchable_before_save(index):
+    delta = _vectors(5, seed=1)
+    index.add([_key(1000 + i) for i in range(5)], delta)
+    assert index.stats()["delta"] == 5
+    for i, vector in enumerate(delta):
+        assert index.search(vector, k=1)[0][0] == _key(1000 + i)
+
+
+def test_removed_rows_are_tombstoned(index):
+    vector = _vectors(200, seed=0)[7]
+    assert index.search(vector, k=1)[0][0] == _key(7)
+    assert index.remove([_key(7)]) == 1
+    assert _key(7) not in [key for key, _ in index.search(vector, k=10)]
+    assert index.stats()["tombstones"] == 1
+
+    # Ganti vector key yang sudah ada = tombstone baris lama + baris delta baru
+    index.add([_key(8)], vector[None, :])
+    assert index.search(vector, k=1)[0][0] == _key(8)
+    assert index.stats()["tombstones"] == 2
+
+
+def test_save_compacts_and_load_round_trips(index, tmp_path):
+    delta = _vectors(5, seed=1)
+    index.add([_key(1000 + i) for i in range(5)], delta)
+    index.remove([_key(3), _key(4)])
+    queries = _vectors(10, seed=2)
+    before = [index.search(query, k=5, effort=4) for query in queries]
+
+    index.save(tmp_path)
+    stats = index.stats()
+    assert (stats["delta"], stats["tombstones"], stats["memmap"]) == (0, 0, True)
+    assert not index.needs_save()
+
+    loaded = load_index(tmp_path, "ivf")
+    assert len(loaded) == len(index) == 203
+    assert _key(3) not in loaded and _key(1000) in loaded
+    for query, expected in zip(queries, before):
+        got = loaded.search(query, k=5, effort=4)
+        assert [key for key, _ in got] == [key for key, _ in expected]
+        assert [score for _, score in got] == pytest.approx([score for _, score in expected], abs=1e-6)
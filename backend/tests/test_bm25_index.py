@@ -0,0 +1,62 @@
+# tests/test_bm25_index.py
+import pytest
+
+from app.database.bm25_index import BM25Index, COMPACT_DEAD_RATIO, product_fields
+
+PRODUCTS = {
+    1: {"name": "Gentle Acne Cleanser", "category": "cleanser", "for_conditions": ["acne"],
+        "description": "Sabun wajah untuk kulit berjerawat dengan salicylic acid"},
+    2: {"name": "Hydrating Moisturizer", "category": "moisturizer", "for_conditions": ["eczema"],
+        "description": "Pelembap untuk kulit kering dan sensitif"},
+    3: {"name": "Sunscreen SPF 50", "category": "sunscreen", "for_conditions": ["melasma"],
+        "description": "Tabir surya untuk mencegah flek hitam"},
+    4: {"name": "Acne Spot Gel", "category": "treatment", "for_conditions": ["acne"],
+        "description": "Gel totol jerawat dengan benzoyl peroxide"},
+}
+UPDATED_4 = product_fields({"name": "Barrier Repair Cream", "category": "moisturizer", "for_conditions": ["eczema"],
+                            "description": "Krim untuk kulit kering dengan ceramide"})
+DOCS = {doc_id: product_fields(product) for doc_id, product in PRODUCTS.items()}
+QUERIES = ["jerawat acne", "kulit kering", "sunscreen flek", "ceramide cream", "salicylic"]
+
+
+def _index(docs):
+    index = BM25Index()
+    for doc_id, fields in docs.items():
+        index.add(doc_id, fields)
+    return index
+
+
+def _assert_same_results(incremental, rebuilt):
+    for query in QUERIES:
+        got = incremental.search_ids(query, top_k=10)
+        expected = rebuilt.search_ids(query, top_k=10)
+        assert [doc_id for doc_id, _ in got] == [doc_id for doc_id, _ in expected], query
+        assert [score for _, score in got] == pytest.approx([score for _, score in expected]), query
+
+
+def test_incremental_update_matches_rebuild():
+    index = _index(DOCS)
+    assert index.update(4, UPDATED_4)
+    assert index.remove(3)
+    assert not index.update(1, DOCS[1])  # isi sama: index tidak disentuh
+
+    final = {1: DOCS[1], 2: DOCS[2], 4: UPDATED_4}
+    _assert_same_results(index, _index(final))
+    assert len(index) == 3
+
+
+def test_compaction_keeps_results_identical():
+    index = _index(DOCS)
+    for _ in range(5):
+        index.update(4, UPDATED_4)
+        index.update(4, DOCS[4])
+    stats = index.stats()
+    assert stats["dead_postings"] / (stats["postings"] + stats["dead_postings"]) < COMPACT_DEAD_RATIO
+    _assert_same_results(index, _index(DOCS))
+
+
+def test_sync_only_touches_changed_documents():
+    index = _index(DOCS)
+    report = index.sync([(1, DOCS[1]), (2, DOCS[2]), (4, UPDATED_4), (5, DOCS[3])])
+    assert report == {"added": 1, "updated": 1, "removed": 1, "unchanged": 2}
+    _assert_same_results(index, _index({1: DOCS[1], 2: DOCS[2], 4: UPDATED_4, 5: DOCS[3]}))
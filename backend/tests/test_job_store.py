@@ -0,0 +1,47 @@
+# tests/test_job_store.py
+import pytest
+
+from app.database.job_store import JobStore, JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(tmp_path / "jobs.db")
+
+
+def test_live_lease_is_not_requeued(store):
+    job = store.enqueue(b"image")
+    store.claim(10, lease_seconds=60)
+    assert store.requeue_expired(max_attempts=3, lease_seconds=60) == {"requeued": 0, "failed": 0}
+    assert store.get(job["id"])["status"] == JOB_RUNNING
+
+
+def test_expired_lease_requeues_until_attempt_cap(store):
+    job = store.enqueue(b"image")
+
+    # Lease negatif = pemilik dianggap mati
+    assert store.claim(10, lease_seconds=-1)[0]["attempts"] == 1
+    assert store.requeue_expired(max_attempts=2, lease_seconds=60) == {"requeued": 1, "failed": 0}
+    assert store.get(job["id"])["status"] == JOB_QUEUED
+
+    assert store.claim(10, lease_seconds=-1)[0]["attempts"] == 2
+    assert store.requeue_expired(max_attempts=2, lease_seconds=60) == {"requeued": 0, "failed": 1}
+    failed = store.get(job["id"])
+    assert failed["status"] == JOB_FAILED
+    assert "gave up after 2 attempts" in failed["error"]
+    assert store.claim(10, lease_seconds=60) == []
+
+
+def test_result_from_previous_lease_owner_is_discarded(store, tmp_path):
+    job = store.enqueue(b"image")
+    store.claim(10, lease_seconds=-1)
+    store.requeue_expired(max_attempts=3, lease_seconds=60)
+
+    other = JobStore(tmp_path / "jobs.db")
+    other.claim(10, lease_seconds=60)
+    # Proses lama (lease sudah hilang) tidak boleh menimpa hasil pemilik baru
+    assert store.complete([{"id": job["id"], "result": {"stale": True}}]) == 0
+    assert other.complete([{"id": job["id"], "result": {"ok": True}}]) == 1
+    done = store.get(job["id"])
+    assert done["status"] == JOB_DONE
+    assert done["result"] == {"ok": True}
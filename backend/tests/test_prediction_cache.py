@@ -0,0 +1,55 @@
+# tests/test_prediction_cache.py
+import threading
+import time
+
+from app.services.prediction_cache import PredictionCache
+
+RESULT = {"best": {"index": 1, "label": "Acne", "score": 0.9}, "topk": []}
+
+
+def test_recheck_under_lock_after_leader_finished(monkeypatch):
+    """Leader selesai di antara get() dan lock: hasil diambil dari LRU, bukan compute ulang"""
+    cache = PredictionCache(disk_dir=None, enabled=True)
+    key = cache.make_key(b"image", "v1")
+    cache.put(key, RESULT)
+    monkeypatch.setattr(cache, "get", lambda _: None)
+
+    def compute():
+        raise AssertionError("compute() must not run when the entry is already cached")
+
+    assert cache.get_or_compute(key, compute) == RESULT
+    assert cache.stats()["misses"] == 0
+
+
+def test_concurrent_callers_share_one_compute():
+    cache = PredictionCache(disk_dir=None, enabled=True)
+    key = cache.make_key(b"image", "v1")
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return dict(RESULT)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute(key, compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [RESULT] * 8
+    assert cache.stats()["inflight"] == 0
+
+
+def test_error_results_are_not_cached():
+    cache = PredictionCache(disk_dir=None, enabled=True)
+    key = cache.make_key(b"image", "v1")
+    assert "error" in cache.get_or_compute(key, lambda: {"error": "decode failed"})
+    assert cache.get(key) is None
+    assert cache.get_or_compute(key, lambda: dict(RESULT)) == RESULT